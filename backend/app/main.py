@@ -65,6 +65,11 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         # 关闭时执行的操作
+        from app import rag
+        if rag.retrieval_service is not None:
+            # 停止合并索引的后台任务
+            await rag.retrieval_service.close()
+            
         logger.info("正在关闭MongoDB连接...")
         await mongodb.close()
         logger.info("MongoDB连接已关闭")
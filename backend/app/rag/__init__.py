@@ -17,7 +17,7 @@ from .document_splitter import (
 )
 from .text_splitter import FixedRecursiveCharacterTextSplitter
 from .pdf_processor import PDFProcessor
-from .cache_service import CacheService
+from .cache_service import CacheService, SemanticCache
 from app.db.mongodb import mongodb
 from app.db.document_store import DocumentStore
 from .models import Document, DocumentSegment, ChildDocument
@@ -103,12 +103,19 @@ async def initialize_rag():
             
             document_store = DocumentStore(mongodb.db)
             
+            # 语义缓存为进程内缓存，不依赖Redis，需单独开启
+            semantic_cache = None
+            if os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true":
+                semantic_cache = SemanticCache()
+                logger.info("语义缓存已启用")
+            
             retrieval_service = RetrievalService(
                 vector_store=vector_store,
                 document_store=document_store,
                 embedding_model=embedding_model,
                 retrieval_config=RETRIEVAL_CONFIG,
-                cache_service=cache_service
+                cache_service=cache_service,
+                semantic_cache=semantic_cache
             )
             logger.info("检索服务初始化成功")
         except Exception as e:
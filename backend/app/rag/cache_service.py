@@ -2,6 +2,9 @@ import json
 import redis
 import logging
 import os
+import time
+import threading
+import numpy as np
 from typing import Optional, List, Dict, Any
 from .document_processor import Document
 
@@ -114,4 +117,152 @@ class CacheService:
                 self.redis_client.delete(*keys)
                 logger.info(f"已清除所有 {len(keys)} 条缓存")
         except Exception as e:
-            logger.warning(f"清除所有缓存失败: {str(e)}") 
\ No newline at end of file
+            logger.warning(f"清除所有缓存失败: {str(e)}")
+
+class SemanticCache:
+    """
+    基于查询向量的进程内语义缓存
+    
+    CacheService 只在查询文本完全相同时命中；语义缓存保存最近查询的归一化向量，
+    新查询与某个已缓存查询（数据集和检索参数都相同）的余弦相似度不低于阈值时直接返回其结果，
+    跳过向量检索。缓存条目数较多时先用随机投影LSH签名按汉明距离预筛候选，
+    再只对候选计算精确相似度
+    """
+    
+    # 随机投影签名位数，签名打包为一个 uint64
+    SIGNATURE_BITS = 64
+    
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        初始化语义缓存
+        
+        Args:
+            config: 缓存配置，如果未提供则从环境变量读取
+        """
+        if config is None:
+            config = {
+                "threshold": float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.97")),
+                "max_size": int(os.environ.get("SEMANTIC_CACHE_MAX_SIZE", "1024")),
+                "expiry": int(os.environ.get("SEMANTIC_CACHE_EXPIRY", "3600")),
+                "lsh_min_size": int(os.environ.get("SEMANTIC_CACHE_LSH_MIN_SIZE", "2048")),
+                "max_hamming": int(os.environ.get("SEMANTIC_CACHE_MAX_HAMMING", "12"))
+            }
+        self.threshold = config.get("threshold", 0.97)
+        self.max_size = config.get("max_size", 1024)
+        self.expiry = config.get("expiry", 3600)  # 过期的条目不再命中，避免返回陈旧结果
+        self.lsh_min_size = config.get("lsh_min_size", 2048)
+        self.max_hamming = config.get("max_hamming", 12)
+        
+        self._lock = threading.Lock()
+        self._vectors = None      # (max_size, 维度) 的归一化查询向量，首次写入时分配
+        self._signatures = np.zeros(self.max_size, dtype=np.uint64)
+        self._projection = None   # 随机投影矩阵
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.max_size
+        self._next_slot = 0       # 环形写入位置，写满后覆盖最早的条目
+        self._size = 0
+        
+    def _normalize(self, vector) -> Optional[np.ndarray]:
+        """转换为归一化的 float32 向量，零向量返回 None"""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+        
+    def _signature(self, vector: np.ndarray) -> np.uint64:
+        """计算向量的随机投影签名：每一位为向量在一个随机超平面哪一侧"""
+        bits = np.packbits((self._projection @ vector) > 0, bitorder="little")
+        return bits.view(np.uint64)[0]
+        
+    def _candidates(self, signature: np.uint64) -> np.ndarray:
+        """返回需要计算精确相似度的条目下标"""
+        if self._size < self.lsh_min_size:
+            return np.arange(self._size)
+        # 汉明距离：异或后按字节查表统计置位数
+        xor = (self._signatures[:self._size] ^ signature).view(np.uint8).reshape(-1, 8)
+        distances = _POPCOUNT_TABLE[xor].sum(axis=1)
+        return np.flatnonzero(distances <= self.max_hamming)
+        
+    @staticmethod
+    def _copy_results(results: List[Document]) -> List[Document]:
+        """复制文档对象和元数据，缓存与调用方互不共享，调用方修改结果（如重排序改写分数）不会影响缓存"""
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in results]
+        
+    @staticmethod
+    def _key(dataset_id: str, top_k: Optional[int], score_threshold: Optional[float], rerank: bool) -> tuple:
+        """缓存条目的匹配条件：检索参数不同的查询结果不能相互复用"""
+        return (dataset_id, top_k, score_threshold, rerank)
+        
+    def get(
+        self,
+        query_vector,
+        dataset_id: str,
+        top_k: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        rerank: bool = False
+    ) -> Optional[List[Document]]:
+        """查找与查询向量足够相似、且数据集和检索参数相同的已缓存查询，返回其检索结果"""
+        key = self._key(dataset_id, top_k, score_threshold, rerank)
+        vector = self._normalize(query_vector)
+        with self._lock:
+            if vector is None or self._size == 0 or vector.shape[0] != self._vectors.shape[1]:
+                return None
+            candidates = self._candidates(self._signature(vector))
+            if len(candidates) == 0:
+                return None
+            similarities = self._vectors[candidates] @ vector
+            now = time.monotonic()
+            # 按相似度从高到低检查数据集、检索参数和过期时间
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.threshold:
+                    break
+                entry = self._entries[candidates[i]]
+                if entry["key"] == key and now - entry["created_at"] < self.expiry:
+                    logger.debug(f"语义缓存命中: {entry['query']} (相似度 {similarities[i]:.4f})")
+                    return self._copy_results(entry["results"])
+            return None
+            
+    def put(
+        self,
+        query: str,
+        query_vector,
+        dataset_id: str,
+        results: List[Document],
+        top_k: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        rerank: bool = False
+    ) -> None:
+        """缓存查询向量及其检索结果（连同数据集和检索参数），空结果不缓存"""
+        vector = self._normalize(query_vector)
+        if vector is None or not results:
+            return
+        with self._lock:
+            if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                # 首次写入或向量维度变化（更换了嵌入模型）时重新分配
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                rng = np.random.default_rng()
+                self._projection = rng.standard_normal((self.SIGNATURE_BITS, vector.shape[0])).astype(np.float32)
+                self._entries = [None] * self.max_size
+                self._next_slot = 0
+                self._size = 0
+            slot = self._next_slot
+            self._vectors[slot] = vector
+            self._signatures[slot] = self._signature(vector)
+            self._entries[slot] = {
+                "query": query,
+                "key": self._key(dataset_id, top_k, score_threshold, rerank),
+                "results": self._copy_results(results),
+                "created_at": time.monotonic()
+            }
+            self._next_slot = (slot + 1) % self.max_size
+            self._size = min(self._size + 1, self.max_size)
+            
+    def clear(self) -> None:
+        """清除所有缓存条目"""
+        with self._lock:
+            self._entries = [None] * self.max_size
+            self._next_slot = 0
+            self._size = 0
+
+# 每个字节值的置位数，用于计算签名间的汉明距离
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
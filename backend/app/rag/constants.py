@@ -113,6 +113,7 @@ class Field(Enum):
     CONTENT_KEY = "page_content"      # 文本内容
     METADATA_KEY = "metadata"         # 元数据
     GROUP_KEY = "group_id"           # 分组ID
+    DATASET_KEY = "dataset_id"       # 数据集ID（标量字段，带索引）
     VECTOR = "vector"                # 向量
     SPARSE_VECTOR = "sparse_vector"  # 稀疏向量（用于全文搜索）
     TEXT_KEY = "text"               # 文本
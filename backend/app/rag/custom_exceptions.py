@@ -92,6 +92,15 @@ class RerankingError(RetrievalError):
     """重排序异常"""
     pass
 
+# 文档存储相关异常
+class DocumentStoreError(RAGBaseException):
+    """文档存储相关异常"""
+    pass
+
+class BackgroundFlushError(DocumentStoreError):
+    """之前的后台批量写入失败；引发本异常的调用所保存的文档已进入写缓冲区"""
+    pass
+
 # 缓存相关异常
 class CacheError(RAGBaseException):
     """缓存服务异常"""
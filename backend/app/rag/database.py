@@ -4,11 +4,14 @@ MongoDB数据库管理模块
 
 import os
 import logging
+import threading
 from typing import List, Optional, Dict, Any
-from pymongo import MongoClient
+from pymongo import MongoClient, InsertOne
+from pymongo.errors import BulkWriteError
 from pymongo.collection import Collection
 from pymongo.database import Database
 from .models import DocumentSegment, ChildChunk, Document
+from .custom_exceptions import BackgroundFlushError
 from datetime import datetime
 import uuid
 
@@ -23,6 +26,18 @@ class MongoDBManager:
         self.chunks_collection = db["chunks"]
         self.documents_collection = db["documents"]
         
+        # 写缓冲配置：攒够一批或到达时间间隔后再批量写入文档
+        self.write_batch_size = int(os.environ.get("MONGODB_WRITE_BATCH_SIZE", "500"))
+        self.write_flush_interval = int(os.environ.get("MONGODB_WRITE_FLUSH_INTERVAL_MS", "100")) / 1000
+        # 写入失败的批次放回缓冲区后，间隔该时间由后台重试
+        self.write_retry_interval = int(os.environ.get("MONGODB_WRITE_RETRY_INTERVAL_MS", "1000")) / 1000
+        self._doc_buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        # 后台定时写入失败时记录异常，由下一次 save_document/insert_document/flush 调用抛出
+        self._flush_error: Optional[Exception] = None
+        
         # 连接到MongoDB
         try:
             self.client = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017"))
@@ -165,34 +180,140 @@ class MongoDBManager:
     def close(self):
         """关闭数据库连接"""
         try:
-            self.client.close()
-            logger.info("MongoDB连接已关闭")
+            # 关闭前写入缓冲区中剩余的文档
+            self.flush()
+        finally:
+            # 连接关闭后不再后台重试写入
+            with self._buffer_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+            try:
+                self.client.close()
+                logger.info("MongoDB连接已关闭")
+            except Exception as e:
+                logger.error(f"关闭MongoDB连接失败: {str(e)}")
+    
+    def flush(self) -> int:
+        """将缓冲区中的文档批量写入MongoDB
+        
+        写入失败（非 BulkWriteError）时整批放回缓冲区，下次flush时重试；
+        部分文档写入失败（如主键重复）时抛出 BulkWriteError，与逐条 insert_one 的行为一致。
+        之前后台写入失败留下的异常在本次写入后抛出
+        
+        Returns:
+            写入的文档数量
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                batch, self._doc_buffer = self._doc_buffer, []
+                pending_error, self._flush_error = self._flush_error, None
+                
+            try:
+                inserted = self._write_batch(batch) if batch else 0
+            except Exception as e:
+                if pending_error is not None:
+                    # 本次写入也失败，之前后台写入的异常作为原因一并抛出，不丢失
+                    raise e from pending_error
+                raise
+            if pending_error is not None:
+                raise pending_error
+            return inserted
+    
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> int:
+        """批量写入一批文档，调用方需持有 _flush_lock"""
+        try:
+            result = self.documents_collection.bulk_write(
+                [InsertOne(doc_dict) for doc_dict in batch],
+                ordered=False
+            )
+            logger.info(f"批量写入 {result.inserted_count} 个文档")
+            return result.inserted_count
+        except BulkWriteError as e:
+            inserted = e.details.get("nInserted", 0)
+            logger.error(f"批量写入文档部分失败: 成功 {inserted}/{len(batch)}, 错误: {e.details.get('writeErrors')}")
+            raise
+        except Exception as e:
+            # 整批都未确认写入，放回缓冲区头部，并安排后台重试，避免丢失文档
+            with self._buffer_lock:
+                self._doc_buffer[:0] = batch
+                self._schedule_flush(self.write_retry_interval)
+            logger.error(f"批量写入文档失败，{len(batch)} 个文档已放回缓冲区: {str(e)}")
+            raise
+    
+    def _flush_in_background(self):
+        """定时器线程中执行的flush，异常无人接收，记录下来留给下一个调用方"""
+        try:
+            self.flush()
         except Exception as e:
-            logger.error(f"关闭MongoDB连接失败: {str(e)}")
+            with self._buffer_lock:
+                self._flush_error = e
+    
+    def _schedule_flush(self, interval: float):
+        """启动后台写入定时器，已有定时器时不重复启动；调用方需持有 _buffer_lock"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(interval, self._flush_in_background)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _buffer_document(self, doc_dict: Dict[str, Any]):
+        """
+        将文档加入写缓冲区，缓冲区满时立即写入，否则按时间间隔写入
+        
+        之前的后台写入失败时，本次文档照常加入缓冲区，再抛出 BackgroundFlushError（原因为后台异常）
+        """
+        with self._buffer_lock:
+            self._doc_buffer.append(doc_dict)
+            buffer_full = len(self._doc_buffer) >= self.write_batch_size
+            if not buffer_full:
+                self._schedule_flush(self.write_flush_interval)
+            background_error, self._flush_error = self._flush_error, None
+                
+        if buffer_full:
+            try:
+                self.flush()
+            except Exception as e:
+                if background_error is not None:
+                    raise e from background_error
+                raise
+        if background_error is not None:
+            raise BackgroundFlushError(
+                f"之前的后台批量写入失败（文档 {doc_dict['_id']} 已加入写缓冲区）: {str(background_error)}"
+            ) from background_error
+    
+    def _document_to_dict(self, document: Document) -> Dict[str, Any]:
+        """转换文档为MongoDB存储格式"""
+        return {
+            "_id": document.doc_id,
+            "page_content": document.page_content,
+            "metadata": document.metadata,
+            "doc_hash": document.doc_hash,
+            # 向量在内存中为 float32 数组，BSON 不支持 numpy 类型，写入前转换为列表
+            "vector": document.vector.tolist() if document.vector is not None else None,
+            "sparse_vector": document.sparse_vector.tolist() if document.sparse_vector is not None else None,
+            "group_id": document.group_id
+        }
     
     def save_document(self, document: Document) -> str:
-        """保存文档到MongoDB"""
+        """保存文档到MongoDB（写入缓冲区，由后台批量写入）
+        
+        文档ID在写入前已确定，因此可以立即返回；需要确认写入结果时使用save_document_sync
+        """
         try:
-            # 生成唯一的文档ID
-            doc_id = document.doc_id
-            
-            # 准备文档数据
-            doc_dict = {
-                "_id": doc_id,
-                "page_content": document.page_content,
-                "metadata": document.metadata,
-                "doc_hash": document.doc_hash,
-                "vector": document.vector,
-                "sparse_vector": document.sparse_vector,
-                "group_id": document.group_id
-            }
-            
-            # 如果文档有子文档，保存子文档ID
-            if hasattr(document, 'children') and document.children:
-                doc_dict["child_ids"] = [
-                    str(uuid.uuid4())  # 为每个子文档生成唯一ID
-                    for child in document.children
-                ]
+            doc_dict = self._prepare_document(document)
+            self._buffer_document(doc_dict)
+            return doc_dict["_id"]
+        except Exception as e:
+            logger.error(f"保存文档失败: {str(e)}")
+            raise
+    
+    def save_document_sync(self, document: Document) -> str:
+        """保存文档到MongoDB并等待写入完成"""
+        try:
+            doc_dict = self._prepare_document(document)
             
             # 保存到MongoDB
             result = self.documents_collection.insert_one(doc_dict)
@@ -207,6 +328,18 @@ class MongoDBManager:
         except Exception as e:
             logger.error(f"保存文档失败: {str(e)}")
             raise
+    
+    def _prepare_document(self, document: Document) -> Dict[str, Any]:
+        """准备要保存的文档数据"""
+        doc_dict = self._document_to_dict(document)
+        
+        # 如果文档有子文档，保存子文档ID
+        if hasattr(document, 'children') and document.children:
+            doc_dict["child_ids"] = [
+                str(uuid.uuid4())  # 为每个子文档生成唯一ID
+                for child in document.children
+            ]
+        return doc_dict
 
     def insert_segments(self, segments: List[DocumentSegment]) -> List[str]:
         """插入文档段落"""
@@ -293,23 +426,21 @@ class MongoDBManager:
         ]
         
     def insert_document(self, document: Document) -> str:
-        """插入原始文档"""
-        doc_dict = {
-            "_id": document.doc_id,
-            "page_content": document.page_content,
-            "metadata": document.metadata,
-            "doc_hash": document.doc_hash,
-            "vector": document.vector,
-            "sparse_vector": document.sparse_vector,
-            "group_id": document.group_id
-        }
-        
-        self.documents_collection.insert_one(doc_dict)
+        """插入原始文档（写入缓冲区，由后台批量写入）"""
+        doc_dict = self._document_to_dict(document)
+        self._buffer_document(doc_dict)
         return doc_dict["_id"]
         
     def get_document_by_id(self, doc_id: str) -> Optional[Document]:
         """根据ID获取原始文档"""
-        doc = self.documents_collection.find_one({"_id": doc_id})
+        # 刚保存、仍在缓冲区中的文档直接从缓冲区返回
+        with self._buffer_lock:
+            doc = next((doc_dict for doc_dict in self._doc_buffer if doc_dict["_id"] == doc_id), None)
+        if doc is None:
+            # 等待正在进行的批量写入完成，保证能读到刚从缓冲区取出的文档
+            with self._flush_lock:
+                pass
+            doc = self.documents_collection.find_one({"_id": doc_id})
         if not doc:
             return None
             
@@ -2,14 +2,47 @@ import re
 import os
 import logging
 import string
+import time
 import unicodedata
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+from itertools import repeat
 import json
 import hashlib
+from .process_pool import get_process_pool
 
 logger = logging.getLogger(__name__)
 
+# 预编译清洗用的正则表达式，避免每次调用时查找正则缓存
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 控制字符删除表。\x0B、\x0C、\x1C-\x1F 属于空白字符，已在空白压缩时被替换为空格，
+# 剩余的控制字符用 str.translate 在C层一次性删除，代替第二遍正则扫描
+_CONTROL_CHARS_TABLE = dict.fromkeys([*range(0x00, 0x09), *range(0x0E, 0x1C), 0x7F])
+
+def _clean_one(content: str, max_content_length: int) -> str:
+    """
+    清洗单个文档内容
+
+    定义为模块级函数以便在进程池中序列化，只接收内容和配置，不共享处理器实例
+    """
+    # 规范化Unicode字符（已是NFKC形式时跳过，避免复制整个字符串）
+    if not unicodedata.is_normalized('NFKC', content):
+        content = unicodedata.normalize('NFKC', content)
+    
+    # 替换多个连续空白字符为单个空格
+    content = _WHITESPACE_RE.sub(' ', content)
+    
+    # 删除控制字符
+    content = content.translate(_CONTROL_CHARS_TABLE)
+    
+    # 截断过长的内容
+    if len(content) > max_content_length:
+        logger.info(f"文档内容过长，截断为 {max_content_length} 字符")
+        content = content[:max_content_length]
+        
+    return content.strip()
+
 class Document:
     """
     文档类，表示一个可以被处理的文本文档
@@ -25,12 +58,19 @@ class DocumentProcessor:
     """
     文档处理器，提供文档处理功能
     """
+    # 清洗时间戳缓存：(生成时间, ISO格式字符串)，同一秒内清洗的文档复用同一个时间戳
+    _cleaned_at_cache = (0.0, "")
+    
     def __init__(self):
-        self.stop_words = set()
+        self.stop_words = frozenset()
         self.punctuation_translator = str.maketrans('', '', string.punctuation)
         self.min_content_length = int(os.environ.get("DOC_MIN_CONTENT_LENGTH", "10"))
         self.max_content_length = int(os.environ.get("DOC_MAX_CONTENT_LENGTH", "100000"))
         
+        # 并行清洗配置：默认关闭，DOC_CLEAN_WORKERS 大于1且文档数量达到阈值时才使用共用进程池
+        self.clean_workers = int(os.environ.get("DOC_CLEAN_WORKERS", "1"))
+        self.parallel_threshold = int(os.environ.get("DOC_CLEAN_PARALLEL_THRESHOLD", "32"))
+        
         # 缓存配置
         self.use_cache = os.environ.get("DOC_USE_CACHE", "true").lower() == "true"
         self.cache_dir = os.environ.get("DOC_CACHE_DIR", "data/cache")
@@ -50,14 +90,24 @@ class DocumentProcessor:
         try:
             stop_words_file = os.environ.get("STOP_WORDS_FILE", "data/stop_words.txt")
             if os.path.exists(stop_words_file):
+                # 一次性读入并在C层按行切分，避免逐行迭代文件对象
                 with open(stop_words_file, 'r', encoding='utf-8') as f:
-                    self.stop_words = set(line.strip() for line in f if line.strip())
+                    lines = f.read().splitlines()
+                self.stop_words = frozenset(filter(None, map(str.strip, lines)))
                 logger.info(f"加载了 {len(self.stop_words)} 个停用词")
             else:
                 logger.info(f"停用词文件 {stop_words_file} 不存在，跳过加载")
         except Exception as e:
             logger.error(f"加载停用词失败: {str(e)}")
     
+    @classmethod
+    def _cleaned_at(cls) -> str:
+        """获取清洗时间戳，每秒最多格式化一次"""
+        now = time.time()
+        if now - cls._cleaned_at_cache[0] >= 1.0:
+            cls._cleaned_at_cache = (now, datetime.fromtimestamp(now).isoformat())
+        return cls._cleaned_at_cache[1]
+    
     def validate_document(self, document: Document) -> bool:
         """
         验证文档是否有效
@@ -68,23 +118,29 @@ class DocumentProcessor:
         Returns:
             文档是否有效
         """
-        # 检查内容是否为空
-        if not document or not document.page_content or len(document.page_content.strip()) == 0:
+        if not document:
             logger.warning("文档内容为空")
             return False
             
-        # 检查内容是否过短
-        if len(document.page_content.strip()) < self.min_content_length:
-            logger.warning(f"文档内容过短: {len(document.page_content.strip())} 字符")
-            return False
-            
-        # 检查必要的元数据
-        required_metadata = ["doc_id", "document_id"]
-        for field in required_metadata:
+        # 先检查必要的元数据（字典查找开销小，可快速拒绝无效文档）
+        for field in ("doc_id", "document_id"):
             if field not in document.metadata:
                 logger.warning(f"文档缺少必要的元数据字段: {field}")
                 return False
                 
+        # 只去除一次首尾空白
+        content_length = len(document.page_content.strip()) if document.page_content else 0
+        
+        # 检查内容是否为空
+        if content_length == 0:
+            logger.warning("文档内容为空")
+            return False
+            
+        # 检查内容是否过短
+        if content_length < self.min_content_length:
+            logger.warning(f"文档内容过短: {content_length} 字符")
+            return False
+                
         return True
         
     def clean_document(self, document: Document) -> Document:
@@ -105,31 +161,17 @@ class DocumentProcessor:
                 logger.info(f"从缓存获取清洗结果: {cache_key}")
                 return cached_result
         
-        # 获取原始内容
-        content = document.page_content
-        
-        # 规范化Unicode字符
-        content = unicodedata.normalize('NFKC', content)
-        
-        # 替换多个连续空白字符为单个空格
-        content = re.sub(r'\s+', ' ', content)
-        
-        # 删除控制字符
-        content = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', content)
-        
-        # 截断过长的内容
-        if len(content) > self.max_content_length:
-            logger.info(f"文档内容过长，截断为 {self.max_content_length} 字符")
-            content = content[:self.max_content_length]
+        # 清洗内容
+        content = _clean_one(document.page_content, self.max_content_length)
         
         # 创建新的Document对象
         cleaned_doc = Document(
-            page_content=content.strip(),
+            page_content=content,
             metadata=document.metadata.copy()
         )
         
         # 添加清洗时间到元数据
-        cleaned_doc.metadata["cleaned_at"] = datetime.now().isoformat()
+        cleaned_doc.metadata["cleaned_at"] = self._cleaned_at()
         
         # 缓存清洗结果
         if self.use_cache:
@@ -137,6 +179,61 @@ class DocumentProcessor:
             
         return cleaned_doc
         
+    def clean_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        批量清洗文档，文档数量较多时使用进程池并行清洗
+        
+        Args:
+            documents: 要清洗的文档列表
+            
+        Returns:
+            清洗后的文档列表，顺序与输入一致
+        """
+        if not documents:
+            return []
+            
+        results: List[Optional[Document]] = [None] * len(documents)
+        cache_keys: Dict[int, str] = {}
+        pending: List[int] = []
+        
+        # 先在主进程中查找缓存，只把未命中的文档交给进程池
+        for i, document in enumerate(documents):
+            if self.use_cache:
+                cache_key = self._get_cache_key(document)
+                cached_result = self._get_from_cache(cache_key)
+                if cached_result:
+                    results[i] = cached_result
+                    continue
+                cache_keys[i] = cache_key
+            pending.append(i)
+            
+        contents = [documents[i].page_content for i in pending]
+        
+        if self.clean_workers > 1 and len(contents) >= self.parallel_threshold:
+            chunksize = max(1, len(contents) // (self.clean_workers * 4))
+            logger.info(f"使用 {self.clean_workers} 个进程并行清洗 {len(contents)} 个文档, chunksize={chunksize}")
+            cleaned_contents = list(get_process_pool().map(
+                _clean_one, contents, repeat(self.max_content_length), chunksize=chunksize
+            ))
+        else:
+            cleaned_contents = [_clean_one(content, self.max_content_length) for content in contents]
+            
+        # 同一批次的文档共用一个清洗时间戳
+        cleaned_at = self._cleaned_at()
+        for i, content in zip(pending, cleaned_contents):
+            cleaned_doc = Document(
+                page_content=content,
+                metadata=documents[i].metadata.copy()
+            )
+            cleaned_doc.metadata["cleaned_at"] = cleaned_at
+            
+            if self.use_cache:
+                self._save_to_cache(cache_keys[i], cleaned_doc)
+                
+            results[i] = cleaned_doc
+            
+        return results
+        
     def extract_keywords(self, document: Document, max_keywords: int = 10) -> List[str]:
         """
         从文档中提取关键词
@@ -158,7 +255,8 @@ class DocumentProcessor:
         words = content.split()
         
         # 过滤停用词
-        words = [word for word in words if word not in self.stop_words and len(word) > 1]
+        stop_words = self.stop_words
+        words = [word for word in words if len(word) > 1 and word not in stop_words]
         
         # 统计词频
         word_freq = {}
@@ -5,19 +5,176 @@
 import os
 import re
 import logging
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
 from dataclasses import dataclass
 import json
 import hashlib
 import uuid
+import secrets
+import itertools
+import bisect
+from itertools import repeat
 from enum import Enum
 
 from .models import Document, DocumentSegment, ChildDocument
-from .text_splitter import EnhanceRecursiveCharacterTextSplitter, FixedRecursiveCharacterTextSplitter
+from .text_splitter import EnhanceRecursiveCharacterTextSplitter, FixedRecursiveCharacterTextSplitter, _MemoizedLengths
 from .cleaner.clean_processor import CleanProcessor, CleanLevel
+from .process_pool import get_process_pool
 
 logger = logging.getLogger(__name__)
 
+# 标题模式（保留单独的模式便于维护，匹配时使用下方合并后的正则）
+_TITLE_PATTERNS = (
+    r"第[一二三四五六七八九十百千万]+[章节篇]",  # 中文数字章节
+    r"[0-9]+\.[0-9]+(\.[0-9]+)?",  # 数字编号（如1.2, 1.2.3）
+    r"[一二三四五六七八九十][、.]",  # 中文数字编号
+    r"[A-Z]\.",  # 字母编号
+    r"[（(][一二三四五六七八九十][)）]",  # 带括号的中文数字
+    r"[（(][0-9]+[)）]",  # 带括号的数字
+    r"[【\[].+[】\]]$",  # 方括号包围
+    r"《.+》$",  # 书名号包围
+    r"目\s*录$",  # 目录
+    r"前\s*言$",  # 前言
+    r"概\s*述$",  # 概述
+    r"简\s*介$",  # 简介
+    r"说\s*明$",  # 说明
+    r"注\s*意$",  # 注意
+    r"警\s*告$",  # 警告
+)
+
+# 列表项模式
+_LIST_PATTERNS = (
+    r"[•·○●◆▪-]",  # 常见列表符号
+    r"[0-9]+\.",  # 数字编号
+    r"[a-zA-Z]\.",  # 字母编号
+    r"\([0-9]+\)",  # 带括号的数字
+    r"\([a-zA-Z]\)",  # 带括号的字母
+    r"[①②③④⑤⑥⑦⑧⑨⑩]",  # 圆圈数字
+    r"[㈠㈡㈢㈣㈤㈥㈦㈧㈨㈩]",  # 括号数字
+    r"[⒈⒉⒊⒋⒌⒍⒎⒏⒐⒑]",  # 带点数字
+)
+
+# 将各模式包在非捕获组中合并为一个整体锚定的正则，每行只需扫描一次
+_TITLE_UNION = re.compile("^(?:" + "|".join(f"(?:{p})" for p in _TITLE_PATTERNS) + ")")
+_LIST_UNION = re.compile("^(?:" + "|".join(f"(?:{p})" for p in _LIST_PATTERNS) + ")")
+
+# 三个及以上的连续换行
+_MULTI_NEWLINE_PATTERN = re.compile(r"\n{3,}")
+
+# 问答标记（Qn: / An:）和空白串，用于线性扫描问答对
+_QA_MARKER_PATTERN = re.compile(r"([QA])\d+:")
+_WHITESPACE_RUN_PATTERN = re.compile(r"\s*")
+_NEWLINE_PATTERN = re.compile(r"\n")
+
+# 标题和列表项可能的首字符，首字符不在其中的行（绝大多数正文行）无需执行正则匹配
+_TITLE_FIRST_CHARS = frozenset(
+    "第0123456789一二三四五六七八九十ABCDEFGHIJKLMNOPQRSTUVWXYZ（(【[《目前概简说注警"
+)
+_LIST_FIRST_CHARS = frozenset(
+    "•·○●◆▪-0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ("
+    "①②③④⑤⑥⑦⑧⑨⑩㈠㈡㈢㈣㈤㈥㈦㈧㈨㈩⒈⒉⒊⒋⒌⒍⒎⒏⒐⒑"
+)
+
+# 新主题的数字编号模式
+_TOPIC_PATTERN = re.compile(r"^\d+[.、]")
+
+# 新主题的特殊开头和括号开头
+_SPECIAL_STARTS = ("第", "一、", "二、", "三、", "1.", "2.", "3.", "注：", "注意：", "提示：", "警告：")
+_BRACKET_STARTS = ("（", "(", "【", "[", "《")
+
+# 绑定到模块级名称，避免每个片段都经过 hashlib 模块属性查找
+_sha256 = hashlib.sha256
+
+def _content_hash(content: str) -> str:
+    """
+    计算片段内容的SHA-256哈希
+
+    每个片段只编码一次；surrogatepass 使PDF提取出的孤立代理字符不会导致编码失败
+    """
+    return _sha256(content.encode("utf-8", "surrogatepass")).hexdigest()
+
+def _iter_qa_pairs(text: str) -> Iterator[Tuple[str, str]]:
+    r"""
+    按出现顺序提取问答对
+
+    结果与正则 Q\d+:\s*(.*?)\s*A\d+:\s*([\s\S]*?)(?=Q\d+:|$) 的 finditer 一致，
+    但先一次性找出所有 Qn:/An: 标记位置，再用二分查找在标记之间切片，
+    避免惰性量词在长文本上的回溯，整体为线性时间：
+    - 问题从 Qn: 后的空白之后开始，到其后第一个 An: 前的空白为止，且不能跨行
+      （不满足时跳过该 Qn:，与正则在下一个位置重新尝试相同）
+    - 答案从 An: 后的空白之后开始，到下一个 Qn: 或文本结尾（忽略末尾的一个换行）为止
+    """
+    q_starts, q_ends, a_starts, a_ends = [], [], [], []
+    for match in _QA_MARKER_PATTERN.finditer(text):
+        if match.group(1) == "Q":
+            q_starts.append(match.start())
+            q_ends.append(match.end())
+        else:
+            a_starts.append(match.start())
+            a_ends.append(match.end())
+    if not q_starts or not a_starts:
+        return
+        
+    newlines = [match.start() for match in _NEWLINE_PATTERN.finditer(text)]
+    # $ 可以匹配末尾换行符之前的位置
+    text_end = len(text) - 1 if text.endswith("\n") else len(text)
+    # 每个 An: 之前空白串的起点，多个 Qn: 共用同一个 An: 时只计算一次
+    question_ends: Dict[int, int] = {}
+    
+    qi = 0
+    while qi < len(q_starts):
+        question_start = _WHITESPACE_RUN_PATTERN.match(text, q_ends[qi]).end()
+        ai = bisect.bisect_left(a_starts, question_start)
+        if ai == len(a_starts):
+            # 后面已没有 An:，之后的 Qn: 也不可能匹配
+            return
+            
+        question_end = question_ends.get(ai)
+        if question_end is None:
+            question_end = a_starts[ai]
+            while question_end > 0 and text[question_end - 1].isspace():
+                question_end -= 1
+            question_ends[ai] = question_end
+        question_end = max(question_end, question_start)
+        
+        # 问题内容不能包含换行
+        ni = bisect.bisect_left(newlines, question_start)
+        if ni < len(newlines) and newlines[ni] < question_end:
+            qi += 1
+            continue
+            
+        answer_start = _WHITESPACE_RUN_PATTERN.match(text, a_ends[ai]).end()
+        qi = bisect.bisect_left(q_starts, answer_start)
+        answer_end = q_starts[qi] if qi < len(q_starts) else len(text)
+        if answer_start <= text_end < answer_end:
+            answer_end = text_end
+            
+        yield text[question_start:question_end], text[answer_start:answer_end]
+
+def _text_lengths(texts: List[str]) -> List[int]:
+    """按字符数计算文本长度（模块级函数，保证分割器实例可被进程池序列化）"""
+    return [len(text) for text in texts]
+
+def _segment_id_factory() -> Callable[[], str]:
+    """
+    创建片段ID生成器
+
+    每次分割调用只读取一次随机数作为前缀，低8字节使用递增计数器，
+    避免每个片段调用 uuid4() 都触发一次 os.urandom 系统调用。
+    生成的ID仍带有UUID4的版本和变体位，格式与 str(uuid.uuid4()) 一致。
+    前三段在创建时格式化一次，之后每个ID只需格式化计数器，不再构造 UUID 对象
+    """
+    # 前缀 "xxxxxxxx-xxxx-4xxx-"，已包含版本位
+    head = str(uuid.UUID(bytes=secrets.token_bytes(8) + bytes(8), version=4))[:19]
+    # 低8字节最高两位为变体位 10，计数器从该位置起递增
+    counter = itertools.count(0x8000000000000000)
+    
+    def new_id() -> str:
+        tail = f"{next(counter):016x}"
+        return f"{head}{tail[:4]}-{tail[4:]}"
+        
+    return new_id
+
 class SplitMode(str, Enum):
     """分割模式"""
     PARAGRAPH = "paragraph"  # 段落模式
@@ -39,7 +196,10 @@ class Rule:
         clean_text: bool = True,
         keep_separator: bool = False,
         remove_empty_lines: bool = True,
-        normalize_whitespace: bool = True
+        normalize_whitespace: bool = True,
+        # 跳过内容重复的片段（如多份文档共有的页眉页脚）。去重跨越同一批的所有文档，
+        # 被跳过的片段只保留在首个文档中，删除该文档后其他文档也随之失去这部分内容，因此默认关闭
+        deduplicate: bool = False
     ):
         self.mode = mode
         self.max_tokens = max_tokens
@@ -53,6 +213,7 @@ class Rule:
         self.keep_separator = keep_separator
         self.remove_empty_lines = remove_empty_lines
         self.normalize_whitespace = normalize_whitespace
+        self.deduplicate = deduplicate
 
 class DocumentSplitter:
     """文档分割器基类"""
@@ -62,13 +223,15 @@ class DocumentSplitter:
         chunk_overlap: int = 200,  # 默认重叠
         fixed_separator: str = "\n\n",  # 默认分隔符
         keep_separator: bool = True,
-        add_start_index: bool = True
+        add_start_index: bool = True,
+        length_function: Optional[Callable[[List[str]], List[int]]] = None  # 自定义长度函数（如按token计数）
     ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.fixed_separator = fixed_separator
         self.keep_separator = keep_separator
         self.add_start_index = add_start_index
+        self.length_function = length_function
         
         # 创建文本分割器
         self.text_splitter = FixedRecursiveCharacterTextSplitter.from_encoder(
@@ -77,47 +240,35 @@ class DocumentSplitter:
             fixed_separator=self.fixed_separator,
             separators=["\n\n", "\n", "。", "！", "？", ". ", " ", ""],
             keep_separator=self.keep_separator,
-            length_function=lambda x: [len(text) for text in x]
+            length_function=self.length_function or _text_lengths
         )
         
+        # 并行分割配置：默认关闭，DOC_SPLIT_WORKERS 大于1且文档数量达到阈值时才使用共用进程池
+        self.split_workers = int(os.environ.get("DOC_SPLIT_WORKERS", "1"))
+        self.parallel_threshold = int(os.environ.get("DOC_SPLIT_PARALLEL_THRESHOLD", "8"))
+        
         logger.info(f"初始化文档分割器: 分块大小={self.chunk_size}, 重叠={self.chunk_overlap}")
         
+    def _document_length_function(self) -> Callable[[List[str]], List[int]]:
+        """
+        获取分割单个文档时使用的长度函数
+        
+        默认按字符计数，len() 本身是O(1)的，缓存反而要对整段文本求哈希，因此不缓存；
+        传入自定义长度函数时，为每个文档创建独立的缓存，处理下一个文档时自动清空
+        """
+        if self.length_function is None:
+            return _text_lengths
+        return _MemoizedLengths(self.length_function)
+        
     def _is_title(self, text: str) -> bool:
         """判断是否为标题"""
-        # 标题模式
-        title_patterns = [
-            r"^第[一二三四五六七八九十百千万]+[章节篇]",  # 中文数字章节
-            r"^[0-9]+\.[0-9]+(\.[0-9]+)?",  # 数字编号（如1.2, 1.2.3）
-            r"^[一二三四五六七八九十][、.]",  # 中文数字编号
-            r"^[A-Z]\.",  # 字母编号
-            r"^[（(][一二三四五六七八九十][)）]",  # 带括号的中文数字
-            r"^[（(][0-9]+[)）]",  # 带括号的数字
-            r"^[【\[].+[】\]]$",  # 方括号包围
-            r"^《.+》$",  # 书名号包围
-            r"^目\s*录$",  # 目录
-            r"^前\s*言$",  # 前言
-            r"^概\s*述$",  # 概述
-            r"^简\s*介$",  # 简介
-            r"^说\s*明$",  # 说明
-            r"^注\s*意$",  # 注意
-            r"^警\s*告$",  # 警告
-        ]
-        return any(re.match(pattern, text.strip()) for pattern in title_patterns)
+        text = text.strip()
+        return text[:1] in _TITLE_FIRST_CHARS and _TITLE_UNION.match(text) is not None
 
     def _is_list_item(self, text: str) -> bool:
         """判断是否为列表项"""
-        # 列表项模式
-        list_patterns = [
-            r"^[•·○●◆▪-]",  # 常见列表符号
-            r"^[0-9]+\.",  # 数字编号
-            r"^[a-zA-Z]\.",  # 字母编号
-            r"^\([0-9]+\)",  # 带括号的数字
-            r"^\([a-zA-Z]\)",  # 带括号的字母
-            r"^[①②③④⑤⑥⑦⑧⑨⑩]",  # 圆圈数字
-            r"^[㈠㈡㈢㈣㈤㈥㈦㈧㈨㈩]",  # 括号数字
-            r"^[⒈⒉⒊⒋⒌⒍⒎⒏⒐⒑]",  # 带点数字
-        ]
-        return any(re.match(pattern, text.strip()) for pattern in list_patterns)
+        text = text.strip()
+        return text[:1] in _LIST_FIRST_CHARS and _LIST_UNION.match(text) is not None
         
     def _split_into_paragraphs(self, text: str) -> List[str]:
         """智能分割段落"""
@@ -126,7 +277,8 @@ class DocumentSplitter:
         
         # 预处理：规范化换行符
         text = text.replace('\r\n', '\n')
-        text = re.sub(r'\n{3,}', '\n\n', text)  # 将多个换行符压缩为两个
+        if '\n\n\n' in text:  # 子串查找远快于正则扫描，没有连续换行时跳过
+            text = _MULTI_NEWLINE_PATTERN.sub('\n\n', text)  # 将多个换行符压缩为两个
         
         # 按双换行符分割
         raw_paragraphs = text.split("\n\n")
@@ -138,16 +290,24 @@ class DocumentSplitter:
             if not para:
                 continue
                 
-            # 处理单换行的情况
-            lines = para.split("\n")
+            # 处理单换行的情况：每行只去除一次空白并预先分类，
+            # 循环中按下标取分类结果，避免对同一行重复匹配
+            lines = [line.strip() for line in para.split("\n")]
+            titles = [
+                line[:1] in _TITLE_FIRST_CHARS and _TITLE_UNION.match(line) is not None
+                for line in lines
+            ]
+            list_items = [
+                line[:1] in _LIST_FIRST_CHARS and _LIST_UNION.match(line) is not None
+                for line in lines
+            ]
             
             for i, line in enumerate(lines):
-                line = line.strip()
                 if not line:
                     continue
                     
                 # 如果是标题，作为独立段落
-                if self._is_title(line):
+                if titles[i]:
                     # 保存之前的段落
                     if current_paragraph:
                         paragraphs.append("\n".join(current_paragraph))
@@ -157,9 +317,9 @@ class DocumentSplitter:
                     continue
                 
                 # 如果是列表项
-                if self._is_list_item(line):
+                if list_items[i]:
                     # 如果前一行不是列表项，开始新段落
-                    if i > 0 and not self._is_list_item(lines[i-1].strip()):
+                    if i > 0 and not list_items[i-1]:
                         if current_paragraph:
                             paragraphs.append("\n".join(current_paragraph))
                             current_paragraph = []
@@ -171,11 +331,11 @@ class DocumentSplitter:
                     current_paragraph.append(line)
                     # 如果下一行是新主题（首字有特殊标记或缩进），保存当前段落
                     if i < len(lines) - 1:
-                        next_line = lines[i+1].strip()
+                        next_line = lines[i+1]
                         if (next_line and 
-                            (self._is_new_topic(next_line) or 
-                             self._is_title(next_line) or 
-                             self._is_list_item(next_line))):
+                            (titles[i+1] or 
+                             list_items[i+1] or 
+                             self._is_new_topic(next_line))):
                             if current_paragraph:
                                 paragraphs.append("\n".join(current_paragraph))
                                 current_paragraph = []
@@ -190,74 +350,113 @@ class DocumentSplitter:
         
     def _is_new_topic(self, text: str) -> bool:
         """判断是否是新主题的开始"""
-        # 1. 检查是否以特殊字符开头
-        special_starts = ["第", "一、", "二、", "三、", "1.", "2.", "3.", "注：", "注意：", "提示：", "警告："]
-        for start in special_starts:
-            if text.startswith(start):
-                return True
+        # 1. 检查是否以特殊字符开头（元组参数在C层一次完成所有前缀比较）
+        if text.startswith(_SPECIAL_STARTS):
+            return True
                 
         # 2. 检查是否以括号开头
-        if text.startswith(("（", "(", "【", "[", "《")):
+        if text.startswith(_BRACKET_STARTS):
             return True
             
-        # 3. 检查是否以数字编号开头
-        if re.match(r"^\d+[.、]", text):
+        # 3. 检查是否以数字编号开头（\d 匹配的正是 isdecimal() 为真的字符）
+        if text[:1].isdecimal() and _TOPIC_PATTERN.match(text):
             return True
             
         return False
         
+    def _split_all(self, documents: List[Document], rule: Rule) -> List[DocumentSegment]:
+        """
+        逐个分割文档并合并结果，文档数量较多时使用进程池并行分割
+        
+        各文档相互独立，子进程只返回片段列表，分割过程中对文档本身的修改不会回写
+        
+        Args:
+            documents: 要分割的文档列表
+            rule: 分割规则
+            
+        Returns:
+            所有文档的片段列表，顺序与输入一致
+        """
+        all_segments = []
+        
+        if self.split_workers > 1 and len(documents) >= self.parallel_threshold:
+            chunksize = max(1, len(documents) // (self.split_workers * 4))
+            logger.info(f"使用 {self.split_workers} 个进程并行分割 {len(documents)} 个文档, chunksize={chunksize}")
+            for segments in get_process_pool().map(self._split_document, documents, repeat(rule), chunksize=chunksize):
+                all_segments.extend(segments)
+        else:
+            for doc in documents:
+                all_segments.extend(self._split_document(doc, rule))
+                
+        return all_segments
+        
     def split_documents(self, documents: List[Document], rule: Optional[Rule] = None) -> List[DocumentSegment]:
         """分割文档"""
         if not rule:
             rule = Rule()
             
-        all_segments = []
+        return self._split_all(documents, rule)
         
-        for doc in documents:
-            # 1. 首先按段落分割
-            paragraphs = self._split_into_paragraphs(doc.page_content)
-            
-            # 2. 处理每个段落
-            for i, para in enumerate(paragraphs):
-                # 创建父文档
-                parent_id = str(uuid.uuid4())
-                parent_segment = DocumentSegment(
-                    id=parent_id,
-                    page_content=para,
-                    metadata={
-                        "source": doc.source,
-                        "type": "parent",
-                        "index": i + 1,
-                        "original_doc_id": doc.doc_id
-                    }
-                )
-                all_segments.append(parent_segment)
-                
-                # 如果段落较长，创建子文档
-                if len(para) > rule.subchunk_max_tokens:
+    def _split_document(self, doc: Document, rule: Rule) -> List[DocumentSegment]:
+        """分割单个文档"""
+        segments = []
+        new_id = _segment_id_factory()
+        
+        # 子文档分割器在同一文档的所有段落间复用，首次遇到长段落时才创建
+        child_splitter = None
+        lengths = self._document_length_function()
+        
+        # 循环中不变的属性只读取一次；多数段落较短，只需创建父文档
+        source = doc.source
+        original_doc_id = doc.doc_id
+        subchunk_max_tokens = rule.subchunk_max_tokens
+        
+        # 1. 首先按段落分割
+        paragraphs = self._split_into_paragraphs(doc.page_content)
+
+        # 2. 处理每个段落
+        for i, para in enumerate(paragraphs):
+            # 创建父文档
+            parent_id = new_id()
+            parent_segment = DocumentSegment(
+                id=parent_id,
+                page_content=para,
+                metadata={
+                    "source": source,
+                    "type": "parent",
+                    "index": i + 1,
+                    "original_doc_id": original_doc_id
+                }
+            )
+            segments.append(parent_segment)
+
+            # 如果段落较长，创建子文档
+            if len(para) > subchunk_max_tokens:
+                if child_splitter is None:
                     child_splitter = FixedRecursiveCharacterTextSplitter(
                         chunk_size=rule.subchunk_max_tokens,
                         chunk_overlap=rule.subchunk_overlap,
-                        fixed_separator=rule.subchunk_separator
+                        fixed_separator=rule.subchunk_separator,
+                        length_function=lengths
                     )
-                    child_texts = child_splitter.split_text(para)
-                    
-                    for j, child_text in enumerate(child_texts):
-                        child_id = str(uuid.uuid4())
-                        child_segment = DocumentSegment(
-                            id=child_id,
-                            page_content=child_text,
-                            metadata={
-                                "source": doc.source,
-                                "type": "child",
-                                "parent_id": parent_id,
-                                "index": j + 1,
-                                "original_doc_id": doc.doc_id
-                            }
-                        )
-                        all_segments.append(child_segment)
+                child_texts = child_splitter.split_text(para)
+
+                for j, child_text in enumerate(child_texts):
+                    child_id = new_id()
+                    child_segment = DocumentSegment(
+                        id=child_id,
+                        page_content=child_text,
+                        metadata={
+                            "source": source,
+                            "type": "child",
+                            "parent_id": parent_id,
+                            "index": j + 1,
+                            "original_doc_id": original_doc_id
+                        }
+                    )
+                    segments.append(child_segment)
         
-        return all_segments
+        return segments
 
 class QADocumentSplitter(DocumentSplitter):
     """问答文档分割器"""
@@ -266,34 +465,35 @@ class QADocumentSplitter(DocumentSplitter):
         if not rule:
             rule = Rule(mode=SplitMode.QA)
             
-        all_segments = []
+        return self._split_all(documents, rule)
         
-        for doc in documents:
-            # 使用正则表达式匹配问答对
-            qa_pattern = r"Q\d+:\s*(.*?)\s*A\d+:\s*([\s\S]*?)(?=Q\d+:|$)"
-            matches = re.findall(qa_pattern, doc.page_content, re.UNICODE)
-            
-            for i, (question, answer) in enumerate(matches):
-                if not question.strip() or not answer.strip():
-                    continue
-                    
-                # 创建问答片段
-                qa_id = str(uuid.uuid4())
-                qa_segment = DocumentSegment(
-                    id=qa_id,
-                    page_content=f"问：{question.strip()}\n答：{answer.strip()}",
-                    metadata={
-                        "source": doc.source,
-                        "type": "qa",
-                        "index": i + 1,
-                        "question": question.strip(),
-                        "answer": answer.strip(),
-                        "original_doc_id": doc.doc_id
-                    }
-                )
-                all_segments.append(qa_segment)
+    def _split_document(self, doc: Document, rule: Rule) -> List[DocumentSegment]:
+        """分割单个问答文档"""
+        segments = []
+        new_id = _segment_id_factory()
         
-        return all_segments
+        # 线性扫描问答标记，逐个提取问答对
+        for i, (question, answer) in enumerate(_iter_qa_pairs(doc.page_content)):
+            if not question.strip() or not answer.strip():
+                continue
+
+            # 创建问答片段
+            qa_id = new_id()
+            qa_segment = DocumentSegment(
+                id=qa_id,
+                page_content=f"问：{question.strip()}\n答：{answer.strip()}",
+                metadata={
+                    "source": doc.source,
+                    "type": "qa",
+                    "index": i + 1,
+                    "question": question.strip(),
+                    "answer": answer.strip(),
+                    "original_doc_id": doc.doc_id
+                }
+            )
+            segments.append(qa_segment)
+        
+        return segments
 
 class ParentChildDocumentSplitter(DocumentSplitter):
     """父子文档分割器"""
@@ -302,88 +502,147 @@ class ParentChildDocumentSplitter(DocumentSplitter):
         if not rule:
             rule = Rule(mode=SplitMode.PARENT_CHILD)
             
-        all_segments = []
+        segments = self._split_all(documents, rule)
+        if rule.deduplicate:
+            segments = self._deduplicate_segments(segments)
+        return segments
         
-        for doc in documents:
-            # 1. 对原始文档进行完整清理
-            doc.page_content = CleanProcessor.clean(doc.page_content, level=CleanLevel.FULL)
-            if not doc.page_content:
-                continue
-                
-            # 2. 创建父文档分词器
-            parent_splitter = FixedRecursiveCharacterTextSplitter.from_encoder(
-                chunk_size=rule.max_tokens,
-                chunk_overlap=rule.chunk_overlap,
-                fixed_separator="\n\n",  # 固定使用双换行作为主分隔符
-                separators=["\n\n", "。", ". ", " ", ""],  # 递归分隔符
-                keep_separator=rule.keep_separator,
-                length_function=lambda x: [len(text) for text in x]
-            )
-            
-            # 3. 分割父文档
-            parent_nodes = parent_splitter.split_text(doc.page_content)
+    @staticmethod
+    def _deduplicate_segments(segments: List[DocumentSegment]) -> List[DocumentSegment]:
+        """
+        按 doc_hash 去除重复片段，保留首次出现的片段
+        
+        重复的父块连同其子块一起跳过，避免子块指向不存在的父块；
+        子块只与其他子块比较，内容相同的子块只保留一个，减少后续的向量化开销
+        
+        Args:
+            segments: 分割得到的片段列表
             
-            # 4. 处理每个父节点
-            for i, parent_content in enumerate(parent_nodes):
-                parent_content = parent_content.strip()
-                if not parent_content:
-                    continue
+        Returns:
+            去重后的片段列表，顺序不变
+        """
+        seen_parents = set()
+        dropped_parent_ids = set()
+        for segment in segments:
+            if segment.metadata["type"] == "parent":
+                doc_hash = segment.metadata["doc_hash"]
+                if doc_hash in seen_parents:
+                    dropped_parent_ids.add(segment.id)
+                else:
+                    seen_parents.add(doc_hash)
                     
-                # 创建父文档
-                parent_id = str(uuid.uuid4())
-                parent_hash = hashlib.sha256(parent_content.encode()).hexdigest()
-                
-                parent_segment = DocumentSegment(
-                    id=parent_id,
-                    page_content=parent_content,
-                    metadata={
-                        "source": doc.source,
-                        "type": "parent",
-                        "index": i + 1,
-                        "original_doc_id": doc.doc_id,
-                        "doc_hash": parent_hash
-                    }
-                )
-                
-                # 5. 创建子文档分词器
-                if rule.subchunk_max_tokens > 0:
+        seen_children = set()
+        unique_segments = []
+        for segment in segments:
+            metadata = segment.metadata
+            if metadata["type"] == "parent":
+                if segment.id in dropped_parent_ids:
+                    continue
+            else:
+                if metadata["parent_id"] in dropped_parent_ids or metadata["doc_hash"] in seen_children:
+                    continue
+                seen_children.add(metadata["doc_hash"])
+            unique_segments.append(segment)
+            
+        if len(unique_segments) < len(segments):
+            logger.info(f"去除重复片段 {len(segments) - len(unique_segments)} 个，剩余 {len(unique_segments)} 个")
+        return unique_segments
+        
+    def _split_document(self, doc: Document, rule: Rule) -> List[DocumentSegment]:
+        """分割单个父子文档"""
+        segments = []
+        new_id = _segment_id_factory()
+        
+        # 1. 对原始文档进行完整清理
+        doc.page_content = CleanProcessor.clean(doc.page_content, level=CleanLevel.FULL)
+        if not doc.page_content:
+            return segments
+
+        # 父块和子块分割器共享同一个长度函数（及其缓存）
+        lengths = self._document_length_function()
+        
+        # 2. 创建父文档分词器
+        parent_splitter = FixedRecursiveCharacterTextSplitter.from_encoder(
+            chunk_size=rule.max_tokens,
+            chunk_overlap=rule.chunk_overlap,
+            fixed_separator="\n\n",  # 固定使用双换行作为主分隔符
+            separators=["\n\n", "。", ". ", " ", ""],  # 递归分隔符
+            keep_separator=rule.keep_separator,
+            length_function=lengths
+        )
+
+        # 3. 分割父文档
+        parent_nodes = parent_splitter.split_text(doc.page_content)
+        
+        # 子文档分割器在所有父节点间复用，首次需要时才创建
+        child_splitter = None
+
+        # 4. 处理每个父节点
+        for i, parent_content in enumerate(parent_nodes):
+            parent_content = parent_content.strip()
+            if not parent_content:
+                continue
+
+            # 创建父文档
+            parent_id = new_id()
+            parent_hash = _content_hash(parent_content)
+
+            parent_segment = DocumentSegment(
+                id=parent_id,
+                page_content=parent_content,
+                metadata={
+                    "source": doc.source,
+                    "type": "parent",
+                    "index": i + 1,
+                    "original_doc_id": doc.doc_id,
+                    "doc_hash": parent_hash
+                }
+            )
+
+            # 5. 创建子文档分词器
+            if rule.subchunk_max_tokens > 0:
+                if child_splitter is None:
                     child_splitter = FixedRecursiveCharacterTextSplitter.from_encoder(
                         chunk_size=rule.subchunk_max_tokens,
                         chunk_overlap=rule.subchunk_overlap,
                         fixed_separator="\n",  # 固定使用单换行作为主分隔符
                         separators=["\n", " ", ""],  # 递归分隔符
                         keep_separator=rule.keep_separator,
-                        length_function=lambda x: [len(text) for text in x]
+                        length_function=lengths
                     )
-                    
-                    # 6. 分割子文档
-                    child_nodes = child_splitter.split_text(parent_content)
-                    
-                    # 7. 处理每个子节点
-                    for j, child_content in enumerate(child_nodes):
-                        child_content = child_content.strip()
-                        if not child_content or len(child_content) < rule.min_content_length:
-                            continue
-                            
-                        # 创建子文档
-                        child_id = str(uuid.uuid4())
-                        child_hash = hashlib.sha256(child_content.encode()).hexdigest()
-                        
-                        child_segment = DocumentSegment(
-                            id=child_id,
-                            page_content=child_content,
-                            metadata={
-                                "source": doc.source,
-                                "type": "child",
-                                "parent_id": parent_id,
-                                "index": j + 1,
-                                "original_doc_id": doc.doc_id,
-                                "doc_hash": child_hash
-                            }
-                        )
-                        all_segments.append(child_segment)
-                
-                # 添加父文档
-                all_segments.append(parent_segment)
+
+                # 6. 分割子文档
+                child_nodes = child_splitter.split_text(parent_content)
+
+                # 7. 处理每个子节点
+                for j, child_content in enumerate(child_nodes):
+                    child_content = child_content.strip()
+                    if not child_content or len(child_content) < rule.min_content_length:
+                        continue
+
+                    # 创建子文档
+                    child_id = new_id()
+                    # 父块不超过子块大小时，唯一的子块就是父块本身，直接复用父块哈希
+                    if child_content == parent_content:
+                        child_hash = parent_hash
+                    else:
+                        child_hash = _content_hash(child_content)
+
+                    child_segment = DocumentSegment(
+                        id=child_id,
+                        page_content=child_content,
+                        metadata={
+                            "source": doc.source,
+                            "type": "child",
+                            "parent_id": parent_id,
+                            "index": j + 1,
+                            "original_doc_id": doc.doc_id,
+                            "doc_hash": child_hash
+                        }
+                    )
+                    segments.append(child_segment)
+
+            # 添加父文档
+            segments.append(parent_segment)
         
-        return all_segments 
\ No newline at end of file
+        return segments 
\ No newline at end of file
@@ -75,6 +75,18 @@ class DocumentStore:
             logger.error(f"删除父块及子块失败: {e}")
             raise
             
+    async def delete_segments(self, segment_ids: List[str]):
+        """批量删除多个父块及其子块，每个集合只执行一次删除"""
+        if not segment_ids:
+            return
+        try:
+            await self.segments_collection.delete_many({"index_node_id": {"$in": segment_ids}})
+            await self.chunks_collection.delete_many({"segment_id": {"$in": segment_ids}})
+            logger.info(f"删除 {len(segment_ids)} 个父块及其子块成功")
+        except Exception as e:
+            logger.error(f"批量删除父块及子块失败: {e}")
+            raise
+            
     async def update_segment(self, segment: DocumentSegment):
         """更新父块"""
         try:
@@ -6,7 +6,9 @@ import os
 import time
 import logging
 import requests
-from typing import List, Optional
+from requests.adapters import HTTPAdapter
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 logger = logging.getLogger(__name__)
@@ -25,6 +27,17 @@ class EmbeddingModel:
         self.retry_delay = int(os.environ.get("EMBEDDING_RETRY_DELAY", "5"))
         self.timeout = int(os.environ.get("EMBEDDING_TIMEOUT", "30"))
         
+        # 并发批次数：HTTP请求等待期间会释放GIL，多个批次可同时在途
+        self.max_concurrency = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "4"))
+        
+        # 复用HTTP会话，各批次共享连接池并保持长连接，避免每次请求重新建立TCP/TLS连接
+        # 重试由 _embed_batch_with_retry 负责，适配器本身不重试
+        self.pool_maxsize = max(self.max_concurrency, int(os.environ.get("EMBEDDING_POOL_MAXSIZE", "16")))
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        
         logger.info(f"初始化嵌入模型: 模型={self.model_name}, API地址={self.api_base}")
         logger.info(f"批处理配置: 最大批量={self.max_batch_size}, 重试次数={self.max_retries}, 重试间隔={self.retry_delay}秒, 超时={self.timeout}秒")
     
@@ -53,13 +66,15 @@ class EmbeddingModel:
                 logger.info(f"直接处理 {len(texts)} 个文本")
                 return self._embed_batch_with_retry(texts)
             
-            # 否则，分批处理
+            # 否则，分批并发处理，结果按批次顺序合并
+            batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+            workers = max(1, min(self.max_concurrency, len(batches)))
+            logger.info(f"分 {len(batches)} 个批次处理，并发数: {workers}")
+            
             embeddings = []
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                logger.info(f"处理批次 {i//batch_size + 1}/{(len(texts)-1)//batch_size + 1}, 大小: {len(batch)}")
-                batch_embeddings = self._embed_batch_with_retry(batch)
-                embeddings.extend(batch_embeddings)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for batch_embeddings in executor.map(self._embed_batch_with_retry, batches):
+                    embeddings.extend(batch_embeddings)
             
             return embeddings
             
@@ -68,6 +83,42 @@ class EmbeddingModel:
             logger.error(f"详细错误: {traceback.format_exc()}")
             raise
     
+    def embed_documents_array(self, texts: List[str], dtype: str = "float32") -> np.ndarray:
+        """
+        生成文档的嵌入向量并返回紧凑的numpy数组
+        
+        Python的浮点数列表每个值约占28字节，float32/float16数组只需4/2字节，
+        适合批量入库等需要长时间持有大量向量的场景
+        
+        Args:
+            texts: 文本列表
+            dtype: 数组数据类型，如 "float32" 或 "float16"
+            
+        Returns:
+            形状为 (文本数量, 向量维度) 的数组
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=dtype)
+        return np.asarray(self.embed_documents(texts), dtype=dtype)
+        
+    @staticmethod
+    def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按行对称量化为int8
+        
+        Args:
+            embeddings: 形状为 (n, dim) 的浮点向量数组
+            
+        Returns:
+            (int8向量数组, 每行的缩放系数)，还原时使用 vectors * scales[:, None]
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        # 全零向量的缩放系数置为1，避免除零
+        scales[scales == 0] = 1.0
+        quantized = np.round(embeddings / scales[:, None]).astype(np.int8)
+        return quantized, scales
+        
     def _embed_batch_with_retry(self, texts: List[str]) -> List[List[float]]:
         """带重试机制的批量嵌入"""
         last_error = None
@@ -85,7 +136,7 @@ class EmbeddingModel:
                 }
                 
                 # 发送请求
-                response = requests.post(
+                response = self._session.post(
                     f"{self.api_base}/api/embeddings",
                     json=data,
                     timeout=self.timeout
@@ -115,7 +166,7 @@ class EmbeddingModel:
         """将单个文本转换为向量，适配 OpenAI 兼容 embedding API"""
         try:
             # 调用 OpenAI 兼容 API
-            response = requests.post(
+            response = self._session.post(
                 f"{self.api_base}/v1/embeddings",
                 json={
                     "model": self.model_name,
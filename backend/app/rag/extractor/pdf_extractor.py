@@ -3,16 +3,38 @@
 from collections.abc import Iterator
 from typing import Optional, cast
 import io
+import os
 import logging
+import uuid
 
 import pypdfium2
 
 from .extractor_base import BaseExtractor
 from ..models import Document
 from ..cleaner.clean_processor import CleanProcessor
+from ..process_pool import get_process_pool
 
 logger = logging.getLogger(__name__)
 
+def _extract_page_range(file_path: str, start: int, stop: int) -> list[str]:
+    """提取指定页码范围 [start, stop) 的原始文本
+    
+    定义为模块级函数以便在进程池中执行。pdfium 不是线程安全的，
+    每个进程单独打开自己的 PdfDocument
+    """
+    pdf_document = pypdfium2.PdfDocument(file_path)
+    try:
+        page_texts = []
+        for index in range(start, stop):
+            page = pdf_document[index]
+            text_page = page.get_textpage()
+            page_texts.append(text_page.get_text_range())
+            text_page.close()
+            page.close()
+        return page_texts
+    finally:
+        pdf_document.close()
+
 class PdfExtractor(BaseExtractor):
     """PDF文档提取器
     
@@ -27,43 +49,96 @@ class PdfExtractor(BaseExtractor):
         self._file_path = file_path
         self._file_cache_key = file_cache_key
         
+        # 并行提取配置：默认关闭，PDF_EXTRACT_WORKERS 大于1且页数达到阈值时才按页码范围分给共用进程池
+        self._workers = int(os.environ.get("PDF_EXTRACT_WORKERS", "1"))
+        self._parallel_min_pages = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "64"))
+        
     def extract(self) -> list[Document]:
         """提取PDF文档内容"""
         try:
             logger.info(f"开始提取PDF文档: {self._file_path}")
             
-            # 打开PDF文件
-            pdf_document = pypdfium2.PdfDocument(self._file_path)
+            page_texts = self._extract_page_texts()
+                
             documents = []
-            
-            try:
-                # 逐页提取文本
-                for page_number, page in enumerate(pdf_document):
-                    text_page = page.get_textpage()
-                    content = text_page.get_text_range()
-                    text_page.close()
-                    page.close()
-                    
-                    # 清理文本
-                    content = CleanProcessor.clean(content)
-                    
-                    if content.strip():
-                        # 创建文档对象
-                        doc = Document(
-                            content=content,
-                            metadata={
-                                "source": self._file_path,
-                                "page": page_number + 1  # 页码从1开始
-                            }
-                        )
-                        documents.append(doc)
-                        
-            finally:
-                pdf_document.close()
+            for page_number, content in enumerate(self._clean_pages(page_texts)):
+                if content:
+                    # 创建文档对象
+                    doc = Document(
+                        page_content=content,
+                        metadata={
+                            "source": self._file_path,
+                            "page": page_number + 1  # 页码从1开始
+                        }
+                    )
+                    documents.append(doc)
                 
             logger.info(f"PDF文档提取完成: {self._file_path}, 共{len(documents)}页")
             return documents
             
         except Exception as e:
             logger.error(f"PDF文档提取失败: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+            
+    def _extract_page_texts(self) -> list[str]:
+        """提取所有页面的原始文本，页数较多时使用进程池按页码范围并行提取"""
+        pdf_document = pypdfium2.PdfDocument(self._file_path)
+        try:
+            page_count = len(pdf_document)
+            if self._workers <= 1 or page_count < self._parallel_min_pages:
+                # 逐页提取原始文本，先收集到列表中，不逐页清理
+                page_texts = []
+                for page in pdf_document:
+                    text_page = page.get_textpage()
+                    page_texts.append(text_page.get_text_range())
+                    text_page.close()
+                    page.close()
+                return page_texts
+        finally:
+            pdf_document.close()
+            
+        # 每个进程处理一段连续页码，减少重复打开文档的次数
+        step = -(-page_count // self._workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        logger.info(f"使用 {len(ranges)} 个进程并行提取 {page_count} 页")
+        
+        page_texts = []
+        executor = get_process_pool()
+        futures = [
+            executor.submit(_extract_page_range, self._file_path, start, stop)
+            for start, stop in ranges
+        ]
+        for future in futures:
+            page_texts.extend(future.result())
+        return page_texts
+        
+    @staticmethod
+    def _clean_pages(page_texts: list[str]) -> list[str]:
+        """整篇清理所有页面文本，再按页拆分
+        
+        各页用独占一行的分页标记拼接后只调用一次 CleanProcessor.clean，
+        清理规则均不跨行，因此结果与逐页清理一致
+        
+        Args:
+            page_texts: 各页原始文本
+            
+        Returns:
+            各页清理后的文本，顺序与页码一致
+        """
+        if not page_texts:
+            return []
+            
+        # 分页标记只包含字母和数字，不会被清理规则删除或改写
+        marker = f"PAGEBREAK{uuid.uuid4().hex}"
+        full_text = CleanProcessor.clean(f"\n{marker}\n".join(page_texts))
+        
+        pages = []
+        current = []
+        for line in full_text.split("\n"):
+            if line == marker:
+                pages.append("\n".join(current).strip())
+                current = []
+            else:
+                current.append(line)
+        pages.append("\n".join(current).strip())
+        return pages
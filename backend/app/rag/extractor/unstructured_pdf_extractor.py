@@ -50,17 +50,14 @@ class UnstructuredPDFExtractor(BaseExtractor):
             max_characters=2000,
             combine_text_under_n_chars=2000
         )
+        # 分块完成后立即释放元素列表，避免与分块结果同时常驻内存
+        del elements
         
-        documents = []
-        for chunk in chunks:
-            text = chunk.text.strip()
-            if text:
-                documents.append(Document(
-                    content=text,
-                    metadata={
-                        "source": self._file_path
-                    }
-                ))
+        documents = [
+            Document(page_content=text, metadata={"source": self._file_path})
+            for text in (chunk.text.strip() for chunk in chunks)
+            if text
+        ]
         
         logger.info(f"成功提取PDF文件，共{len(documents)}个文档块")
         return documents 
\ No newline at end of file
@@ -1,49 +1,193 @@
 """
 文档模型定义
 """
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field as PydanticField
+from typing import Dict, Any, List, Optional, Annotated
+import numpy as np
+from pydantic import BaseModel, Field as PydanticField, PrivateAttr, computed_field, PlainValidator, PlainSerializer, WithJsonSchema
 from .constants import Field as ConstantField
+import os
 import uuid
+import json
+import secrets
+import itertools
 import hashlib
+import logging
+from functools import partial, lru_cache, cached_property
 from dataclasses import dataclass, field
 
+logger = logging.getLogger(__name__)
+
+# 向量存储数据结构的字段名，模块加载时取出枚举值，to_point_struct 中不再逐次访问枚举属性
+_PRIMARY_KEY = ConstantField.PRIMARY_KEY.value
+_VECTOR = ConstantField.VECTOR.value
+_CONTENT_KEY = ConstantField.CONTENT_KEY.value
+_METADATA_KEY = ConstantField.METADATA_KEY.value
+_GROUP_KEY = ConstantField.GROUP_KEY.value
+_SPARSE_VECTOR = ConstantField.SPARSE_VECTOR.value
+
+def _resolve_hash_function():
+    """
+    根据 DOC_HASH_ALGORITHM 选择文档哈希算法
+    
+    默认 sha256，与已入库的 doc_hash 保持一致；哈希仅用于内容寻址，不需要密码学强度，
+    可选 blake2b（标准库）或 blake3（需安装 blake3 包）以提高吞吐。
+    所有算法都输出32字节摘要，doc_hash 仍为64位十六进制字符串
+    """
+    algorithm = os.environ.get("DOC_HASH_ALGORITHM", "sha256").lower()
+    if algorithm == "blake2b":
+        return partial(hashlib.blake2b, digest_size=32)
+    if algorithm == "blake3":
+        try:
+            from blake3 import blake3
+            return blake3
+        except ImportError:
+            logger.warning("未安装 blake3，文档哈希回退为 sha256")
+    elif algorithm != "sha256":
+        logger.warning(f"不支持的文档哈希算法: {algorithm}，使用 sha256")
+        
+    # 链接OpenSSL的 hashlib.sha256 会在运行时自动选用 SHA-NI 等硬件指令；
+    # 未链接OpenSSL时回退为纯软件实现，速度慢数倍
+    if getattr(hashlib.sha256, "__name__", "") != "openssl_sha256":
+        logger.warning("hashlib 未使用 OpenSSL 实现 sha256，无法利用 SHA-NI 硬件加速，可设置 DOC_HASH_ALGORITHM=blake2b")
+    return hashlib.sha256
+
+_hash_function = _resolve_hash_function()
+
+def _resolve_metadata_encoder():
+    """
+    根据 DOC_HASH_METADATA_ENCODING 选择元数据参与哈希时的编码方式
+    
+    默认 repr，即 str(sorted(metadata.items()))，与已入库的 doc_hash 保持一致；
+    json 使用按键排序的规范JSON字节，安装了 orjson 时在C层完成排序和序列化，
+    省去Python层的列表排序和 repr，但会改变 doc_hash 的值
+    """
+    encoding = os.environ.get("DOC_HASH_METADATA_ENCODING", "repr").lower()
+    if encoding == "json":
+        try:
+            import orjson
+            options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            return lambda metadata: orjson.dumps(metadata, option=options, default=str)
+        except ImportError:
+            return lambda metadata: json.dumps(
+                metadata, sort_keys=True, ensure_ascii=False, default=str
+            ).encode()
+    if encoding != "repr":
+        logger.warning(f"不支持的元数据编码方式: {encoding}，使用 repr")
+    return lambda metadata: str(sorted(metadata.items()))
+
+_encode_metadata = _resolve_metadata_encoder()
+
+# 缓存会持有完整的内容字符串，条目数不宜过大
+@lru_cache(maxsize=int(os.environ.get("DOC_HASH_CACHE_SIZE", "4096")))
+def _hash_text(content: str, metadata_key) -> str:
+    """
+    计算内容与元数据编码的哈希值
+    
+    重叠切分会反复构造内容相同的文档，按 (内容, 元数据编码) 缓存，
+    命中时跳过拼接和哈希计算。缓存键为完整内容，不会因摘要碰撞返回错误结果
+    """
+    if isinstance(metadata_key, bytes):
+        # 规范JSON编码：分段写入哈希对象，不拼接字符串
+        hasher = _hash_function(content.encode())
+        hasher.update(b"\x00")
+        hasher.update(metadata_key)
+        return hasher.hexdigest()
+    return _hash_function((content + metadata_key).encode()).hexdigest()
+
+def _reset_id_prefix() -> None:
+    """重新生成文档ID前缀并重置计数器，fork 出的子进程也会调用，避免与父进程生成相同ID"""
+    global _id_head, _id_counter
+    # 前缀 "xxxxxxxx-xxxx-4xxx-"，已包含版本位
+    _id_head = str(uuid.UUID(bytes=secrets.token_bytes(8) + bytes(8), version=4))[:19]
+    # 低8字节最高两位为变体位 10，计数器从该位置起递增
+    _id_counter = itertools.count(0x8000000000000000)
+
+_reset_id_prefix()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_id_prefix)
+
+def new_doc_id() -> str:
+    """
+    生成文档ID
+    
+    进程内只读取一次随机数作为前缀，低8字节使用递增计数器，
+    避免每个文档调用 uuid4() 触发 os.urandom 系统调用并构造 UUID 对象。
+    格式与 str(uuid.uuid4()) 一致，仍带有UUID4的版本和变体位
+    """
+    tail = f"{next(_id_counter):016x}"
+    return f"{_id_head}{tail[:4]}-{tail[4:]}"
+
+def _to_float32_vector(value) -> np.ndarray:
+    """将输入的向量（列表或数组）转换为一维 float32 数组，已是 float32 数组时不复制"""
+    array = np.asarray(value, dtype=np.float32)
+    if array.ndim != 1:
+        raise ValueError(f"向量必须是一维数组，实际维度: {array.ndim}")
+    return array
+
+# 以 float32 数组保存的向量：每个分量4字节，Python 浮点数列表每个值约占28字节；
+# 序列化（dict/JSON）时仍输出浮点数列表，接口格式不变
+FloatVector = Annotated[
+    np.ndarray,
+    PlainValidator(_to_float32_vector),
+    PlainSerializer(lambda array: array.tolist(), return_type=List[float]),
+    WithJsonSchema({"type": "array", "items": {"type": "number"}})
+]
+
 class Document(BaseModel):
     """文档基类"""
     page_content: str
     metadata: Dict[str, Any] = PydanticField(default_factory=dict)
     source: Optional[str] = None
     doc_id: Optional[str] = None
-    doc_hash: Optional[str] = None
-    vector: Optional[List[float]] = None
-    sparse_vector: Optional[List[float]] = None
+    vector: Optional[FloatVector] = None
+    sparse_vector: Optional[FloatVector] = None
     group_id: Optional[str] = None
     children: Optional[List['Document']] = None
+    # metadata["source"] 是否由构造函数根据 source 字段补入；补入的键不参与哈希
+    _source_injected: bool = PrivateAttr(default=False)
     
-    def __init__(self, **data):
+    def __init__(self, doc_hash: Optional[str] = None, **data):
+        # 派生字段尽量在校验前填入，构造后逐个赋值会触发 BaseModel.__setattr__ 的检查开销
+        if not data.get("doc_id"):
+            data["doc_id"] = new_doc_id()
         super().__init__(**data)
-        if not self.doc_id:
-            self.doc_id = str(uuid.uuid4())
-        if not self.doc_hash:
-            self.doc_hash = self._generate_hash()
+        if doc_hash:
+            # 已知哈希（如从数据库加载）直接写入 cached_property 的缓存
+            self.__dict__["doc_hash"] = doc_hash
         if self.source and "source" not in self.metadata:
             self.metadata["source"] = self.source
+            self._source_injected = True
+            
+    @computed_field
+    @cached_property
+    def doc_hash(self) -> str:
+        """
+        文档哈希值，首次访问时计算
+        
+        切分过程中的中间文档大多不会读取哈希，且内容和元数据在构造后还会被修改，
+        延迟到首次访问时计算，既省去无用的计算，也保证哈希对应修改后的内容
+        """
+        return self._generate_hash()
             
     def _generate_hash(self) -> str:
-        """生成文档哈希值"""
-        text = self.page_content + str(sorted(self.metadata.items()))
-        return hashlib.sha256(text.encode()).hexdigest()
+        """生成文档哈希值，元数据不含构造时补入的 source，与补入前计算的哈希一致"""
+        metadata = self.metadata
+        if self._source_injected:
+            metadata = {key: value for key, value in metadata.items() if key != "source"}
+        return _hash_text(self.page_content, _encode_metadata(metadata))
         
     def to_point_struct(self) -> Dict[str, Any]:
         """转换为向量存储的数据结构"""
-        return {
-            ConstantField.PRIMARY_KEY.value: self.doc_id,
-            ConstantField.VECTOR.value: self.vector,
-            ConstantField.CONTENT_KEY.value: self.page_content,
-            ConstantField.METADATA_KEY.value: self.metadata,
-            ConstantField.GROUP_KEY.value: self.group_id or "",
-            ConstantField.SPARSE_VECTOR.value: self.sparse_vector or self.vector
+        point = {
+            _PRIMARY_KEY: self.doc_id,
+            _VECTOR: self.vector,
+            _CONTENT_KEY: self.page_content,
+            _METADATA_KEY: self.metadata,
+            _GROUP_KEY: self.group_id or ""
         }
+        if self.sparse_vector is not None:
+            point[_SPARSE_VECTOR] = self.sparse_vector
+        return point
 
 class DocumentSegment(BaseModel):
     """文档片段"""
@@ -58,26 +202,25 @@ class DocumentSegment(BaseModel):
     def __init__(self, **data):
         super().__init__(**data)
         if not self.id:
-            self.id = str(uuid.uuid4())
+            self.id = new_doc_id()
         if "doc_hash" not in self.metadata:
             self.metadata["doc_hash"] = self._generate_hash()
             
     def _generate_hash(self) -> str:
         """生成片段哈希值"""
-        text = self.page_content + str(sorted(self.metadata.items()))
-        return hashlib.sha256(text.encode()).hexdigest()
+        return _hash_text(self.page_content, _encode_metadata(self.metadata))
         
     def to_point_struct(self) -> Dict[str, Any]:
         """转换为向量存储的数据结构"""
         return {
-            ConstantField.PRIMARY_KEY.value: self.id,
-            ConstantField.CONTENT_KEY.value: self.page_content,
-            ConstantField.METADATA_KEY.value: {
+            _PRIMARY_KEY: self.id,
+            _CONTENT_KEY: self.page_content,
+            _METADATA_KEY: {
                 **self.metadata,
                 "index_node_hash": self.index_node_hash,
                 "child_ids": self.child_ids
             },
-            ConstantField.GROUP_KEY.value: self.group_id or ""
+            _GROUP_KEY: self.group_id or ""
         }
 
 class ChildDocument(Document):
@@ -93,12 +236,22 @@ class ChildDocument(Document):
             
     def to_point_struct(self) -> Dict[str, Any]:
         """转换为向量存储的数据结构"""
-        point = super().to_point_struct()
-        point[ConstantField.METADATA_KEY.value].update({
-            "parent_id": self.parent_id,
-            "parent_content": self.parent_content,
-            "position": self.position
-        })
+        # 直接构造合并后的元数据，不再复制基类结果后二次更新（基类结果引用的是
+        # self.metadata，原先的 update 会把父文档内容写回子文档自身的元数据）
+        point = {
+            _PRIMARY_KEY: self.doc_id,
+            _VECTOR: self.vector,
+            _CONTENT_KEY: self.page_content,
+            _METADATA_KEY: {
+                **self.metadata,
+                "parent_id": self.parent_id,
+                "parent_content": self.parent_content,
+                "position": self.position
+            },
+            _GROUP_KEY: self.group_id or ""
+        }
+        if self.sparse_vector is not None:
+            point[_SPARSE_VECTOR] = self.sparse_vector
         return point
 
 class ChildChunk(BaseModel):
@@ -113,16 +266,17 @@ class ChildChunk(BaseModel):
     
     def to_point_struct(self) -> Dict[str, Any]:
         """转换为向量存储的数据结构"""
+        # 只在缺少 chunk_id 时才生成新ID
+        chunk_id = self.metadata["chunk_id"] if "chunk_id" in self.metadata else new_doc_id()
         return {
-            ConstantField.PRIMARY_KEY.value: self.metadata.get("chunk_id", str(uuid.uuid4())),
-            ConstantField.VECTOR.value: self.vector,
-            ConstantField.CONTENT_KEY.value: self.page_content,
-            ConstantField.METADATA_KEY.value: {
+            _PRIMARY_KEY: chunk_id,
+            _VECTOR: self.vector,
+            _CONTENT_KEY: self.page_content,
+            _METADATA_KEY: {
                 **self.metadata,
                 "segment_id": self.segment_id,
                 "start_pos": self.start_pos,
                 "end_pos": self.end_pos
             },
-            ConstantField.GROUP_KEY.value: self.group_id or "",
-            ConstantField.SPARSE_VECTOR.value: self.vector  # 简化处理，实际应该是不同的向量
+            _GROUP_KEY: self.group_id or ""
         }
\ No newline at end of file
@@ -1,14 +1,19 @@
 import re
-import uuid
+import os
 import logging
 from typing import List, Optional
+from itertools import repeat
 from enum import Enum
 from pydantic import BaseModel
-from .models import Document, ChildDocument
+from .models import Document, ChildDocument, new_doc_id
 from .text_splitter import FixedRecursiveCharacterTextSplitter
+from .process_pool import get_process_pool
 
 logger = logging.getLogger(__name__)
 
+# 预编译空白压缩用的正则表达式，避免每个文档调用时查找正则缓存
+_WHITESPACE_RE = re.compile(r'\s+')
+
 class ParentMode(str, Enum):
     """父文档分割模式"""
     PARAGRAPH = "paragraph"
@@ -34,6 +39,10 @@ class ParentChildIndexProcessor:
     
     def __init__(self):
         self.default_rule = ProcessingRule()
+        
+        # 并行处理配置：默认关闭，DOC_TRANSFORM_WORKERS 大于1且文档数量达到阈值时才使用共用进程池
+        self.transform_workers = int(os.environ.get("DOC_TRANSFORM_WORKERS", "1"))
+        self.parallel_threshold = int(os.environ.get("DOC_TRANSFORM_PARALLEL_THRESHOLD", "8"))
     
     def transform(self, documents: List[Document], rule: Optional[ProcessingRule] = None) -> List[Document]:
         """转换文档为父子结构"""
@@ -68,69 +77,17 @@ class ParentChildIndexProcessor:
                     logger.info(f"创建子文档分词器: chunk_size={rule.subchunk_segmentation.max_tokens}, "
                               f"overlap={rule.subchunk_segmentation.chunk_overlap}")
                 
-                for document in documents:
-                    try:
-                        # 清理文档内容
-                        document_text = self._clean_text(document.page_content)
-                        if not document_text:
-                            logger.warning(f"文档内容为空，跳过处理: {document.metadata.get('doc_id', 'unknown')}")
-                            continue
-                            
-                        document.page_content = document_text
-                        
-                        # 切割父文档
-                        parent_documents = parent_splitter.split_documents([document])
-                        processed_documents = []
-                        
-                        for parent_doc in parent_documents:
-                            if not parent_doc.page_content.strip():
-                                continue
-                                
-                            # 生成父文档ID和完整元数据
-                            doc_id = str(uuid.uuid4())
-                            parent_doc.metadata.update({
-                                "doc_id": doc_id,
-                                "is_parent": True,
-                                "original_doc_id": document.metadata.get("doc_id")
-                            })
-                            
-                            # 处理分隔符
-                            content = self._clean_separators(parent_doc.page_content)
-                            if not content:
-                                continue
-                                
-                            parent_doc.page_content = content
-                            
-                            # 切割子文档
-                            if child_splitter:
-                                try:
-                                    child_docs = self._split_child_documents(parent_doc, child_splitter)
-                                    if child_docs:
-                                        # 在父文档中保存子文档引用
-                                        parent_doc.metadata["child_ids"] = [
-                                            doc.metadata["doc_id"] for doc in child_docs
-                                        ]
-                                        parent_doc.metadata["child_count"] = len(child_docs)
-                                        
-                                        # 添加父子文档
-                                        processed_documents.append(parent_doc)
-                                        processed_documents.extend(child_docs)
-                                        
-                                        logger.info(f"处理父文档 {doc_id} 完成, 生成 {len(child_docs)} 个子文档")
-                                except Exception as e:
-                                    logger.error(f"处理子文档失败: {str(e)}")
-                                    # 即使子文档处理失败，仍然保留父文档
-                                    processed_documents.append(parent_doc)
-                            else:
-                                processed_documents.append(parent_doc)
-                        
+                if self.transform_workers > 1 and len(documents) >= self.parallel_threshold:
+                    chunksize = max(1, len(documents) // (self.transform_workers * 4))
+                    logger.info(f"使用 {self.transform_workers} 个进程并行处理 {len(documents)} 个文档, chunksize={chunksize}")
+                    for processed_documents in get_process_pool().map(
+                        self._transform_document, documents,
+                        repeat(parent_splitter), repeat(child_splitter), chunksize=chunksize
+                    ):
                         all_documents.extend(processed_documents)
-                        logger.info(f"文档 {document.metadata.get('doc_id', 'unknown')} 处理完成, "
-                                  f"生成 {len(processed_documents)} 个文档")
-                        
-                    except Exception as e:
-                        logger.error(f"处理文档失败: {str(e)}")
-                        continue
+                else:
+                    for document in documents:
+                        all_documents.extend(self._transform_document(document, parent_splitter, child_splitter))
                         
             return all_documents
             
@@ -138,6 +95,80 @@ class ParentChildIndexProcessor:
             logger.error(f"文档转换失败: {str(e)}")
             raise ProcessingError(f"文档转换失败: {str(e)}")
     
+    def _transform_document(
+        self,
+        document: Document,
+        parent_splitter: FixedRecursiveCharacterTextSplitter,
+        child_splitter: Optional[FixedRecursiveCharacterTextSplitter]
+    ) -> List[Document]:
+        """
+        将单个文档转换为父子结构
+        
+        各文档之间互不依赖，可在进程池中执行；处理失败时记录错误并返回空列表
+        """
+        try:
+            # 清理文档内容
+            document_text = self._clean_text(document.page_content)
+            if not document_text:
+                logger.warning(f"文档内容为空，跳过处理: {document.metadata.get('doc_id', 'unknown')}")
+                return []
+                
+            document.page_content = document_text
+            
+            # 切割父文档
+            parent_documents = parent_splitter.split_documents([document])
+            processed_documents = []
+            
+            for parent_doc in parent_documents:
+                if not parent_doc.page_content.strip():
+                    continue
+                    
+                # 生成父文档ID和完整元数据
+                doc_id = new_doc_id()
+                parent_doc.metadata.update({
+                    "doc_id": doc_id,
+                    "is_parent": True,
+                    "original_doc_id": document.metadata.get("doc_id")
+                })
+                
+                # 处理分隔符
+                content = self._clean_separators(parent_doc.page_content)
+                if not content:
+                    continue
+                    
+                parent_doc.page_content = content
+                
+                # 切割子文档
+                if child_splitter:
+                    try:
+                        child_docs = self._split_child_documents(parent_doc, child_splitter)
+                        if child_docs:
+                            # 在父文档中保存子文档引用
+                            parent_doc.metadata["child_ids"] = [
+                                doc.metadata["doc_id"] for doc in child_docs
+                            ]
+                            parent_doc.metadata["child_count"] = len(child_docs)
+                            
+                            # 添加父子文档
+                            processed_documents.append(parent_doc)
+                            processed_documents.extend(child_docs)
+                            
+                            logger.info(f"处理父文档 {doc_id} 完成, 生成 {len(child_docs)} 个子文档")
+                    except Exception as e:
+                        logger.error(f"处理子文档失败: {str(e)}")
+                        # 即使子文档处理失败，仍然保留父文档
+                        processed_documents.append(parent_doc)
+                else:
+                    processed_documents.append(parent_doc)
+            
+            logger.info(f"文档 {document.metadata.get('doc_id', 'unknown')} 处理完成, "
+                      f"生成 {len(processed_documents)} 个文档")
+            return processed_documents
+            
+        except Exception as e:
+            logger.error(f"处理文档失败: {str(e)}")
+            return []
+    
     def _split_child_documents(
         self,
         parent_doc: Document,
@@ -148,31 +179,36 @@ class ParentChildIndexProcessor:
             child_docs = []
             child_nodes = splitter.split_documents([parent_doc])
             
+            # 父文档的属性在循环中不变，只读取一次
+            parent_metadata = parent_doc.metadata
+            parent_id = parent_metadata["doc_id"]
+            parent_content = parent_doc.page_content
+            
             for child_node in child_nodes:
-                if not child_node.page_content.strip():
+                # 处理分隔符：去掉开头的一个分隔符后去除首尾空白，
+                # 结果为空时说明原内容为空或只含空白，不再单独 strip 检查
+                content = child_node.page_content
+                if content and (content[0] == "." or content[0] == "。"):
+                    content = content[1:]
+                content = content.strip()
+                if not content:
                     continue
                     
-                # 生成子文档ID和完整元数据
-                doc_id = str(uuid.uuid4())
-                metadata = parent_doc.metadata.copy()
-                metadata.update({
-                    "doc_id": doc_id,
-                    "parent_id": parent_doc.metadata["doc_id"],
+                # 生成子文档ID和完整元数据，一次构造，不先复制再更新
+                metadata = {
+                    **parent_metadata,
+                    "doc_id": new_doc_id(),
+                    "parent_id": parent_id,
                     "is_child": True,
                     "position": len(child_docs)  # 添加位置信息
-                })
-                
-                # 处理分隔符
-                content = self._clean_separators(child_node.page_content)
-                if not content:
-                    continue
+                }
                     
                 # 创建子文档
                 child_doc = ChildDocument(
                     page_content=content,
                     metadata=metadata,
-                    parent_id=parent_doc.metadata["doc_id"],
-                    parent_content=parent_doc.page_content
+                    parent_id=parent_id,
+                    parent_content=parent_content
                 )
                 child_docs.append(child_doc)
                 
@@ -188,7 +224,7 @@ class ParentChildIndexProcessor:
             if not text:
                 return ""
             # 移除多余空白字符
-            text = re.sub(r'\s+', ' ', text)
+            text = _WHITESPACE_RE.sub(' ', text)
             return text.strip()
         except Exception as e:
             logger.error(f"清理文本失败: {str(e)}")
@@ -199,8 +235,9 @@ class ParentChildIndexProcessor:
         try:
             if not text:
                 return ""
-            # 处理以分隔符开头的情况
-            if text.startswith((".","。")):
+            # 处理以分隔符开头的情况，直接比较首字符
+            first = text[0]
+            if first == "." or first == "。":
                 text = text[1:]
             return text.strip()
         except Exception as e:
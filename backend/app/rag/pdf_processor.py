@@ -1,21 +1,41 @@
 """PDF文档处理器"""
 
 import logging
-import io
-from typing import Dict, Any
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Callable, Hashable
 import pypdfium2
 from .document_processor import Document
 from .cleaner.clean_processor import CleanProcessor
+from .extractor.pdf_extractor import _extract_page_range
+from .process_pool import get_process_pool
 
 class PDFProcessor:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
+        # 并行提取配置，与 PdfExtractor 共用：默认关闭，PDF_EXTRACT_WORKERS 大于1且页数达到阈值时
+        # 才按页码范围分给共用进程池
+        self.extract_workers = int(os.environ.get("PDF_EXTRACT_WORKERS", "1"))
+        self.parallel_min_pages = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "64"))
+        
+        # 提取文本的内存LRU缓存：重新入库或重试同一PDF时跳过解析，0 表示禁用
+        self.text_cache_size = int(os.environ.get("PDF_TEXT_CACHE_SIZE", "32"))
+        self._text_cache: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._text_cache_lock = threading.Lock()
+        
     def process_pdf(self, pdf_file_path: str, metadata: Dict[str, Any]) -> Document:
         """处理PDF文件并返回文档对象"""
         try:
             self.logger.info(f"开始处理PDF文件: {pdf_file_path}")
-            text = self._extract_text_from_pdf(pdf_file_path)
+            # 以路径、修改时间和文件大小作为缓存键，文件被替换后不会命中旧结果
+            stat = os.stat(pdf_file_path)
+            text = self._get_cached_text(
+                ("file", pdf_file_path, stat.st_mtime_ns, stat.st_size),
+                lambda: self._extract_text_from_pdf(pdf_file_path)
+            )
             
             # 创建文档对象
             document = Document(
@@ -33,7 +53,11 @@ class PDFProcessor:
         """处理PDF字节数据并返回文档对象"""
         try:
             self.logger.info("开始处理PDF字节数据")
-            text = self._extract_text_from_pdf_bytes(pdf_bytes)
+            # 以内容摘要作为缓存键，缓存中不保留原始字节
+            text = self._get_cached_text(
+                ("bytes", hashlib.sha256(pdf_bytes).hexdigest()),
+                lambda: self._extract_text_from_pdf_bytes(pdf_bytes)
+            )
             
             # 创建文档对象
             document = Document(
@@ -47,41 +71,86 @@ class PDFProcessor:
             self.logger.error(f"PDF字节数据处理失败: {str(e)}")
             raise
     
+    def _get_cached_text(self, key: Hashable, extract: Callable[[], str]) -> str:
+        """从LRU缓存获取提取结果，未命中时调用 extract 提取并写入缓存"""
+        if self.text_cache_size <= 0:
+            return extract()
+            
+        with self._text_cache_lock:
+            text = self._text_cache.get(key)
+            if text is not None:
+                self._text_cache.move_to_end(key)
+                self.logger.info("从缓存获取PDF提取结果")
+                return text
+                
+        # 提取过程较慢，不持有锁
+        text = extract()
+        with self._text_cache_lock:
+            self._text_cache[key] = text
+            self._text_cache.move_to_end(key)
+            while len(self._text_cache) > self.text_cache_size:
+                self._text_cache.popitem(last=False)
+        return text
+    
     def _extract_text_from_pdf(self, pdf_file_path: str) -> str:
         """从PDF文件中提取文本"""
         try:
-            # 使用pypdfium2打开PDF文件
-            pdf_document = pypdfium2.PdfDocument(pdf_file_path)
-            text_parts = []
+            page_texts = self._extract_page_texts(pdf_file_path)
+            # 清理文本，原地替换列表元素，使原始页面文本及时释放
+            for i, content in enumerate(page_texts):
+                page_texts[i] = CleanProcessor.clean(content)
+                
+            # 使用双换行符连接非空页面文本；isspace 判断空白页，不生成 strip 副本
+            return "\n\n".join([content for content in page_texts if content and not content.isspace()])
             
-            try:
+        except Exception as e:
+            self.logger.error(f"提取PDF文本失败: {str(e)}")
+            raise
+            
+    def _extract_page_texts(self, pdf_file_path: str) -> List[str]:
+        """
+        提取PDF文件各页的原始文本
+        
+        pdfium 不是线程安全的，同一文档不能在多个线程中并发取页，
+        因此页数较多时按连续页码范围分给进程池，每个进程单独打开文档
+        """
+        # 使用pypdfium2打开PDF文件
+        pdf_document = pypdfium2.PdfDocument(pdf_file_path)
+        try:
+            page_count = len(pdf_document)
+            if self.extract_workers <= 1 or page_count < self.parallel_min_pages:
                 # 逐页提取文本
+                page_texts = []
                 for page in pdf_document:
                     text_page = page.get_textpage()
-                    content = text_page.get_text_range()
+                    page_texts.append(text_page.get_text_range())
                     text_page.close()
                     page.close()
-                    
-                    # 清理文本
-                    content = CleanProcessor.clean(content)
-                    if content.strip():
-                        text_parts.append(content)
-            finally:
-                pdf_document.close()
-                
-            # 使用双换行符连接页面文本
-            return "\n\n".join(text_parts)
+                return page_texts
+        finally:
+            pdf_document.close()
             
-        except Exception as e:
-            self.logger.error(f"提取PDF文本失败: {str(e)}")
-            raise
+        step = -(-page_count // self.extract_workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        self.logger.info(f"使用 {len(ranges)} 个进程并行提取 {page_count} 页")
+        
+        page_texts = []
+        executor = get_process_pool()
+        futures = [
+            executor.submit(_extract_page_range, pdf_file_path, start, stop)
+            for start, stop in ranges
+        ]
+        # 按提交顺序收集结果，保持页码顺序
+        for future in futures:
+            page_texts.extend(future.result())
+        return page_texts
             
     def _extract_text_from_pdf_bytes(self, pdf_bytes: bytes) -> str:
         """从PDF字节数据中提取文本"""
         try:
-            # 将字节数据转换为文件对象
-            pdf_file = io.BytesIO(pdf_bytes)
-            pdf_document = pypdfium2.PdfDocument(pdf_file, autoclose=True)
+            # 直接传入字节数据，pdfium 通过 FPDF_LoadMemDocument64 从内存缓冲区读取，
+            # 不再经由 BytesIO 的Python回调逐块读取
+            pdf_document = pypdfium2.PdfDocument(pdf_bytes)
             text_parts = []
             
             try:
@@ -92,9 +161,9 @@ class PDFProcessor:
                     text_page.close()
                     page.close()
                     
-                    # 清理文本
+                    # 清理文本；isspace 判断空白页，不生成 strip 副本
                     content = CleanProcessor.clean(content)
-                    if content.strip():
+                    if content and not content.isspace():
                         text_parts.append(content)
             finally:
                 pdf_document.close()
@@ -0,0 +1,55 @@
+"""
+文档处理共用的进程池
+"""
+
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    获取进程内共用的进程池，首次调用时创建
+
+    清洗、分割、父子转换和PDF提取共用同一个进程池，不再每次调用各自创建和销毁一组子进程。
+    进程数由 DOC_PROCESS_POOL_WORKERS 配置，默认为CPU核数；子进程默认以 spawn 方式启动
+    （DOC_PROCESS_POOL_START_METHOD），服务进程中已有 gRPC、数据库连接等后台线程，
+    fork 可能让子进程继承被其他线程持有的锁而卡死
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = int(os.environ.get("DOC_PROCESS_POOL_WORKERS", str(os.cpu_count() or 1)))
+            start_method = os.environ.get("DOC_PROCESS_POOL_START_METHOD", "spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+            logger.info(f"创建文档处理进程池: {max_workers} 个进程, 启动方式={start_method}")
+        return _pool
+
+def shutdown_process_pool() -> None:
+    """关闭共用的进程池，下次使用时重新创建"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def _forget_pool_in_child() -> None:
+    """fork 出的子进程不能使用父进程的进程池，只丢弃引用，不关闭父进程的子进程"""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+atexit.register(shutdown_process_pool)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pool_in_child)
@@ -1,10 +1,15 @@
+import asyncio
 import logging
+import os
+import random
+import threading
 import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from .document_processor import Document
 from .vector_store import BaseVectorStore, MilvusVectorStore
 from .embedding_model import EmbeddingModel
-from .cache_service import CacheService
+from .cache_service import CacheService, SemanticCache
 import numpy as np
 from .custom_exceptions import (
     RetrievalError, VectorStoreError, EmbeddingError, 
@@ -12,11 +17,20 @@ from .custom_exceptions import (
 )
 from .models import Document, DocumentSegment, ChildChunk
 from .document_store import DocumentStore
-from .constants import DEFAULT_COLLECTION_NAME
+from .constants import DEFAULT_COLLECTION_NAME, Field
+
+# 检索结果 metadata 中存放入库向量的键
+_STORED_VECTOR_KEY = Field.VECTOR.value
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+try:
+    # 可选依赖：SimSIMD 按CPU选用 AVX2/AVX-512 内核计算向量距离，小批量时比 NumPy 的通用路径更快
+    import simsimd
+except ImportError:
+    simsimd = None
+
 class RetrievalService:
     def __init__(
         self,
@@ -24,7 +38,8 @@ class RetrievalService:
         document_store: DocumentStore,
         embedding_model: EmbeddingModel,
         retrieval_config: Dict[str, Any] = None,
-        cache_service: Optional[CacheService] = None
+        cache_service: Optional[CacheService] = None,
+        semantic_cache: Optional[SemanticCache] = None
     ):
         self.vector_store = vector_store
         self.document_store = document_store
@@ -41,10 +56,30 @@ class RetrievalService:
             }
         }
         self.cache_service = cache_service
+        self.semantic_cache = semantic_cache
         
         # 重试配置
         self.max_retries = self.retrieval_config.get("max_retries", 3)
         self.retry_interval = self.retrieval_config.get("retry_interval", 5)
+        self.max_retry_interval = self.retrieval_config.get("max_retry_interval", 30)
+        
+        # 查询向量缓存：重复的查询直接复用向量，跳过嵌入模型调用；设置为0时不缓存
+        query_cache_size = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "256"))
+        self._embed_query = lru_cache(maxsize=query_cache_size)(self.embedding_model.embed_query)
+        
+        # 重排序时存放候选文档向量的缓冲区，每个线程一份，按需扩容后重复使用
+        self._rerank_buffers = threading.local()
+        
+        # 嵌入向量维度和已确认存在的集合，避免每次请求都调用 get_dimension 和 create_collection
+        self._dimension: Optional[int] = None
+        self._collections_ready = set()
+        
+        # 单文档索引请求合并：时间窗口内的并发请求合并为一批生成向量并插入
+        self.index_max_batch = int(os.environ.get("INDEX_COALESCE_MAX_BATCH", "32"))
+        self.index_max_wait = int(os.environ.get("INDEX_COALESCE_MAX_WAIT_MS", "20")) / 1000
+        self._index_queue: Optional[asyncio.Queue] = None
+        self._index_loop = None
+        self._index_flusher = None
         
     def retrieve(
         self,
@@ -86,8 +121,7 @@ class RetrievalService:
             if self.vector_store.collection is None:
                 logger.info("检索前发现集合未初始化，正在初始化集合...")
                 try:
-                    dimension = self.embedding_model.get_dimension()
-                    self.vector_store.create_collection(DEFAULT_COLLECTION_NAME, dimension)
+                    self._ensure_collection(DEFAULT_COLLECTION_NAME)
                     logger.info(f"集合 {DEFAULT_COLLECTION_NAME} 初始化完成")
                 except VectorStoreError as vs_error:
                     logger.error(f"初始化向量存储失败: {str(vs_error)}")
@@ -99,7 +133,7 @@ class RetrievalService:
             # 生成查询向量（带重试）
             try:
                 query_vector = self._retry_operation(
-                    self.embedding_model.embed_query,
+                    self._embed_query,
                     query,
                     error_type=EmbeddingError
                 )
@@ -107,7 +141,22 @@ class RetrievalService:
                 logger.error(f"生成查询向量失败: {str(e)}")
                 raise RetrievalError(f"生成查询向量失败: {str(e)}")
             
-            # 执行向量检索（带重试）
+            rerank_enabled = self.retrieval_config.get("reranking_model", {}).get("enabled", False)
+            # 语义缓存条目按数据集和检索参数区分，参数不同的查询不复用结果
+            semantic_cache_params = {
+                "top_k": top_k,
+                "score_threshold": score_threshold,
+                "rerank": rerank_enabled
+            }
+            
+            # 语义缓存：相近的查询（如同义改写）直接复用结果，跳过向量检索
+            if use_cache and self.semantic_cache:
+                semantic_results = self.semantic_cache.get(query_vector, dataset_id or "all", **semantic_cache_params)
+                if semantic_results:
+                    logger.info(f"语义缓存命中: {query}")
+                    return semantic_results
+            
+            # 执行向量检索（带重试）；需要重排序时一并取回入库时的向量，重排序无需重新生成
             try:
                 results = self._retry_operation(
                     self.vector_store.search_by_vector,
@@ -115,22 +164,26 @@ class RetrievalService:
                     error_type=VectorStoreError,
                     top_k=top_k,
                     score_threshold=score_threshold,
-                    dataset_id=dataset_id
+                    dataset_id=dataset_id,
+                    with_vectors=rerank_enabled
                 )
             except VectorStoreError as e:
                 logger.error(f"执行向量检索失败: {str(e)}")
                 raise RetrievalError(f"执行向量检索失败: {str(e)}")
             
             # 如果需要重排序
-            if self.retrieval_config.get("reranking_model", {}).get("enabled", False):
+            if rerank_enabled:
                 try:
-                    results = self._rerank_results(query, results)
+                    results = self._rerank_results(query, results, top_k, query_vector=query_vector)
                 except RerankingError as e:
                     logger.warning(f"重排序失败，使用原始结果: {str(e)}")
                     # 不抛出异常，使用原始结果
                 except Exception as e:
                     logger.warning(f"重排序过程中出现未知错误，使用原始结果: {str(e)}")
                     # 不抛出异常，使用原始结果
+                # 向量只用于重排序，不随结果返回或写入缓存
+                for doc in results:
+                    doc.metadata.pop(_STORED_VECTOR_KEY, None)
                 
             # 如果启用了缓存，缓存结果
             if use_cache and self.cache_service and results:
@@ -139,6 +192,8 @@ class RetrievalService:
                 except CacheError as cache_error:
                     logger.warning(f"缓存结果失败: {str(cache_error)}")
                     # 不抛出异常，缓存失败不应影响检索结果
+            if use_cache and self.semantic_cache and results:
+                self.semantic_cache.put(query, query_vector, dataset_id or "all", results, **semantic_cache_params)
                 
             return results
             
@@ -149,6 +204,20 @@ class RetrievalService:
             logger.error(f"检索过程中出现未处理的错误: {str(e)}")
             raise RetrievalError(f"检索失败: {str(e)}")
             
+    def _retry_delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间：指数退避加随机抖动，避免多个请求同时重试；加抖动后再取上限"""
+        delay = self.retry_interval * (2 ** attempt) + random.uniform(0, 0.1 * self.retry_interval)
+        return min(delay, self.max_retry_interval)
+        
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """HTTP 4xx（429除外）属于请求本身的错误，重试不会成功"""
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+        if isinstance(status_code, int) and 400 <= status_code < 500 and status_code != 429:
+            return False
+        return True
+        
     def _retry_operation(self, operation, *args, error_type=Exception, **kwargs):
         """执行带重试的操作"""
         last_error = None
@@ -157,73 +226,81 @@ class RetrievalService:
                 return operation(*args, **kwargs)
             except error_type as e:
                 last_error = e
-                if attempt < self.max_retries - 1:
-                    logger.warning(f"操作失败 ({type(e).__name__}: {str(e)})，{self.retry_interval}秒后重试 ({attempt+1}/{self.max_retries})...")
-                    time.sleep(self.retry_interval)
+                if attempt < self.max_retries - 1 and self._is_retryable(e):
+                    delay = self._retry_delay(attempt)
+                    logger.warning(f"操作失败 ({type(e).__name__}: {str(e)})，{delay:.1f}秒后重试 ({attempt+1}/{self.max_retries})...")
+                    time.sleep(delay)
                 else:
-                    logger.error(f"操作在{self.max_retries}次尝试后失败: {str(e)}")
+                    logger.error(f"操作在{attempt+1}次尝试后失败: {str(e)}")
+                    raise last_error
+                    
+    async def _retry_operation_async(self, operation, *args, error_type=Exception, **kwargs):
+        """执行带重试的操作（异步版本），同步操作在线程池中执行，重试间隔使用 asyncio.sleep，不阻塞事件循环"""
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                return await asyncio.to_thread(operation, *args, **kwargs)
+            except error_type as e:
+                last_error = e
+                if attempt < self.max_retries - 1 and self._is_retryable(e):
+                    delay = self._retry_delay(attempt)
+                    logger.warning(f"操作失败 ({type(e).__name__}: {str(e)})，{delay:.1f}秒后重试 ({attempt+1}/{self.max_retries})...")
+                    await asyncio.sleep(delay)
+                else:
+                    logger.error(f"操作在{attempt+1}次尝试后失败: {str(e)}")
                     raise last_error
     
-    def _rerank_results(self, query: str, results: List[Document]) -> List[Document]:
-        """使用交叉编码器对检索结果进行重排序"""
+    def _rerank_results(
+        self,
+        query: str,
+        results: List[Document],
+        top_k: Optional[int] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        """
+        使用交叉编码器对检索结果进行重排序
+        
+        Args:
+            top_k: 保留的结果数量，默认全部保留
+            query_vector: 检索时已生成的查询向量，提供时不再重复生成
+        """
+        # 如果结果为空或只有一个结果，不需要重排序
+        if not results or len(results) <= 1:
+            return results
+        if self._rerank_can_skip(results):
+            logger.info("检索结果分数差距明显，跳过重排序")
+            return results
+            
         try:
-            # 如果结果为空或只有一个结果，不需要重排序
-            if not results or len(results) <= 1:
-                return results
-                
             # 简单实现：使用余弦相似度重新排序
             # 在实际应用中，可以使用更高级的重排序模型
             logger.info(f"对 {len(results)} 个检索结果进行重排序")
             
             # 计算查询和文档的相似度分数
-            try:
-                query_embedding = self._retry_operation(
-                    self.embedding_model.embed_query,
-                    query,
-                    error_type=EmbeddingError
-                )
-            except EmbeddingError as e:
-                logger.error(f"重排序过程中生成查询向量失败: {str(e)}")
-                raise RerankingError(f"生成查询向量失败: {str(e)}")
-            
-            doc_embeddings = []
-            for doc in results:
+            query_embedding = query_vector
+            if query_embedding is None:
                 try:
-                    embedding = self._retry_operation(
-                        self.embedding_model.embed_query,
-                        doc.page_content,
+                    query_embedding = self._retry_operation(
+                        self._embed_query,
+                        query,
                         error_type=EmbeddingError
                     )
-                    doc_embeddings.append(embedding)
                 except EmbeddingError as e:
-                    logger.warning(f"为文档生成嵌入向量失败，跳过该文档: {str(e)}")
-                    # 使用零向量作为占位符，后续排序时会排在最后
-                    doc_embeddings.append([0.0] * len(query_embedding))
+                    logger.error(f"重排序过程中生成查询向量失败: {str(e)}")
+                    raise RerankingError(f"生成查询向量失败: {str(e)}")
             
-            # 计算余弦相似度
-            similarities = []
-            for doc_embedding in doc_embeddings:
-                try:
-                    # 避免除零错误
-                    norm_query = np.linalg.norm(query_embedding)
-                    norm_doc = np.linalg.norm(doc_embedding)
-                    
-                    if norm_query > 0 and norm_doc > 0:
-                        similarity = np.dot(query_embedding, doc_embedding) / (norm_query * norm_doc)
-                    else:
-                        similarity = 0.0
-                    similarities.append(similarity)
-                except Exception as e:
-                    logger.warning(f"计算相似度失败: {str(e)}")
-                    similarities.append(0.0)
-                
-            # 根据相似度重新排序
-            sorted_indices = np.argsort(similarities)[::-1]
+            doc_embeddings = self._embed_documents_for_rerank(results, len(query_embedding))
+            
+            # 一次矩阵运算计算所有候选文档与查询的余弦相似度，不再逐个调用 norm/dot
+            similarities = self._cosine_similarities(query_embedding, doc_embeddings)
+            
+            # 根据相似度重新排序：只对前 top_k 个做部分排序
+            sorted_indices = self._top_k_indices(similarities, top_k or len(results))
             reranked_results = [results[i] for i in sorted_indices]
             
             # 更新文档的分数
-            for doc, score in zip(reranked_results, [similarities[i] for i in sorted_indices]):
-                doc.metadata["score"] = float(score)
+            for doc, i in zip(reranked_results, sorted_indices):
+                doc.metadata["score"] = float(similarities[i])
                 
             logger.info("重排序完成")
             return reranked_results
@@ -235,6 +312,105 @@ class RetrievalService:
             logger.error(f"重排序过程中出现未知错误: {str(e)}")
             raise RerankingError(f"重排序失败: {str(e)}")
                     
+    def _rerank_can_skip(self, results: List[Document]) -> bool:
+        """
+        判断重排序能否跳过
+        
+        配置了 reranking_model.skip_margin 且未设置 force 时，若首尾结果的检索分数之差
+        超过该值，说明排序已经足够明确，跳过重排序可省去一次批量嵌入调用。
+        检索分数为L2距离，阈值需按嵌入模型的向量尺度设置，默认不跳过
+        """
+        reranking_config = self.retrieval_config.get("reranking_model", {})
+        skip_margin = reranking_config.get("skip_margin")
+        if skip_margin is None or reranking_config.get("force", False):
+            return False
+        first_score = results[0].metadata.get("score", 0.0)
+        last_score = results[-1].metadata.get("score", 0.0)
+        return abs(first_score - last_score) > skip_margin
+        
+    @staticmethod
+    def _cosine_similarities(query_embedding, doc_embeddings) -> np.ndarray:
+        """计算查询向量与每个文档向量的余弦相似度，零向量的相似度为0"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        matrix = np.asarray(doc_embeddings, dtype=np.float32)
+        if simsimd is not None and query.any():
+            # cdist 返回余弦距离；不同版本对零向量的处理不一致，统一置为0
+            distances = np.asarray(simsimd.cdist(query[np.newaxis, :], matrix, metric="cosine"))
+            return np.where(matrix.any(axis=1), 1.0 - distances.ravel(), 0.0)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        # 范数为0时分子也为0，取下限避免除零
+        return (matrix @ query) / np.maximum(norms, 1e-12)
+        
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        返回分数最高的 top_k 个下标（按分数降序）
+        
+        先用 argpartition 在 O(n) 内选出前 top_k 个，再只对这部分排序
+        """
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+        
+    def _rerank_matrix(self, rows: int, dimension: int) -> np.ndarray:
+        """
+        获取当前线程的重排序向量缓冲区（前 rows 行）
+        
+        向量直接逐行写入预分配的 float32 数组，不再先收集成嵌套列表再整体转换；
+        缓冲区按 top_k 分配，行数不足或维度变化时重新分配
+        """
+        buffer = getattr(self._rerank_buffers, "matrix", None)
+        if buffer is None or buffer.shape[0] < rows or buffer.shape[1] != dimension:
+            capacity = max(rows, self.retrieval_config.get("top_k", 3))
+            buffer = np.empty((capacity, dimension), dtype=np.float32)
+            self._rerank_buffers.matrix = buffer
+        return buffer[:rows]
+        
+    def _embed_documents_for_rerank(self, results: List[Document], dimension: int) -> np.ndarray:
+        """
+        为重排序的候选文档获取嵌入向量
+        
+        检索结果带有入库时存储的向量（metadata 中的 vector）时直接使用，不再重新生成；
+        其余文档先一次批量调用 embed_documents（内部已带分批和重试），减少逐个请求的往返；
+        批量调用失败时回退为逐个生成，失败的文档使用零向量占位
+        """
+        matrix = self._rerank_matrix(len(results), dimension)
+        missing = []
+        for i, doc in enumerate(results):
+            vector = doc.metadata.pop(_STORED_VECTOR_KEY, None)
+            if vector is None:
+                missing.append(i)
+            else:
+                matrix[i] = vector
+                
+        if missing:
+            matrix[missing] = self._embed_contents_for_rerank([results[i].page_content for i in missing], dimension)
+        return matrix
+        
+    def _embed_contents_for_rerank(self, contents: List[str], dimension: int) -> List[List[float]]:
+        """为重排序生成文本的嵌入向量，批量调用失败时逐个生成"""
+        try:
+            return self.embedding_model.embed_documents(contents)
+        except Exception as e:
+            logger.warning(f"批量生成文档嵌入向量失败，改为逐个生成: {str(e)}")
+            
+        doc_embeddings = []
+        for content in contents:
+            try:
+                embedding = self._retry_operation(
+                    self.embedding_model.embed_query,
+                    content,
+                    error_type=EmbeddingError
+                )
+                doc_embeddings.append(embedding)
+            except EmbeddingError as e:
+                logger.warning(f"为文档生成嵌入向量失败，跳过该文档: {str(e)}")
+                # 使用零向量作为占位符，后续排序时会排在最后
+                doc_embeddings.append([0.0] * dimension)
+        return doc_embeddings
+                    
     async def process_document(self, document: Document) -> Dict[str, Any]:
         """处理文档，包括分割、向量化和存储"""
         try:
@@ -267,6 +443,7 @@ class RetrievalService:
                 # 存储子块向量
                 self.vector_store.insert_chunks(chunks)
                 
+            self._invalidate_semantic_cache()
             return {
                 "success": True,
                 "message": f"文档处理成功，生成 {len(segments)} 个父块"
@@ -287,11 +464,20 @@ class RetrievalService:
     ) -> List[Dict[str, Any]]:
         """搜索相关内容"""
         try:
-            # 1. 向量化查询
-            query_vector = self.embedding_model.embed_query(query)
+            # 1. 向量化查询（带重试）
+            query_vector = await self._retry_operation_async(
+                self._embed_query,
+                query,
+                error_type=EmbeddingError
+            )
             
-            # 2. 搜索相似子块
-            results = self.vector_store.search(query_vector, top_k)
+            # 2. 搜索相似子块（带重试）
+            results = await self._retry_operation_async(
+                self.vector_store.search_chunks,
+                query_vector,
+                top_k,
+                error_type=VectorStoreError
+            )
             
             # 3. 获取父块信息（如果需要）
             if include_segments:
@@ -307,20 +493,30 @@ class RetrievalService:
             logger.error(f"搜索失败: {e}")
             raise
             
+    def _invalidate_semantic_cache(self) -> None:
+        """
+        向量存储中的文档增删后清空语义缓存
+        
+        缓存的检索结果可能缺少新写入的文档或包含已删除的分块，无法按文档定位条目，整体清空
+        """
+        if self.semantic_cache:
+            self.semantic_cache.clear()
+            
     async def delete_document(self, doc_id: str):
         """删除文档及其所有分块"""
         try:
             # 查找所有相关的父块
             cursor = self.document_store.segments_collection.find(
-                {"metadata.doc_id": doc_id}
+                {"metadata.doc_id": doc_id},
+                {"index_node_id": 1}
             )
+            segment_ids = [segment["index_node_id"] async for segment in cursor]
             
-            async for segment in cursor:
-                segment_id = segment["index_node_id"]
-                # 删除父块及其子块
-                await self.document_store.delete_segment(segment_id)
-                # 删除向量存储中的子块
-                self.vector_store.delete_by_segment_id(segment_id)
+            # 批量删除父块及其子块，每个存储只需一次请求
+            await self.document_store.delete_segments(segment_ids)
+            # 删除向量存储中的子块
+            self.vector_store.delete_by_segment_ids(segment_ids)
+            self._invalidate_semantic_cache()
                 
             logger.info(f"文档 {doc_id} 及其所有分块删除成功")
             
@@ -336,6 +532,10 @@ class RetrievalService:
         """
         处理单个文档并建立索引
         
+        并发的单文档请求不会各自调用嵌入模型和向量存储：请求先进入队列，
+        后台任务在 INDEX_COALESCE_MAX_WAIT_MS 时间窗口内最多收集 INDEX_COALESCE_MAX_BATCH 个文档，
+        合并为一次 embed_documents 和一次 insert
+        
         Args:
             document: 要处理的文档
             collection_name: 向量集合名称
@@ -343,31 +543,137 @@ class RetrievalService:
         Returns:
             处理结果信息
         """
+        loop = asyncio.get_running_loop()
+        if self._index_queue is None or self._index_loop is not loop:
+            # 队列和后台任务绑定在当前事件循环上
+            self._index_loop = loop
+            self._index_queue = asyncio.Queue()
+            self._index_flusher = loop.create_task(self._run_index_flusher(self._index_queue))
+            
+        future = loop.create_future()
+        await self._index_queue.put((document, collection_name, future))
+        return await future
+        
+    async def _run_index_flusher(self, queue: asyncio.Queue) -> None:
+        """后台任务：收集队列中的索引请求，达到批量上限或等待超时后统一处理"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await queue.get()]
+            try:
+                deadline = loop.time() + self.index_max_wait
+                while len(pending) < self.index_max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        pending.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush_index_requests(pending)
+            except asyncio.CancelledError:
+                # 服务关闭时已取出的请求也要给出结果，避免调用方一直等待
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_result(self._index_failure(RuntimeError("检索服务已关闭")))
+                raise
+            
+    async def _flush_index_requests(self, pending: List[Any]) -> None:
+        """按集合分组处理一批索引请求，并把结果写回各请求的 future"""
+        by_collection: Dict[str, List[Any]] = {}
+        for document, collection_name, future in pending:
+            by_collection.setdefault(collection_name, []).append((document, future))
+            
+        for collection_name, items in by_collection.items():
+            documents = [document for document, _ in items]
+            try:
+                # 嵌入和插入是阻塞调用，放到线程中执行，期间新的请求仍可入队
+                await asyncio.to_thread(self._index_documents, documents, collection_name)
+                results = [self._index_success(document) for document in documents]
+            except Exception as e:
+                if len(documents) == 1:
+                    logger.error(f"文档处理和索引失败: {str(e)}")
+                    results = [self._index_failure(e)]
+                else:
+                    # 合并的批次失败时不能确定是哪个文档导致的，逐个重试，各请求得到各自的结果
+                    logger.warning(f"合并索引 {len(documents)} 个文档失败，逐个重试: {str(e)}")
+                    results = [await self._index_single(document, collection_name) for document in documents]
+                
+            for (_, future), result in zip(items, results):
+                # 调用方已取消时 future 已完成，跳过
+                if not future.done():
+                    future.set_result(result)
+                    
+    async def _index_single(self, document: Document, collection_name: str) -> Dict[str, Any]:
+        """单独索引一个文档，返回该文档的处理结果"""
         try:
-            # 获取嵌入向量维度
-            dimension = self.embedding_model.get_dimension()
-            
-            # 确保集合存在
-            self.vector_store.create_collection(collection_name, dimension)
-            
-            # 生成文档向量
-            embeddings = self.embedding_model.embed_documents([document.page_content])
-            
-            # 插入到向量存储
-            self.vector_store.insert([document], embeddings)
-            
-            return {
-                "success": True,
-                "doc_id": document.metadata.get("doc_id"),
-                "message": "文档处理和索引成功"
-            }
-            
+            await asyncio.to_thread(self._index_documents, [document], collection_name)
+            return self._index_success(document)
         except Exception as e:
-            logger.error(f"文档处理和索引失败: {str(e)}")
-            return {
-                "success": False,
-                "message": f"文档处理和索引失败: {str(e)}"
-            }
+            logger.error(f"文档 {document.metadata.get('doc_id')} 处理和索引失败: {str(e)}")
+            return self._index_failure(e)
+            
+    @staticmethod
+    def _index_success(document: Document) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "doc_id": document.metadata.get("doc_id"),
+            "message": "文档处理和索引成功"
+        }
+        
+    @staticmethod
+    def _index_failure(error: Exception) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "message": f"文档处理和索引失败: {str(error)}"
+        }
+        
+    async def close(self) -> None:
+        """停止合并索引的后台任务，队列中尚未处理的请求返回失败结果"""
+        flusher, queue = self._index_flusher, self._index_queue
+        self._index_flusher = None
+        self._index_queue = None
+        self._index_loop = None
+        if flusher is not None and not flusher.done():
+            flusher.cancel()
+            try:
+                await flusher
+            except asyncio.CancelledError:
+                pass
+        while queue is not None and not queue.empty():
+            _, _, future = queue.get_nowait()
+            if not future.done():
+                future.set_result(self._index_failure(RuntimeError("检索服务已关闭")))
+                    
+    def _ensure_collection(self, collection_name: str) -> None:
+        """
+        确保集合存在并设为向量存储的当前集合
+        
+        维度只查询一次；集合确认存在后，只要向量存储仍指向该集合就不再调用 create_collection。
+        向量存储同一时间只有一个当前集合，切换到其他集合后再次使用时仍会重新调用
+        """
+        if (
+            collection_name in self._collections_ready
+            and self.vector_store.collection is not None
+            and getattr(self.vector_store, "collection_name", None) == collection_name
+        ):
+            return
+        if self._dimension is None:
+            self._dimension = self.embedding_model.get_dimension()
+        self.vector_store.create_collection(collection_name, self._dimension)
+        self._collections_ready.add(collection_name)
+        
+    def _index_documents(self, documents: List[Document], collection_name: str) -> None:
+        """为一批文档生成向量并插入向量存储"""
+        # 确保集合存在
+        self._ensure_collection(collection_name)
+        
+        # 生成文档向量
+        embeddings = self.embedding_model.embed_documents([doc.page_content for doc in documents])
+        
+        # 插入到向量存储
+        self.vector_store.insert(documents, embeddings)
+        self._invalidate_semantic_cache()
+        logger.info(f"合并索引 {len(documents)} 个文档到集合 {collection_name}")
             
     async def process_and_index_documents_batch(
         self, 
@@ -393,11 +699,8 @@ class RetrievalService:
         try:
             start_time = time.time()
             
-            # 获取嵌入向量维度
-            dimension = self.embedding_model.get_dimension()
-            
             # 确保集合存在
-            self.vector_store.create_collection(collection_name, dimension)
+            self._ensure_collection(collection_name)
             
             # 收集所有文档内容
             doc_contents = [doc.page_content for doc in documents]
@@ -411,6 +714,7 @@ class RetrievalService:
             # 批量插入到向量存储
             logger.info(f"开始批量插入 {len(documents)} 个文档到向量存储")
             self.vector_store.insert(documents, embeddings)
+            self._invalidate_semantic_cache()
             insert_time = time.time()
             logger.info(f"向量插入完成，耗时 {insert_time - embedding_time:.2f} 秒")
             
@@ -458,17 +762,15 @@ class RetrievalService:
             # 获取子文档
             child_docs = self.retrieve(query, dataset_id, top_k, use_cache=use_cache)
             
+            # 并发获取父文档：每个父文档一次网络往返，总耗时由最慢的一次决定而不是逐个累加
+            parents = self._fetch_parents(child_docs)
+            
             # 组织结果
             results = []
             for doc in child_docs:
                 parent_id = doc.metadata.get("parent_id")
                 if parent_id:
-                    # 获取父文档（带重试）
-                    parent_doc = self._retry_operation(
-                        self.vector_store.get_by_id,
-                        parent_id,
-                        error_type=VectorStoreError
-                    )
+                    parent_doc = parents.get(parent_id)
                     if parent_doc:
                         results.append({
                             "child_document": doc,
@@ -487,4 +789,22 @@ class RetrievalService:
             
         except Exception as e:
             logger.error(f"检索父子文档过程中出错: {str(e)}")
-            raise RetrievalError(f"父子文档检索失败: {str(e)}") 
\ No newline at end of file
+            raise RetrievalError(f"父子文档检索失败: {str(e)}")
+            
+    def _fetch_parents(self, child_docs: List[Document]) -> Dict[str, Optional[Document]]:
+        """并发获取子文档引用的父文档（去重后每个父文档只查询一次，带重试），返回 父文档ID -> 父文档"""
+        parent_ids = list(dict.fromkeys(
+            doc.metadata["parent_id"] for doc in child_docs if doc.metadata.get("parent_id")
+        ))
+        if not parent_ids:
+            return {}
+            
+        def fetch(parent_id):
+            return self._retry_operation(
+                self.vector_store.get_by_id,
+                parent_id,
+                error_type=VectorStoreError
+            )
+            
+        with ThreadPoolExecutor(max_workers=min(16, len(parent_ids))) as executor:
+            return dict(zip(parent_ids, executor.map(fetch, parent_ids)))
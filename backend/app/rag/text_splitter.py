@@ -1,12 +1,47 @@
+import os
 import re
 from abc import ABC, abstractmethod
-from typing import List, Optional, Iterable, Callable, Any
+from typing import List, Dict, Optional, Iterable, Callable, Any
 import copy
+from collections import deque
 from .models import Document
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 元数据中可以安全共享（浅复制）的不可变值类型
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+# 分割器自身为自定义长度函数缓存的最大条目数，超过后清空重新累积
+_LENGTH_CACHE_SIZE = int(os.environ.get("TEXT_SPLITTER_LENGTH_CACHE_SIZE", "8192"))
+
+def _default_length_function(texts: List[str]) -> List[int]:
+    """默认长度函数：按字符数计算（模块级函数，使分割器可被pickle）"""
+    return [len(text) for text in texts] if texts else [0]
+
+class _MemoizedLengths:
+    """
+    带缓存的长度函数
+
+    按文本缓存长度计算结果，递归分割和重叠窗口中重复出现的文本不会被重新分词。
+    max_size 为空时不限制条目数（由调用方控制生命周期，如每个文档一个实例）；
+    否则超过上限时整体清空。定义为类而不是闭包，以便随分割器一起被进程池序列化
+    """
+    def __init__(self, length_function: Callable[[List[str]], List[int]], max_size: Optional[int] = None):
+        self._length_function = length_function
+        self._max_size = max_size
+        self._cache: Dict[str, int] = {}
+        
+    def __call__(self, texts: List[str]) -> List[int]:
+        cache = self._cache
+        # 同一批中重复的文本也只计算一次
+        missing = list(dict.fromkeys(text for text in texts if text not in cache))
+        if missing:
+            if self._max_size is not None and len(cache) + len(missing) > self._max_size:
+                cache.clear()
+            cache.update(zip(missing, self._length_function(missing)))
+        return [cache[text] for text in texts]
+
 class TextSplitter(ABC):
     """文本分割器基类"""
     
@@ -32,7 +67,14 @@ class TextSplitter(ABC):
             
         self._chunk_size = chunk_size
         self._chunk_overlap = chunk_overlap
-        self._length_function = length_function or (lambda x: [len(text) for text in x] if x else [0])
+        if length_function is None or length_function is _default_length_function:
+            # 按字符计数本身是O(1)的，缓存反而要对整段文本求哈希，因此不缓存
+            self._length_function = _default_length_function
+        elif isinstance(length_function, _MemoizedLengths):
+            self._length_function = length_function
+        else:
+            # 自定义长度函数（如分词器计数）开销大，递归分割时同一文本会被多次计算，加缓存
+            self._length_function = _MemoizedLengths(length_function, max_size=_LENGTH_CACHE_SIZE)
         self._keep_separator = keep_separator
         self._add_start_index = add_start_index
         
@@ -49,9 +91,14 @@ class TextSplitter(ABC):
         _metadatas = metadatas or [{}] * len(texts)
         documents = []
         for i, text in enumerate(texts):
+            source_metadata = _metadatas[i]
+            # 每个源文档只判断一次复制方式：值都是不可变标量时浅复制即可，否则深复制
+            if all(type(value) in _SCALAR_TYPES for value in source_metadata.values()):
+                copy_metadata = dict
+            else:
+                copy_metadata = copy.deepcopy
             for chunk in self.split_text(text):
-                metadata = copy.deepcopy(_metadatas[i])
-                new_doc = Document(page_content=chunk, metadata=metadata)
+                new_doc = Document(page_content=chunk, metadata=copy_metadata(source_metadata))
                 documents.append(new_doc)
         return documents
         
@@ -83,14 +130,19 @@ class RecursiveCharacterTextSplitter(TextSplitter):
     def split_text(self, text: str) -> List[str]:
         """分割文本"""
         try:
-            logger.debug(f"开始分割文本，长度: {len(text)}")
+            logger.debug("开始分割文本，长度: %d", len(text))
             return self._split_text(text, self._separators)
         except Exception as e:
             logger.error(f"分割文本时出错: {str(e)}")
             raise
         
     def _split_text(self, text: str, separators: List[str]) -> List[str]:
-        """递归分割文本"""
+        """
+        递归分割文本
+        
+        该方法对每个子串递归调用，调试日志使用 logging 的延迟格式化，
+        未开启DEBUG时不会把长度列表等参数格式化为字符串
+        """
         try:
             final_chunks = []
             separator = separators[-1]
@@ -106,7 +158,7 @@ class RecursiveCharacterTextSplitter(TextSplitter):
                     new_separators = separators[i + 1:]
                     break
                     
-            logger.debug(f"使用分隔符: '{separator}'")
+            logger.debug("使用分隔符: '%s'", separator)
             
             # 使用找到的分隔符进行分割
             if separator:
@@ -118,7 +170,7 @@ class RecursiveCharacterTextSplitter(TextSplitter):
                 splits = list(text)
                 
             splits = [s for s in splits if s.strip()]
-            logger.debug(f"分割得到 {len(splits)} 个部分")
+            logger.debug("分割得到 %d 个部分", len(splits))
             
             _good_splits = []
             _good_splits_lengths = []  # 缓存分割部分的长度
@@ -129,7 +181,7 @@ class RecursiveCharacterTextSplitter(TextSplitter):
                 return []
                 
             s_lens = self._length_function(splits)
-            logger.debug(f"各部分长度: {s_lens}")
+            logger.debug("各部分长度: %s", s_lens)
             
             for s, s_len in zip(splits, s_lens):
                 if s_len < self._chunk_size:
@@ -151,7 +203,7 @@ class RecursiveCharacterTextSplitter(TextSplitter):
                 merged_text = self._merge_splits(_good_splits, _separator, _good_splits_lengths)
                 final_chunks.extend(merged_text)
                 
-            logger.debug(f"最终生成 {len(final_chunks)} 个块")
+            logger.debug("最终生成 %d 个块", len(final_chunks))
             return final_chunks
             
         except Exception as e:
@@ -171,13 +223,16 @@ class RecursiveCharacterTextSplitter(TextSplitter):
             else:
                 try:
                     separator_len = self._length_function([separator])[0]
-                    logger.debug(f"分隔符长度: {separator_len}")
+                    logger.debug("分隔符长度: %d", separator_len)
                 except (IndexError, ValueError) as e:
                     logger.warning(f"计算分隔符长度时出错: {str(e)}")
                     separator_len = 0
             
             docs = []
-            current_doc = []
+            # 当前块的各部分及其长度；长度已由调用方计算，裁剪重叠时直接弹出，
+            # 不再对块首部分重新调用长度函数，deque 从头部弹出为 O(1)
+            current_doc = deque()
+            current_lens = deque()
             total = 0
             
             for split, length in zip(splits, lengths):
@@ -194,14 +249,10 @@ class RecursiveCharacterTextSplitter(TextSplitter):
                         ):
                             if not current_doc:
                                 break
-                            try:
-                                first_len = self._length_function([current_doc[0]])[0]
-                            except (IndexError, ValueError) as e:
-                                logger.warning(f"计算第一个文档长度时出错: {str(e)}")
-                                first_len = 0
-                            total -= first_len + (separator_len if len(current_doc) > 1 else 0)
-                            current_doc = current_doc[1:]
+                            total -= current_lens.popleft() + (separator_len if len(current_doc) > 1 else 0)
+                            current_doc.popleft()
                 current_doc.append(split)
+                current_lens.append(length)
                 total += length + (separator_len if current_doc else 0)
                 
             if current_doc:
@@ -209,7 +260,7 @@ class RecursiveCharacterTextSplitter(TextSplitter):
                 if doc:
                     docs.append(doc)
                     
-            logger.debug(f"合并后生成 {len(docs)} 个文档")
+            logger.debug("合并后生成 %d 个文档", len(docs))
             return docs
             
         except Exception as e:
@@ -235,7 +286,7 @@ class EnhanceRecursiveCharacterTextSplitter(RecursiveCharacterTextSplitter):
             chunk_overlap=chunk_overlap,
             separators=separators,
             keep_separator=keep_separator,
-            length_function=length_function or (lambda x: [len(text) for text in x] if x else [0]),
+            length_function=length_function or _default_length_function,
             **kwargs  # 传递额外参数
         )
 
@@ -266,7 +317,7 @@ class FixedRecursiveCharacterTextSplitter(EnhanceRecursiveCharacterTextSplitter)
         # 首先使用固定分隔符分割
         if self._fixed_separator:
             chunks = text.split(self._fixed_separator)
-            logger.debug(f"使用固定分隔符 '{self._fixed_separator}' 分割文本，得到 {len(chunks)} 个块")
+            logger.debug("使用固定分隔符 '%s' 分割文本，得到 %d 个块", self._fixed_separator, len(chunks))
         else:
             chunks = [text]
             logger.debug("没有固定分隔符，使用整个文本作为一个块")
@@ -274,17 +325,17 @@ class FixedRecursiveCharacterTextSplitter(EnhanceRecursiveCharacterTextSplitter)
         # 对每个块进行处理
         final_chunks = []
         chunks_lengths = self._length_function(chunks)
-        logger.debug(f"块长度: {chunks_lengths}")
+        logger.debug("块长度: %s", chunks_lengths)
         
         for chunk, chunk_length in zip(chunks, chunks_lengths):
             if chunk_length > self._chunk_size:
                 # 如果块太大，进行递归分割
-                logger.debug(f"块长度 {chunk_length} 超过限制 {self._chunk_size}，进行递归分割")
+                logger.debug("块长度 %d 超过限制 %d，进行递归分割", chunk_length, self._chunk_size)
                 final_chunks.extend(self._split_text(chunk, self._separators))
             else:
                 if chunk.strip():
-                    logger.debug(f"添加长度为 {chunk_length} 的块")
+                    logger.debug("添加长度为 %d 的块", chunk_length)
                     final_chunks.append(chunk)
                     
-        logger.debug(f"最终生成 {len(final_chunks)} 个块")
+        logger.debug("最终生成 %d 个块", len(final_chunks))
         return final_chunks
\ No newline at end of file
@@ -1,14 +1,85 @@
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Callable, Iterable, Iterator
 from enum import Enum
 from pathlib import Path
-from langchain.schema import Document
-from app.rag.models import Dataset
+from app.rag.document_processor import Document
 from app.rag.embedding_model import EmbeddingModel
-from app.rag.vector_store import MilvusVectorStore, BaseVectorStore
+from app.rag.constants import DEFAULT_COLLECTION_NAME
+from app.rag.vector_store import MilvusVectorStore, BaseVectorStore, get_vector_config
 from app.rag.pdf_processor import process_pdf
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+import asyncio
 import hashlib
+import logging
+import mmap
 import os
 
+logger = logging.getLogger(__name__)
+
+def _batched(iterable: Iterable[Any], n: int) -> Iterator[List[Any]]:
+    """按固定大小切分为多个批次，最后一批可能不足 n 个"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+# 超过该字符数的内容分段编码后写入哈希对象，不再一次性生成完整的UTF-8副本
+_HASH_STREAM_THRESHOLD = 1 << 20
+
+def _resolve_content_hasher():
+    """
+    选择内容去重使用的哈希算法
+    
+    由 VECTOR_CONTENT_HASH_ALGORITHM 配置，与决定 Document.doc_hash 的 DOC_HASH_ALGORITHM 相互独立，
+    调整去重哈希不会改变已入库的 doc_hash。默认 blake2b（标准库，16字节摘要）；
+    设为 blake3 且安装了 blake3 包时改用 blake3，它使用SIMD指令并可多线程处理大块内容。
+    两者都输出32位十六进制字符串
+    
+    Returns:
+        (创建哈希对象的函数, hexdigest 参数)
+    """
+    algorithm = os.environ.get("VECTOR_CONTENT_HASH_ALGORITHM", "blake2b").lower()
+    if algorithm == "blake3":
+        try:
+            from blake3 import blake3
+            return partial(blake3, max_threads=blake3.AUTO), {"length": 16}
+        except ImportError:
+            logger.warning("未安装 blake3，内容哈希使用 blake2b")
+    elif algorithm != "blake2b":
+        logger.warning(f"不支持的内容哈希算法: {algorithm}，使用 blake2b")
+    return partial(hashlib.blake2b, digest_size=16), {}
+
+_new_content_hasher, _hexdigest_kwargs = _resolve_content_hasher()
+
+def _content_hash(content: str) -> str:
+    """计算文档内容的哈希值
+    
+    仅用于内容去重，不需要密码学强度，使用比md5更快的 blake2b 或 blake3
+    """
+    hasher = _new_content_hasher()
+    if len(content) <= _HASH_STREAM_THRESHOLD:
+        hasher.update(content.encode("utf-8", "ignore"))
+    else:
+        for start in range(0, len(content), _HASH_STREAM_THRESHOLD):
+            hasher.update(content[start:start + _HASH_STREAM_THRESHOLD].encode("utf-8", "ignore"))
+    return hasher.hexdigest(**_hexdigest_kwargs)
+
+def _read_text_file(file_path: str) -> str:
+    """读取UTF-8文本文件
+    
+    通过mmap直接从页缓存解码，不再先把整个文件读入一份bytes再解码，
+    峰值内存只有解码后的字符串；换行符按文本模式 open() 的规则统一为 \\n
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            content = str(mapped, 'utf-8')
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
 class VectorType(str, Enum):
     """向量数据库类型枚举"""
     CHROMA = "chroma"
@@ -21,35 +92,50 @@ class VectorType(str, Enum):
 class Vector:
     """向量存储核心类"""
     
-    def __init__(self, dataset: Dataset, attributes: Optional[list] = None):
+    def __init__(
+        self,
+        dataset: Any,
+        attributes: Optional[list] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ):
         """初始化向量存储实例
         
         Args:
-            dataset: 数据集实例
+            dataset: 数据集实例，需要有 id 属性；有 collection_name 属性时写入该集合，否则写入默认集合
             attributes: 元数据属性列表，默认包含doc_id、dataset_id、document_id、doc_hash
+            batch_size: 每批生成向量的文档数，默认从环境变量EMBED_BATCH_SIZE读取，或使用64
+            max_concurrency: 同时在途的向量生成批次数，默认从环境变量EMBED_MAX_CONCURRENCY读取，或使用4
         """
         self._dataset = dataset
+        self._collection_name = getattr(dataset, "collection_name", None) or DEFAULT_COLLECTION_NAME
         self._embeddings = self._get_embeddings()  # 获取embedding模型
         self._attributes = attributes or ["doc_id", "dataset_id", "document_id", "doc_hash"]
         self._vector_processor = self._init_vector()  # 初始化向量存储
+        config = get_vector_config()
+        self._batch_size = batch_size or config.embed_batch_size
+        self._max_concurrency = max_concurrency or config.embed_max_concurrency
 
     def _get_embeddings(self) -> EmbeddingModel:
         """获取embedding模型实例"""
-        model_name = os.environ.get("EMBEDDING_MODEL")
-        api_base = os.environ.get("EMBEDDING_API_BASE")
-        return EmbeddingModel(model_name=model_name, api_base=api_base)
+        config = get_vector_config()
+        return EmbeddingModel(model_name=config.embedding_model, api_base=config.embedding_api_base)
 
     def _init_vector(self) -> BaseVectorStore:
         """初始化向量存储处理器"""
         # 从环境变量获取向量存储类型，默认使用Milvus
-        vector_type = os.environ.get("VECTOR_STORE_TYPE", "milvus")
+        config = get_vector_config()
         
-        if vector_type.lower() == "milvus":
-            host = os.environ.get("MILVUS_HOST")
-            port = int(os.environ.get("MILVUS_PORT", "19530"))
-            return MilvusVectorStore(host=host, port=port)
+        if config.vector_store_type == "milvus":
+            return MilvusVectorStore(host=config.milvus_host, port=config.milvus_port)
         else:
-            raise ValueError(f"不支持的向量存储类型: {vector_type}")
+            raise ValueError(f"不支持的向量存储类型: {config.vector_store_type}")
+
+    def _store_batch(self, batch: List[Document], embeddings: List[List[float]], is_first: bool, **kwargs) -> None:
+        """写入一批文档及其向量，第一批写入前确保集合存在（维度取自本批向量）"""
+        if is_first and getattr(self._vector_processor, "collection", None) is None:
+            self._vector_processor.create_collection(self._collection_name, dimension=len(embeddings[0]))
+        self._vector_processor.insert(batch, embeddings, **kwargs)
 
     def _filter_duplicate_texts(self, documents: List[Document]) -> List[Document]:
         """文档去重处理
@@ -62,21 +148,76 @@ class Vector:
         """
         unique_docs = {}
         for doc in documents:
-            # 计算文档内容的hash值
-            content_hash = hashlib.md5(doc.page_content.encode()).hexdigest()
-            
             # 如果文档没有metadata，初始化为空字典
             if not doc.metadata:
                 doc.metadata = {}
                 
-            # 添加hash值到metadata
-            doc.metadata["doc_hash"] = content_hash
+            # 已有hash值时直接使用，否则计算文档内容的hash值并写入metadata，add_texts 中不再重复计算
+            content_hash = doc.metadata.get("doc_hash")
+            if not content_hash:
+                content_hash = _content_hash(doc.page_content)
+                doc.metadata["doc_hash"] = content_hash
             
             # 使用content_hash作为唯一标识
             unique_docs[content_hash] = doc
             
         return list(unique_docs.values())
 
+    def _filter_duplicate_ids(self, documents: List[Document]) -> List[Document]:
+        """按调用方提供的 doc_id 去重，不计算内容哈希；没有 doc_id 的文档按内容哈希去重
+        
+        Args:
+            documents: 待处理的文档列表
+            
+        Returns:
+            去重后的文档列表
+        """
+        unique_docs = {}
+        without_id = []
+        for doc in documents:
+            doc_id = doc.metadata.get("doc_id") if doc.metadata else None
+            if doc_id:
+                unique_docs[doc_id] = doc
+            else:
+                without_id.append(doc)
+        return list(unique_docs.values()) + self._filter_duplicate_texts(without_id)
+
+    def _embed_and_store(
+        self,
+        documents: List[Document],
+        store: Callable[[List[Document], List[List[float]], bool], None]
+    ) -> None:
+        """分批生成向量并存储
+        
+        文档按 batch_size 分批，在线程池中生成向量，最多 max_concurrency 个批次同时在途；
+        按批次顺序依次存储，存储第N批时后续批次的向量仍在生成，内存中只保留在途批次的向量
+        
+        Args:
+            documents: 文档列表
+            store: 存储回调，参数为 (批次文档, 批次向量, 是否第一批)
+        """
+        batches = _batched(documents, self._batch_size)
+        with ThreadPoolExecutor(max_workers=self._max_concurrency) as executor:
+            pending = deque()
+            
+            def submit_next() -> None:
+                batch = next(batches, None)
+                if batch is not None:
+                    contents = [document.page_content for document in batch]
+                    pending.append((batch, executor.submit(self._embeddings.embed_documents, contents)))
+                    
+            for _ in range(self._max_concurrency):
+                submit_next()
+                
+            is_first = True
+            while pending:
+                batch, future = pending.popleft()
+                embeddings = future.result()
+                # 取走一批后立即提交下一批，保持在途批次数
+                submit_next()
+                store(batch, embeddings, is_first)
+                is_first = False
+
     def process_file(self, file_path: str, metadata: Optional[Dict[str, Any]] = None) -> Document:
         """处理文件（支持PDF和文本文件）
         
@@ -103,9 +244,7 @@ class Vector:
             return process_pdf(file_path, metadata)
         else:
             # 处理文本文件
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return Document(page_content=content, metadata=metadata)
+            return Document(page_content=_read_text_file(file_path), metadata=metadata)
 
     def create(self, files: Optional[Union[str, List[str]]] = None, texts: Optional[list] = None, **kwargs):
         """创建向量存储
@@ -130,23 +269,38 @@ class Vector:
             documents.extend(texts)
             
         if documents:
-            # 为文档生成向量嵌入
-            embeddings = self._embeddings.embed_documents(
-                [document.page_content for document in documents]
-            )
-            # 存储文档及其向量
-            self._vector_processor.create(texts=documents, embeddings=embeddings, **kwargs)
+            # 分批生成向量嵌入并存储：第一批写入前创建集合，其余批次追加
+            self._embed_and_store(documents, partial(self._store_batch, **kwargs))
+            # 所有批次写入后只flush一次
+            self._vector_processor.flush()
 
     def add_texts(self, documents: List[Document], **kwargs):
         """添加文档到向量存储
         
         Args:
             documents: 文档列表
-            **kwargs: 额外参数，支持duplicate_check等选项
+            **kwargs: 额外参数，支持以下选项
+                dedupe_by: 去重方式，"content" 按内容哈希，"id" 按调用方提供的 doc_id（不计算哈希），
+                    "none" 不去重；未指定时 duplicate_check=True 等同于 "content"
         """
-        # 去重检查
-        if kwargs.get("duplicate_check", False):
+        # 去重检查；去重选项只在这里使用，不透传给向量存储的 insert
+        dedupe_by = kwargs.pop("dedupe_by", None)
+        duplicate_check = kwargs.pop("duplicate_check", False)
+        dedupe_by = dedupe_by or ("content" if duplicate_check else "none")
+        if dedupe_by == "content":
             documents = self._filter_duplicate_texts(documents)
+        elif dedupe_by == "id":
+            documents = self._filter_duplicate_ids(documents)
+        elif dedupe_by != "none":
+            raise ValueError(f"不支持的去重方式: {dedupe_by}")
+        
+        # 同一 document_id 被切分为多个分块时，主键不能都用 document_id，否则写入时相互覆盖；
+        # 改为 document_id_序号，重复导入同一文档时主键不变，仍按主键覆盖
+        document_id_counts = Counter(
+            doc.metadata.get("document_id") for doc in documents
+            if doc.metadata and "doc_id" not in doc.metadata
+        )
+        chunk_indexes = Counter()
         
         # 确保所有必要的元数据字段都存在
         for doc in documents:
@@ -157,13 +311,32 @@ class Vector:
             if "dataset_id" not in doc.metadata:
                 doc.metadata["dataset_id"] = self._dataset.id
             if "doc_id" not in doc.metadata:
-                doc.metadata["doc_id"] = doc.metadata.get("document_id", None)
-            if "doc_hash" not in doc.metadata:
-                content_hash = hashlib.md5(doc.page_content.encode()).hexdigest()
-                doc.metadata["doc_hash"] = content_hash
+                document_id = doc.metadata.get("document_id", None)
+                if document_id is not None and document_id_counts[document_id] > 1:
+                    doc.metadata["doc_id"] = f"{document_id}_{chunk_indexes[document_id]}"
+                    chunk_indexes[document_id] += 1
+                else:
+                    doc.metadata["doc_id"] = document_id
+            # 按ID去重且已有 doc_id 时，ID已能标识文档，不再对全文计算哈希
+            if not doc.metadata.get("doc_hash") and not (dedupe_by == "id" and doc.metadata.get("doc_id")):
+                doc.metadata["doc_hash"] = _content_hash(doc.page_content)
         
-        # 生成文档向量并存储
-        embeddings = self._embeddings.embed_documents(
-            [document.page_content for document in documents]
-        )
-        self._vector_processor.insert(texts=documents, embeddings=embeddings, **kwargs)
\ No newline at end of file
+        # 分批生成文档向量并存储
+        self._embed_and_store(documents, partial(self._store_batch, **kwargs))
+        # 所有批次写入后只flush一次
+        if documents:
+            self._vector_processor.flush()
+
+    async def acreate(self, files: Optional[Union[str, List[str]]] = None, texts: Optional[list] = None, **kwargs):
+        """create 的异步版本
+        
+        读文件、生成向量和写入Milvus都是阻塞调用，在线程池中执行整个流程，
+        避免在异步接口中直接调用时阻塞事件循环
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, partial(self.create, files=files, texts=texts, **kwargs))
+
+    async def aadd_texts(self, documents: List[Document], **kwargs):
+        """add_texts 的异步版本，在线程池中执行，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, partial(self.add_texts, documents, **kwargs))
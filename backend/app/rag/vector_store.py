@@ -12,11 +12,83 @@ from .custom_exceptions import (
 import numpy as np
 import time
 import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .models import DocumentSegment, ChildChunk
 from .constants import Field, IndexType, Distance
 
 logger = logging.getLogger(__name__)
 
+# 范围搜索的距离上限（float32 最大值）
+_MAX_RANGE_RADIUS = float(np.finfo(np.float32).max)
+
+@dataclass(frozen=True)
+class VectorConfig:
+    """向量存储与向量生成相关的环境变量配置"""
+    milvus_host: str
+    milvus_port: int
+    flush_threshold: int
+    large_dataset_threshold: int
+    insert_buffer_size: int
+    insert_parallelism: int
+    range_search: bool
+    row_count_ttl: float
+    doc_cache_size: int
+    vector_index_type: str
+    scalar_index_type: str
+    vector_distance: str
+    vector_store_type: str
+    embedding_model: Optional[str]
+    embedding_api_base: Optional[str]
+    embed_batch_size: int
+    embed_max_concurrency: int
+
+@lru_cache(maxsize=1)
+def get_vector_config() -> VectorConfig:
+    """
+    读取并解析环境变量，进程内只解析一次
+    
+    修改环境变量后需要调用 get_vector_config.cache_clear() 才能生效
+    """
+    return VectorConfig(
+        milvus_host=os.environ.get("MILVUS_HOST", "localhost"),
+        milvus_port=int(os.environ.get("MILVUS_PORT", "19530")),
+        flush_threshold=int(os.environ.get("MILVUS_FLUSH_THRESHOLD", "100")),
+        large_dataset_threshold=int(os.environ.get("MILVUS_LARGE_DATASET_THRESHOLD", "10000")),
+        insert_buffer_size=int(os.environ.get("MILVUS_INSERT_BUFFER_SIZE", "1000")),
+        insert_parallelism=max(1, int(os.environ.get("MILVUS_INSERT_PARALLELISM", "4"))),
+        range_search=os.environ.get("MILVUS_RANGE_SEARCH", "false").lower() == "true",
+        row_count_ttl=float(os.environ.get("MILVUS_ROW_COUNT_TTL", "30")),
+        doc_cache_size=int(os.environ.get("MILVUS_DOC_CACHE_SIZE", "1024")),
+        vector_index_type=os.environ.get("MILVUS_VECTOR_INDEX_TYPE", "IVF_FLAT").upper(),
+        scalar_index_type=os.environ.get("MILVUS_SCALAR_INDEX_TYPE", "Trie"),
+        vector_distance=os.environ.get("VECTOR_DISTANCE", Distance.COSINE),
+        vector_store_type=os.environ.get("VECTOR_STORE_TYPE", "milvus").lower(),
+        embedding_model=os.environ.get("EMBEDDING_MODEL"),
+        embedding_api_base=os.environ.get("EMBEDDING_API_BASE"),
+        embed_batch_size=int(os.environ.get("EMBED_BATCH_SIZE", "64")),
+        embed_max_concurrency=int(os.environ.get("EMBED_MAX_CONCURRENCY", "4"))
+    )
+
+# 单条删除表达式中包含的最大ID数
+_DELETE_BATCH_SIZE = 1000
+
+def _in_expr(field_name: str, values: List[str]) -> str:
+    """
+    构造 `字段 in ["a","b"]` 形式的过滤表达式
+    
+    一次 join 拼接所有ID，不再为每个ID单独格式化字符串；
+    ID中包含双引号或反斜杠会破坏表达式，直接拒绝
+    """
+    joined = '","'.join(values)
+    # 分隔符本身包含两个双引号，数量不符说明某个ID中含有双引号
+    if joined.count('"') != 2 * (len(values) - 1) or "\\" in joined:
+        raise ValueError(f"ID中不能包含双引号或反斜杠: {field_name}")
+    return f'{field_name} in ["{joined}"]'
+
 class BaseVectorStore(ABC):
     @abstractmethod
     def create_collection(self, collection_name: str, dimension: int) -> None:
@@ -37,6 +109,10 @@ class BaseVectorStore(ABC):
     @abstractmethod
     def get_by_ids(self, doc_ids: List[str]) -> List[Document]:
         pass
+        
+    def flush(self) -> None:
+        """将已写入的数据持久化，默认无需处理"""
+        pass
 
 class MilvusVectorStore(BaseVectorStore):
     def __init__(self, 
@@ -56,15 +132,20 @@ class MilvusVectorStore(BaseVectorStore):
             index_config: 索引配置，默认为None
         """
         # 从环境变量读取配置
-        self.host = host or os.environ.get("MILVUS_HOST", "localhost")
-        self.port = port or int(os.environ.get("MILVUS_PORT", "19530"))
+        config = get_vector_config()
+        self.host = host or config.milvus_host
+        self.port = port or config.milvus_port
         self.collection: Optional[Collection] = None
         self.collection_name: Optional[str] = None
         
         # 性能相关配置
-        self.flush_threshold = flush_threshold or int(os.environ.get("MILVUS_FLUSH_THRESHOLD", "100"))
-        self.large_dataset_threshold = large_dataset_threshold or int(os.environ.get("MILVUS_LARGE_DATASET_THRESHOLD", "10000"))
-        self.insert_buffer_size = int(os.environ.get("MILVUS_INSERT_BUFFER_SIZE", "1000"))
+        self.flush_threshold = flush_threshold or config.flush_threshold
+        self.large_dataset_threshold = large_dataset_threshold or config.large_dataset_threshold
+        self.insert_buffer_size = config.insert_buffer_size
+        # 大批量插入按 insert_buffer_size 分片后并发写入的线程数
+        self.insert_parallelism = config.insert_parallelism
+        # 分数阈值下推为Milvus范围搜索（需要 Milvus 2.3+），由服务端剔除不满足阈值的结果
+        self.range_search = config.range_search
         
         # 索引配置
         self.index_config = index_config or {
@@ -97,7 +178,21 @@ class MilvusVectorStore(BaseVectorStore):
         
         # 追踪索引状态，避免重复检查
         self._indexed_collections = set()
+        # 已提交但尚未确认构建完成的索引 {集合名: [字段名]}，首次检索前再等待
+        self._pending_index_builds: Dict[str, List[str]] = {}
         self._collection_info_cache = {}
+        # 已确认加载完成、已提交异步加载的集合；确认加载后不再每次调用 load_state RPC
+        self._loaded_collections = set()
+        self._loading_collections = set()
+        self._load_lock = threading.Lock()
+        # 集合行数缓存 {集合名: (行数, 过期时间)}；num_entities 每次都会发起 GetCollectionStatistics RPC
+        self._row_count_cache: Dict[str, tuple] = {}
+        self._row_count_ttl = config.row_count_ttl
+        
+        # 按ID缓存文档内容和元数据（LRU），写入时更新、删除时失效，0表示不缓存
+        self._doc_cache_size = config.doc_cache_size
+        self._doc_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._doc_cache_lock = threading.Lock()
         
         logger.info(f"初始化Milvus向量存储: 服务器={self.host}:{self.port}")
         logger.info(f"性能配置: flush阈值={self.flush_threshold}, 大数据集阈值={self.large_dataset_threshold}")
@@ -144,7 +239,7 @@ class MilvusVectorStore(BaseVectorStore):
             logger.info(f"集合 {collection.name} 在字段 '{field_name}' 上没有索引，正在创建索引...")
             
             # 获取集合中的实体数量，根据数据量选择合适的索引类型和参数
-            row_count = collection.num_entities
+            row_count = self._cached_row_count(collection)
             
             # 选择合适的索引配置
             index_params = self._get_index_config(row_count)
@@ -153,13 +248,15 @@ class MilvusVectorStore(BaseVectorStore):
                 # 创建索引前先异步将集合释放以节省资源
                 if utility.load_state(collection.name, using="default") == LoadState.Loaded:
                     collection.release()
+                    self._forget_collection_load(collection.name)
                     logger.info(f"索引创建前释放集合 {collection.name} 以节省资源")
                 
                 # 创建索引
                 collection.create_index(field_name, index_params)
-                logger.info(f"集合 {collection.name} 在字段 '{field_name}' 上的索引已创建.")
-                utility.wait_for_index_building_complete(collection.name, field_name, using="default")
-                logger.info(f"集合 {collection.name} 在字段 '{field_name}' 上的索引构建完成.")
+                logger.info(f"集合 {collection.name} 在字段 '{field_name}' 上的索引已创建，后台构建中.")
+                # 不在这里等待构建完成：构建期间仍可继续插入，只在首次检索前等待
+                with self._load_lock:
+                    self._pending_index_builds.setdefault(collection.name, []).append(field_name)
                 
                 # 将索引状态记录到缓存中
                 self._indexed_collections.add(collection_key)
@@ -171,6 +268,24 @@ class MilvusVectorStore(BaseVectorStore):
             # 将索引状态记录到缓存中
             self._indexed_collections.add(collection_key)
     
+    def _cached_row_count(self, collection: Collection) -> int:
+        """获取集合行数，缓存未过期时不发起RPC"""
+        cached = self._row_count_cache.get(collection.name)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        row_count = collection.num_entities
+        self._row_count_cache[collection.name] = (row_count, now + self._row_count_ttl)
+        return row_count
+        
+    def _adjust_row_count(self, collection_name: str, delta: int) -> None:
+        """插入或删除后在本地调整缓存的行数，不重新查询"""
+        cached = self._row_count_cache.get(collection_name)
+        if cached is not None:
+            self._row_count_cache[collection_name] = (max(0, cached[0] + delta), cached[1])
+        if collection_name in self._collection_info_cache:
+            self._collection_info_cache[collection_name]["row_count"] += delta
+        
     def _get_collection_info(self, collection_name: str) -> Dict[str, Any]:
         """获取集合信息，优先从缓存读取"""
         if collection_name in self._collection_info_cache:
@@ -184,7 +299,7 @@ class MilvusVectorStore(BaseVectorStore):
         
         if info["exists"]:
             collection = Collection(collection_name)
-            info["row_count"] = collection.num_entities
+            info["row_count"] = self._cached_row_count(collection)
             info["loaded"] = utility.load_state(collection_name, using="default") == LoadState.Loaded
             info["collection"] = collection
         
@@ -204,7 +319,7 @@ class MilvusVectorStore(BaseVectorStore):
             # 向量参数配置
             vectors_config = {
                 "size": dimension,                
-                "distance": os.environ.get("VECTOR_DISTANCE", Distance.COSINE),  
+                "distance": get_vector_config().vector_distance,
             }
 
             # 创建字段定义
@@ -235,11 +350,14 @@ class MilvusVectorStore(BaseVectorStore):
                     dtype=DataType.VARCHAR,
                     max_length=100
                 ),
+                # 数据集ID单独作为标量字段并建立索引，按数据集过滤时不必逐行解析JSON元数据
                 FieldSchema(
-                    name=Field.SPARSE_VECTOR.value,
-                    dtype=DataType.FLOAT_VECTOR,
-                    dim=dimension
+                    name=Field.DATASET_KEY.value,
+                    dtype=DataType.VARCHAR,
+                    max_length=100
                 )
+                # 不再创建与 vector 内容相同的 sparse_vector 字段：重复存储会使每行写入量、
+                # 索引内存和索引构建时间翻倍；接入真正的稀疏编码后应使用 SPARSE_FLOAT_VECTOR
             ]
 
             # 创建schema
@@ -265,24 +383,24 @@ class MilvusVectorStore(BaseVectorStore):
                 "on_disk": False,               # 是否存储在磁盘上
             }
 
+            # 向量索引类型：默认 IVF_FLAT；IVF_SQ8 在索引中把每个分量量化为int8，
+            # 索引内存和检索时读取的数据量约为 float32 的1/4，召回率略有下降
+            index_params = {
+                "index_type": get_vector_config().vector_index_type,
+                "params": {"nlist": 1024},
+                "metric_type": "L2"
+            }
+
             # 创建向量索引
             self.collection.create_index(
                 field_name=Field.VECTOR.value,
-                index_params={
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 1024},
-                    "metric_type": "L2"
-                }
+                index_params=index_params
             )
 
-            # 创建稀疏向量索引
+            # 创建数据集ID标量索引（Milvus 2.3 的VARCHAR字段使用Trie，2.4+ 可设置为 INVERTED）
             self.collection.create_index(
-                field_name=Field.SPARSE_VECTOR.value,
-                index_params={
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 1024},
-                    "metric_type": "L2"
-                }
+                field_name=Field.DATASET_KEY.value,
+                index_params={"index_type": get_vector_config().scalar_index_type}
             )
 
             logger.info(f"集合 {collection_name} 创建成功，包含向量索引")
@@ -292,46 +410,221 @@ class MilvusVectorStore(BaseVectorStore):
             logger.error(f"创建集合失败: {str(e)}")
             raise
 
+    def _start_collection_load(self, collection: Collection) -> bool:
+        """
+        提交异步加载请求，不等待加载完成
+        
+        Returns:
+            集合是否仍需等待加载（已加载时返回 False）
+        """
+        name = collection.name
+        if name in self._loaded_collections:
+            return False
+        with self._load_lock:
+            if name in self._loading_collections:
+                return True
+            if utility.load_state(name, using="default") == LoadState.Loaded:
+                self._mark_collection_loaded(name)
+                return False
+            logger.info(f"集合 {name} 未加载，正在异步加载...")
+            collection.load(_async=True)
+            self._loading_collections.add(name)
+            return True
+            
+    def _mark_collection_loaded(self, name: str) -> None:
+        """记录集合已加载"""
+        self._loaded_collections.add(name)
+        self._loading_collections.discard(name)
+        if name in self._collection_info_cache:
+            self._collection_info_cache[name]["loaded"] = True
+            
+    def _forget_collection_load(self, name: str) -> None:
+        """集合被释放后清除加载状态，下次使用时重新检查"""
+        with self._load_lock:
+            self._loaded_collections.discard(name)
+            self._loading_collections.discard(name)
+
+    def _wait_for_pending_index(self, collection: Collection) -> None:
+        """等待 _ensure_index 提交的索引构建完成"""
+        with self._load_lock:
+            field_names = self._pending_index_builds.pop(collection.name, [])
+        for i, field_name in enumerate(field_names):
+            try:
+                utility.wait_for_index_building_complete(collection.name, field_name, using="default")
+            except Exception:
+                # 未确认完成的索引留待下次检索前继续等待
+                with self._load_lock:
+                    self._pending_index_builds.setdefault(collection.name, []).extend(field_names[i:])
+                raise
+            logger.info(f"集合 {collection.name} 在字段 '{field_name}' 上的索引构建完成.")
+
     def _ensure_collection_loaded(self, collection: Collection):
-        """确保集合已加载到内存中"""
+        """
+        确保集合已加载到内存中
+        
+        加载请求以异步方式提交（插入数据后即可提前提交），这里只在检索前等待加载完成，
+        加载耗时可以与向量生成等准备工作重叠；尚未完成的索引构建也在这里等待
+        """
         try:
-            load_state = utility.load_state(collection.name, using="default")
-            if load_state != LoadState.Loaded:
-                logger.info(f"集合 {collection.name} 未加载，正在加载...")
-                collection.load()
-                logger.info(f"集合 {collection.name} 已加载.")
-                
-                # 更新缓存
-                if collection.name in self._collection_info_cache:
-                    self._collection_info_cache[collection.name]["loaded"] = True
-            else:
+            self._wait_for_pending_index(collection)
+            if self._start_collection_load(collection):
+                utility.wait_for_loading_complete(collection.name, using="default")
+                with self._load_lock:
+                    self._mark_collection_loaded(collection.name)
                 logger.info(f"集合 {collection.name} 已加载.")
         except Exception as e:
+            self._forget_collection_load(collection.name)
             logger.error(f"加载集合 {collection.name} 失败: {e}")
             raise
             
-    def insert(self, documents: List[Document], vectors: List[List[float]]):
-        """插入文档，包含向量和文本数据"""
+    def _get_cached_docs(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """从缓存中取出已缓存的文档，返回 {doc_id: 文档}"""
+        if self._doc_cache_size <= 0:
+            return {}
+        hits = {}
+        with self._doc_cache_lock:
+            for doc_id in doc_ids:
+                entry = self._doc_cache.get((self.collection.name, doc_id))
+                if entry is not None:
+                    self._doc_cache.move_to_end((self.collection.name, doc_id))
+                    hits[doc_id] = entry
+        # 每次返回新的文档对象和元数据副本，调用方修改不会影响缓存
+        return {
+            doc_id: Document(page_content=content, metadata=dict(metadata))
+            for doc_id, (content, metadata) in hits.items()
+        }
+        
+    def _cache_docs(self, entries: List[tuple]) -> None:
+        """写入缓存，entries 为 (doc_id, 内容, 元数据) 列表，超出容量时淘汰最久未使用的条目"""
+        if self._doc_cache_size <= 0:
+            return
+        with self._doc_cache_lock:
+            for doc_id, content, metadata in entries[-self._doc_cache_size:]:
+                key = (self.collection.name, doc_id)
+                self._doc_cache[key] = (content, dict(metadata or {}))
+                self._doc_cache.move_to_end(key)
+            while len(self._doc_cache) > self._doc_cache_size:
+                self._doc_cache.popitem(last=False)
+                
+    def _invalidate_docs(self, doc_ids: Optional[List[str]] = None) -> None:
+        """删除缓存中的指定文档，doc_ids 为 None 时清空缓存"""
+        with self._doc_cache_lock:
+            if doc_ids is None:
+                self._doc_cache.clear()
+                return
+            for doc_id in doc_ids:
+                self._doc_cache.pop((self.collection.name, doc_id), None)
+        
+    def _has_field(self, field_name: str) -> bool:
+        """当前集合的schema是否包含指定字段（旧版本创建的集合字段不同）"""
+        return any(field.name == field_name for field in self.collection.schema.fields)
+        
+    @staticmethod
+    def _to_vector_column(vectors) -> List[List[float]]:
+        """将向量转换为 float32 精度的二维列表，已是浮点数列表的列表时直接使用"""
+        if isinstance(vectors, list) and vectors and isinstance(vectors[0], list):
+            return vectors
+        array = np.ascontiguousarray(vectors, dtype=np.float32)
+        if array.ndim != 2:
+            raise ValueError(f"向量必须是二维数组，实际维度: {array.ndim}")
+        return array.tolist()
+            
+    def _insert_shard(self, columns: List[list], upsert: bool = False) -> int:
+        """插入（或按主键覆盖写入）一个分片，返回写入条数"""
+        if upsert:
+            result = self.collection.upsert(columns)
+            return getattr(result, "upsert_count", len(columns[0]))
+        result = self.collection.insert(columns)
+        return getattr(result, "insert_count", len(columns[0]))
+        
+    def _insert_columns(self, columns: List[list], upsert: bool = False) -> int:
+        """
+        按 insert_buffer_size 把列数据切分为多个分片插入
+        
+        单次插入整批数据会序列化为一个很大的RPC；分片后并发提交，
+        Milvus proxy 可以并行处理各分片，客户端序列化与服务端写入也能重叠。
+        不在这里执行flush，由调用方在导入结束后统一处理
+        """
+        total = len(columns[0])
+        shard_size = max(1, self.insert_buffer_size)
+        if total <= shard_size:
+            return self._insert_shard(columns, upsert)
+            
+        shards = [[column[i:i + shard_size] for column in columns] for i in range(0, total, shard_size)]
+        if self.insert_parallelism == 1:
+            return sum(self._insert_shard(shard, upsert) for shard in shards)
+            
+        insert_count = 0
+        with ThreadPoolExecutor(max_workers=min(self.insert_parallelism, len(shards))) as executor:
+            futures = [executor.submit(self._insert_shard, shard, upsert) for shard in shards]
+            for future in as_completed(futures):
+                insert_count += future.result()
+        return insert_count
+            
+    @staticmethod
+    def _drop_duplicate_ids(columns: List[list]) -> List[list]:
+        """
+        同一批数据中主键重复时只保留最后一行
+        
+        分片并发写入时同一主键的多行可能落在不同分片，upsert 后保留哪一行取决于分片完成顺序，
+        因此在分片前去重，结果与顺序写入一致
+        """
+        ids = columns[0]
+        last_index = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last_index) == len(ids):
+            return columns
+        keep = sorted(last_index.values())
+        logger.warning(f"插入数据中有 {len(ids) - len(keep)} 条主键重复，每个主键只保留最后一条")
+        return [[column[i] for i in keep] for column in columns]
+
+    def insert(self, documents: List[Document], vectors: List[List[float]], upsert: bool = True):
+        """
+        插入文档，包含向量和文本数据
+        
+        Args:
+            upsert: 是否按主键覆盖写入。默认开启，重复导入相同 doc_id 的文档（如更换模型后重新生成向量）
+                时直接替换旧数据，不会产生重复记录，也不需要先删除再插入；
+                确定只追加新文档时可设为 False，使用开销更小的 insert
+        """
         try:
-            if not documents or not vectors:
+            if not documents or len(vectors) == 0:
                 return
 
-            # 准备数据
-            data = []
-            for doc, vector in zip(documents, vectors):
-                point = {
-                    Field.PRIMARY_KEY.value: doc.metadata.get("doc_id", str(uuid.uuid4())),
-                    Field.VECTOR.value: vector,
-                    Field.CONTENT_KEY.value: doc.page_content,
-                    Field.METADATA_KEY.value: doc.metadata,
-                    Field.GROUP_KEY.value: doc.metadata.get("group_id", ""),
-                    Field.SPARSE_VECTOR.value: vector  # 这里简化处理，实际应该是不同的向量
-                }
-                data.append(point)
+            # 按列组织数据，字段顺序与 create_collection 中的 schema 一致，不再逐条构造字典；
+            # pymilvus 2.3 对 ndarray 逐元素取值比Python列表慢，向量统一转换为 float32 后一次性 tolist()
+            vector_column = self._to_vector_column(vectors)
+            columns = [
+                [doc.metadata.get("doc_id") or str(uuid.uuid4()) for doc in documents],
+                vector_column,
+                [doc.page_content for doc in documents],
+                [doc.metadata for doc in documents],
+                [doc.metadata.get("group_id", "") for doc in documents]
+            ]
+            if self._has_field(Field.SPARSE_VECTOR.value):
+                # 旧版本创建的集合仍包含 sparse_vector 字段，写入与 vector 相同的数据
+                columns.append(vector_column)
+            if self._has_field(Field.DATASET_KEY.value):
+                columns.append([str(doc.metadata.get("dataset_id") or "") for doc in documents])
+
+            columns = self._drop_duplicate_ids(columns)
 
             # 执行插入
-            self.collection.insert(data)
-            logger.info(f"成功插入 {len(documents)} 条数据")
+            insert_count = self._insert_columns(columns, upsert)
+            self._cache_docs(list(zip(columns[0], columns[2], columns[3])))
+            if upsert:
+                # 无法得知其中有多少条是覆盖已有数据，缓存的行数失效，下次重新读取
+                self._row_count_cache.pop(self.collection.name, None)
+                self._collection_info_cache.pop(self.collection.name, None)
+            else:
+                self._adjust_row_count(self.collection.name, insert_count)
+            
+            # 提前提交异步加载，插入后的首次检索不必再同步等待整个加载过程
+            try:
+                self._start_collection_load(self.collection)
+            except Exception as e:
+                logger.warning(f"提交集合异步加载失败: {e}")
+            logger.info(f"成功插入 {insert_count} 条数据")
+            return insert_count
 
         except Exception as e:
             logger.error(f"插入数据失败: {str(e)}")
@@ -342,12 +635,50 @@ class MilvusVectorStore(BaseVectorStore):
         query_vector: List[float],
         top_k: int = 2,
         score_threshold: float = 0.0,
-        dataset_id: Optional[str] = None
+        dataset_id: Optional[str] = None,
+        with_vectors: bool = False
     ) -> List[Document]:
-        """搜索相似向量"""
+        """
+        搜索相似向量
+        
+        Args:
+            with_vectors: 是否同时返回入库时存储的向量（放在 metadata 的 vector 字段中），
+                供重排序直接使用而不必重新生成
+        """
+        return self.search_by_vectors(
+            [query_vector],
+            top_k=top_k,
+            score_threshold=score_threshold,
+            dataset_id=dataset_id,
+            with_vectors=with_vectors
+        )[0]
+        
+    def search_by_vectors(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int = 2,
+        score_threshold: float = 0.0,
+        dataset_id: Optional[str] = None,
+        with_vectors: bool = False
+    ) -> List[List[Document]]:
+        """
+        批量搜索相似向量，所有查询在一次请求中完成
+        
+        多个查询逐个调用 search_by_vector 时每个查询都是一次RPC；
+        合并为一次请求后Milvus可以对整批查询向量化计算，网络和proxy开销只付一次
+        
+        Args:
+            query_vectors: 查询向量列表
+            with_vectors: 是否同时返回入库时存储的向量（放在 metadata 的 vector 字段中）
+            
+        Returns:
+            与 query_vectors 一一对应的结果列表
+        """
         if not self.collection:
             logger.error("集合未初始化，无法执行搜索")
             raise SearchError("集合未初始化，无法执行搜索")
+        if len(query_vectors) == 0:
+            return []
         
         try:
             # 确保集合已加载
@@ -357,53 +688,69 @@ class MilvusVectorStore(BaseVectorStore):
                 "metric_type": "L2",  # 使用L2距离
                 "params": {"nprobe": min(50, max(10, top_k * 2))}  # 动态调整nprobe
             }
+            if score_threshold > 0 and self.range_search:
+                # L2范围搜索返回 range_filter <= 距离 < radius 的结果，与下面的阈值过滤条件一致；
+                # radius 必填，取 float32 最大值表示不设上限
+                search_params["params"]["range_filter"] = score_threshold
+                search_params["params"]["radius"] = _MAX_RANGE_RADIUS
             
             # 添加过滤条件（如果指定了数据集ID）
             expr = None
             if dataset_id:
-                expr = f'metadata["dataset_id"] == "{dataset_id}"'
+                if self._has_field(Field.DATASET_KEY.value):
+                    expr = f'{Field.DATASET_KEY.value} == "{dataset_id}"'
+                else:
+                    # 旧版本创建的集合没有数据集ID字段，只能按JSON元数据过滤
+                    expr = f'metadata["dataset_id"] == "{dataset_id}"'
                 logger.info(f"添加过滤条件: {expr}")
             
-            logger.info(f"正在集合 {self.collection.name} 中执行搜索, top_k={top_k}")
+            logger.info(f"正在集合 {self.collection.name} 中执行搜索, 查询数={len(query_vectors)}, top_k={top_k}")
             start_time = time.time()
             
+            output_fields = [Field.CONTENT_KEY.value, Field.METADATA_KEY.value]
+            if with_vectors:
+                output_fields.append(Field.VECTOR.value)
+            
             # 执行向量搜索
             results = self.collection.search(
-                data=[query_vector],
+                data=list(query_vectors),
                 anns_field="vector",
                 param=search_params,
                 limit=top_k,
                 expr=expr,
-                output_fields=[Field.CONTENT_KEY.value, Field.METADATA_KEY.value]
+                output_fields=output_fields
             )
             
             search_time = time.time() - start_time
             logger.info(f"搜索完成，耗时 {search_time:.3f} 秒")
             
-            # 处理搜索结果
-            search_results = []
+            # 处理搜索结果，每个查询对应一组命中
+            all_results = []
             for hits in results:
+                search_results = []
                 for hit in hits:
                     entity = hit.entity
                     metadata = entity.get(Field.METADATA_KEY.value, {})
                     page_content = entity.get(Field.CONTENT_KEY.value, "")
                     metadata['score'] = float(hit.distance)
+                    if with_vectors:
+                        metadata[Field.VECTOR.value] = entity.get(Field.VECTOR.value)
                     
                     doc = Document(page_content=page_content, metadata=metadata)
                     search_results.append(doc)
+                
+                # 如果启用了分数阈值且未下推到Milvus，过滤结果
+                if score_threshold > 0 and not self.range_search:
+                    search_results = [
+                        doc for doc in search_results
+                        if doc.metadata.get('score', 0) >= score_threshold
+                    ]
+                all_results.append(search_results)
             
-            # 如果启用了分数阈值，过滤结果
-            if score_threshold > 0:
-                filtered_results = []
-                for doc in search_results:
-                    score = doc.metadata.get('score', 0)
-                    if score >= score_threshold:
-                        filtered_results.append(doc)
-                search_results = filtered_results
-                logger.info(f"应用分数阈值 {score_threshold}，过滤后剩余 {len(search_results)} 个结果")
-            
-            logger.info(f"搜索完成，返回 {len(search_results)} 个结果")
-            return search_results
+            if score_threshold > 0 and not self.range_search:
+                logger.info(f"应用分数阈值 {score_threshold}")
+            logger.info(f"搜索完成，返回 {sum(len(r) for r in all_results)} 个结果")
+            return all_results
             
         except Exception as e:
             logger.error(f"在集合 {self.collection.name if self.collection else 'None'} 中搜索失败: {e}")
@@ -415,6 +762,10 @@ class MilvusVectorStore(BaseVectorStore):
             logger.error("集合未初始化，无法执行查询")
             raise ValueError("Collection not initialized")
             
+        cached = self._get_cached_docs([doc_id])
+        if cached:
+            return cached[doc_id]
+            
         # 确保集合已加载
         self._ensure_collection_loaded(self.collection)
             
@@ -435,6 +786,7 @@ class MilvusVectorStore(BaseVectorStore):
                 page_content=content,
                 metadata=metadata
             )
+            self._cache_docs([(doc_id, content, metadata)])
             
             return document
         except Exception as e:
@@ -454,44 +806,27 @@ class MilvusVectorStore(BaseVectorStore):
                 raise ValueError("Collection not initialized")
 
         try:
-            # 对于大量ID，分批删除
-            if len(doc_ids) > 1000:
-                total_count = len(doc_ids)
-                deleted_count = 0
-                batch_size = 1000
+            self._invalidate_docs(doc_ids)
+            
+            # 按 _DELETE_BATCH_SIZE 分批删除，ID较少时只有一批
+            total_count = len(doc_ids)
+            batch_count = (total_count + _DELETE_BATCH_SIZE - 1) // _DELETE_BATCH_SIZE
+            deleted_count = 0
+            for i in range(0, total_count, _DELETE_BATCH_SIZE):
+                batch_ids = doc_ids[i:i + _DELETE_BATCH_SIZE]
+                if batch_count > 1:
+                    logger.info(f"正在删除批次 {i//_DELETE_BATCH_SIZE + 1}/{batch_count}，包含 {len(batch_ids)} 个文档")
+                self.collection.delete(_in_expr(Field.PRIMARY_KEY.value, batch_ids))
+                deleted_count += len(batch_ids)
                 
-                for i in range(0, total_count, batch_size):
-                    end_idx = min(i + batch_size, total_count)
-                    batch_ids = doc_ids[i:end_idx]
-                    
-                    formatted_ids = ", ".join([f'"{_id}"' for _id in batch_ids])
-                    expr = f'id in [{formatted_ids}]'
-                    
-                    logger.info(f"正在删除批次 {i//batch_size + 1}/{(total_count+batch_size-1)//batch_size}，包含 {len(batch_ids)} 个文档")
-                    self.collection.delete(expr)
-                    deleted_count += len(batch_ids)
-                    
-                    # 每处理完一批数据，报告进度
+                # 每处理完一批数据，报告进度
+                if batch_count > 1:
                     logger.info(f"已删除 {deleted_count}/{total_count} 个文档 ({deleted_count/total_count*100:.1f}%)")
-                
-                # 更新缓存中的行数
-                if self.collection.name in self._collection_info_cache:
-                    self._collection_info_cache[self.collection.name]["row_count"] -= deleted_count
-                
-                logger.info(f"成功删除了 {deleted_count} 个文档")
-            else:
-                # 构造删除表达式
-                formatted_ids = ", ".join([f'"{_id}"' for _id in doc_ids])
-                expr = f'id in [{formatted_ids}]'
-                
-                # 执行删除操作
-                self.collection.delete(expr)
-                
-                # 更新缓存中的行数
-                if self.collection.name in self._collection_info_cache:
-                    self._collection_info_cache[self.collection.name]["row_count"] -= len(doc_ids)
-                
-                logger.info(f"已删除 {len(doc_ids)} 个文档")
+            
+            # 更新缓存中的行数
+            self._adjust_row_count(self.collection.name, -deleted_count)
+            
+            logger.info(f"成功删除了 {deleted_count} 个文档")
         except Exception as e:
             logger.error(f"删除文档失败: {e}")
             raise
@@ -504,26 +839,35 @@ class MilvusVectorStore(BaseVectorStore):
         
         if not doc_ids:
             return []
+            
+        # 只查询缓存未命中的ID
+        found = self._get_cached_docs(doc_ids)
+        missing = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id not in found]
+        if not missing:
+            return list(found.values())
 
         self._ensure_collection_loaded(self.collection)
 
         try:
-            ids_str = ", ".join([f'"{doc_id}"' for doc_id in doc_ids])
-            expr = f'{Field.PRIMARY_KEY.value} in [{ids_str}]'
+            expr = _in_expr(Field.PRIMARY_KEY.value, missing)
             
-            output_fields = [Field.CONTENT_KEY.value, Field.METADATA_KEY.value]
+            output_fields = [Field.PRIMARY_KEY.value, Field.CONTENT_KEY.value, Field.METADATA_KEY.value]
             
             results = self.collection.query(
                 expr=expr,
                 output_fields=output_fields
             )
 
-            documents = []
+            documents = list(found.values())
+            entries = []
             for res in results:
                 page_content = res.get(Field.CONTENT_KEY.value, "")
                 metadata = res.get(Field.METADATA_KEY.value, {})
                 doc = Document(page_content=page_content, metadata=metadata)
                 documents.append(doc)
+                if res.get(Field.PRIMARY_KEY.value) is not None:
+                    entries.append((res[Field.PRIMARY_KEY.value], page_content, metadata))
+            self._cache_docs(entries)
 
             return documents
         except Exception as e:
@@ -534,6 +878,26 @@ class MilvusVectorStore(BaseVectorStore):
         """搜索相似向量"""
         return self.search_by_vector(query_embedding, top_k)
         
+    def flush(self):
+        """
+        将当前集合中已插入的数据落盘并封存segment
+        
+        insert 不会触发flush；flush 是全局同步的重操作，每批插入后都执行会让写入串行化并频繁生成小segment，
+        应在一次导入的所有批次完成后调用一次。代价是最终一致：导入过程中新写入的数据
+        在flush前仍位于增长中的segment，检索结果可能暂时不包含这些数据
+        """
+        if not self.collection:
+            return
+        try:
+            self.collection.flush()
+            # flush 后重新读取准确的实体数量
+            self._collection_info_cache.pop(self.collection.name, None)
+            self._row_count_cache.pop(self.collection.name, None)
+            logger.info(f"集合 {self.collection.name} flush 完成")
+        except Exception as e:
+            logger.error(f"flush 集合失败: {e}")
+            raise
+            
     def get_stats(self):
         """获取集合统计信息"""
         try:
@@ -543,7 +907,7 @@ class MilvusVectorStore(BaseVectorStore):
                 
             stats = {
                 "collection_name": collection.name,
-                "row_count": collection.num_entities,
+                "row_count": self._cached_row_count(collection),
                 "schema": collection.schema,
                 "index_info": {}
             }
@@ -585,13 +949,20 @@ class MilvusVectorStore(BaseVectorStore):
             logger.error(f"插入向量失败: {e}")
             raise VectorStoreError(f"插入向量失败: {str(e)}")
             
-    def search(self, query_vector: List[float], top_k: int = 3) -> List[Dict[str, Any]]:
-        """搜索相似向量"""
+    def search_chunks(self, query_vector: List[float], top_k: int = 3) -> List[Dict[str, Any]]:
+        """
+        搜索相似子块，返回包含 chunk_id、segment_id 的字典列表
+        
+        原先与 search 同名，后定义的方法覆盖了返回 Document 列表的 search，
+        现单独命名，search 保持 BaseVectorStore 的约定
+        """
         try:
-            # 确保集合已加载
             if not self.collection:
                 raise VectorStoreError("集合未初始化")
                 
+            # 确保集合已加载
+            self._ensure_collection_loaded(self.collection)
+                
             # 执行搜索
             search_params = {
                 "metric_type": "L2",
@@ -628,11 +999,26 @@ class MilvusVectorStore(BaseVectorStore):
         """删除指定父块ID的所有子块"""
         try:
             self.collection.delete(f'segment_id == "{segment_id}"')
+            self._invalidate_docs()
             logger.info(f"成功删除父块 {segment_id} 的所有子块")
         except Exception as e:
             logger.error(f"删除向量失败: {e}")
             raise VectorStoreError(f"删除向量失败: {str(e)}")
 
+    def delete_by_segment_ids(self, segment_ids: List[str]):
+        """删除多个父块ID的所有子块，ID较多时分批删除"""
+        if not segment_ids:
+            return
+        try:
+            for i in range(0, len(segment_ids), _DELETE_BATCH_SIZE):
+                self.collection.delete(_in_expr("segment_id", segment_ids[i:i + _DELETE_BATCH_SIZE]))
+            # 按父块删除时无法得知具体的子块ID，清空文档缓存
+            self._invalidate_docs()
+            logger.info(f"成功删除 {len(segment_ids)} 个父块的所有子块")
+        except Exception as e:
+            logger.error(f"删除向量失败: {e}")
+            raise VectorStoreError(f"删除向量失败: {str(e)}")
+
     def get_collection(self):
         """获取当前集合"""
         return self.collection 
\ No newline at end of file
@@ -2,13 +2,14 @@ import pytest
 import os
 import sys
 import json
+import numpy as np
 from unittest.mock import patch, MagicMock
 from typing import List, Dict, Any
 
 # 添加项目根目录到路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-from app.rag.cache_service import CacheService
+from app.rag.cache_service import CacheService, SemanticCache
 from app.rag.document_processor import Document
 from app.rag.custom_exceptions import CacheError, RedisConnectionError
 
@@ -242,4 +243,62 @@ class TestCacheService:
             
             # 验证调用参数
             args, kwargs = mock_instance.setex.call_args
-            assert args[1] == 7200  # 验证使用了自定义过期时间 
\ No newline at end of file
+            assert args[1] == 7200  # 验证使用了自定义过期时间 
+
+class TestSemanticCache:
+    """语义缓存测试类"""
+
+    @pytest.fixture
+    def sample_documents(self):
+        """创建测试文档"""
+        return [Document(page_content="这是测试文档1的内容", metadata={"doc_id": "doc1"})]
+
+    def test_similar_query_hit(self, sample_documents):
+        """测试相近查询命中、不同数据集或不相近查询未命中"""
+        cache = SemanticCache({"threshold": 0.97, "max_size": 8})
+        cache.put("测试查询", [1.0, 0.0, 0.0], "dataset", sample_documents)
+        
+        assert [doc.page_content for doc in cache.get([0.99, 0.05, 0.0], "dataset")] == ["这是测试文档1的内容"]
+        assert cache.get([0.99, 0.05, 0.0], "other") is None
+        assert cache.get([0.0, 1.0, 0.0], "dataset") is None
+
+    def test_retrieval_params_in_key(self, sample_documents):
+        """测试 top_k 等检索参数不同的查询不复用缓存结果"""
+        cache = SemanticCache({"threshold": 0.97, "max_size": 8})
+        top3_results = sample_documents * 3
+        cache.put("测试查询", [1.0, 0.0], "dataset", sample_documents, top_k=1, score_threshold=0.5)
+        cache.put("测试查询", [1.0, 0.0], "dataset", top3_results, top_k=3, score_threshold=0.5)
+        
+        assert len(cache.get([1.0, 0.0], "dataset", top_k=1, score_threshold=0.5)) == 1
+        assert len(cache.get([1.0, 0.0], "dataset", top_k=3, score_threshold=0.5)) == 3
+        assert cache.get([1.0, 0.0], "dataset", top_k=5, score_threshold=0.5) is None
+        assert cache.get([1.0, 0.0], "dataset", top_k=1, score_threshold=0.5, rerank=True) is None
+
+    def test_results_copied(self, sample_documents):
+        """测试缓存保存和返回的都是副本，修改检索结果不影响之后的命中"""
+        cache = SemanticCache({"threshold": 0.97, "max_size": 8})
+        cache.put("测试查询", [1.0, 0.0], "dataset", sample_documents)
+        sample_documents[0].metadata["score"] = 0.1
+        
+        hit = cache.get([1.0, 0.0], "dataset")
+        assert "score" not in hit[0].metadata
+        hit[0].metadata["score"] = 0.9
+        assert "score" not in cache.get([1.0, 0.0], "dataset")[0].metadata
+
+    def test_lsh_prefilter_and_eviction(self, sample_documents):
+        """测试超过阈值后通过LSH预筛命中，写满后覆盖最早的条目"""
+        cache = SemanticCache({"threshold": 0.97, "max_size": 16, "lsh_min_size": 4})
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((20, 32))
+        for i, vector in enumerate(vectors):
+            cache.put(f"查询{i}", vector, "dataset", [Document(page_content=f"结果{i}")])
+        
+        assert cache.get(vectors[0], "dataset") is None
+        assert cache.get(vectors[19] * 2, "dataset")[0].page_content == "结果19"
+
+    def test_expired_entry_not_returned(self, sample_documents):
+        """测试过期条目不再命中"""
+        cache = SemanticCache({"threshold": 0.97, "max_size": 8, "expiry": 0})
+        cache.put("测试查询", [1.0, 0.0], "dataset", sample_documents)
+        
+        assert cache.get([1.0, 0.0], "dataset") is None
@@ -0,0 +1,143 @@
+import pytest
+import os
+import sys
+import time
+from unittest.mock import patch, MagicMock
+from pymongo.errors import BulkWriteError
+
+# 添加项目根目录到路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.rag.database import MongoDBManager
+from app.rag.custom_exceptions import BackgroundFlushError
+from app.rag.models import Document
+
+@pytest.fixture
+def manager():
+    """创建不连接MongoDB的管理器，缓冲区攒3个文档写入一次"""
+    with patch("app.rag.database.MongoClient"), \
+            patch.dict(os.environ, {
+                "MONGODB_WRITE_BATCH_SIZE": "3",
+                "MONGODB_WRITE_FLUSH_INTERVAL_MS": "50",
+                "MONGODB_WRITE_RETRY_INTERVAL_MS": "50"
+            }):
+        manager = MongoDBManager(MagicMock())
+    manager.documents_collection = MagicMock()
+    manager.documents_collection.bulk_write.side_effect = lambda requests, ordered: MagicMock(inserted_count=len(requests))
+    yield manager
+    # 停止测试中留下的后台重试定时器
+    with manager._buffer_lock:
+        if manager._flush_timer is not None:
+            manager._flush_timer.cancel()
+
+def make_document(doc_id: str) -> Document:
+    return Document(doc_id=doc_id, page_content=f"内容{doc_id}", metadata={})
+
+def test_get_document_from_buffer(manager):
+    """测试刚保存的文档在写入前可以从缓冲区读到，不访问数据库"""
+    manager.insert_document(make_document("doc1"))
+
+    document = manager.get_document_by_id("doc1")
+
+    assert document.page_content == "内容doc1"
+    manager.documents_collection.find_one.assert_not_called()
+    manager.documents_collection.bulk_write.assert_not_called()
+
+def test_flush_when_buffer_full(manager):
+    """测试缓冲区满时立即批量写入"""
+    for i in range(3):
+        manager.insert_document(make_document(f"doc{i}"))
+
+    manager.documents_collection.bulk_write.assert_called_once()
+    assert len(manager.documents_collection.bulk_write.call_args[0][0]) == 3
+    assert manager._doc_buffer == []
+
+def test_flush_on_timer(manager):
+    """测试缓冲区未满时到达时间间隔后由后台写入"""
+    manager.insert_document(make_document("doc1"))
+
+    deadline = time.time() + 2
+    while not manager.documents_collection.bulk_write.called and time.time() < deadline:
+        time.sleep(0.01)
+
+    manager.documents_collection.bulk_write.assert_called_once()
+    assert manager._doc_buffer == []
+
+def test_close_flushes_remaining(manager):
+    """测试关闭连接前写入缓冲区中剩余的文档"""
+    manager.insert_document(make_document("doc1"))
+
+    manager.close()
+
+    manager.documents_collection.bulk_write.assert_called_once()
+    manager.client.close.assert_called_once()
+
+def test_failed_flush_requeues_batch(manager):
+    """测试写入失败时整批放回缓冲区，下次flush重试"""
+    manager.insert_document(make_document("doc1"))
+    manager.documents_collection.bulk_write.side_effect = ConnectionError("连接断开")
+
+    with pytest.raises(ConnectionError):
+        manager.flush()
+    assert [doc_dict["_id"] for doc_dict in manager._doc_buffer] == ["doc1"]
+
+    manager.documents_collection.bulk_write.side_effect = lambda requests, ordered: MagicMock(inserted_count=len(requests))
+    assert manager.flush() == 1
+    assert manager._doc_buffer == []
+
+def test_duplicate_key_error_raised(manager):
+    """测试主键重复导致部分写入失败时抛出异常，而不是只记录日志"""
+    manager.insert_document(make_document("doc1"))
+    manager.documents_collection.bulk_write.side_effect = BulkWriteError(
+        {"nInserted": 0, "writeErrors": [{"code": 11000, "errmsg": "duplicate key"}]}
+    )
+
+    with pytest.raises(BulkWriteError):
+        manager.flush()
+
+def test_background_flush_error_surfaces_to_next_caller(manager):
+    """测试后台定时写入失败的异常由下一次保存调用抛出，该次保存的文档仍进入缓冲区，之后由后台重试写入"""
+    manager.write_retry_interval = 10
+    manager.documents_collection.bulk_write.side_effect = ConnectionError("连接断开")
+    manager.insert_document(make_document("doc1"))
+
+    deadline = time.time() + 2
+    while manager._flush_error is None and time.time() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(BackgroundFlushError) as exc_info:
+        manager.insert_document(make_document("doc2"))
+    assert isinstance(exc_info.value.__cause__, ConnectionError)
+    assert [doc_dict["_id"] for doc_dict in manager._doc_buffer] == ["doc1", "doc2"]
+
+    manager.documents_collection.bulk_write.side_effect = lambda requests, ordered: MagicMock(inserted_count=len(requests))
+    assert manager.flush() == 2
+
+def test_failed_background_flush_retried(manager):
+    """测试后台写入失败放回缓冲区后，无需新的保存调用也会由定时器重试"""
+    calls = []
+    def bulk_write(requests, ordered):
+        calls.append(len(requests))
+        if len(calls) == 1:
+            raise ConnectionError("连接断开")
+        return MagicMock(inserted_count=len(requests))
+    manager.documents_collection.bulk_write.side_effect = bulk_write
+    manager.insert_document(make_document("doc1"))
+
+    deadline = time.time() + 2
+    while len(calls) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert calls == [1, 1]
+    assert manager._doc_buffer == []
+
+def test_flush_failure_chains_background_error(manager):
+    """测试flush本身写入失败时，之前的后台异常作为原因保留"""
+    background_error = ConnectionError("后台写入失败")
+    manager._flush_error = background_error
+    manager._doc_buffer.append({"_id": "doc1"})
+    manager.documents_collection.bulk_write.side_effect = TimeoutError("写入超时")
+
+    with pytest.raises(TimeoutError) as exc_info:
+        manager.flush()
+    assert exc_info.value.__cause__ is background_error
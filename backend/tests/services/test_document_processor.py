@@ -0,0 +1,95 @@
+import pytest
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.rag import process_pool
+from app.rag.document_processor import DocumentProcessor, Document
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    """创建不使用缓存的文档处理器"""
+    monkeypatch.setenv("DOC_USE_CACHE", "false")
+    return DocumentProcessor()
+
+
+def test_clean_document(processor):
+    """测试清洗单个文档"""
+    doc = Document(page_content="  第一行\t\t内容\x07\n\n\n第二行  ", metadata={"doc_id": "doc1"})
+    cleaned = processor.clean_document(doc)
+
+    assert cleaned.page_content == "第一行 内容 第二行"
+    assert cleaned.metadata["doc_id"] == "doc1"
+    assert "cleaned_at" in cleaned.metadata
+    # 原文档不应被修改
+    assert "cleaned_at" not in doc.metadata
+
+
+def test_clean_documents_matches_clean_document(processor):
+    """测试批量清洗与逐个清洗结果一致且保持顺序"""
+    docs = [
+        Document(page_content=f"文档{i}\t\t的内容\n\n\n结尾", metadata={"doc_id": f"doc{i}"})
+        for i in range(5)
+    ]
+    cleaned = processor.clean_documents(docs)
+
+    assert [d.page_content for d in cleaned] == [
+        processor.clean_document(d).page_content for d in docs
+    ]
+    assert [d.metadata["doc_id"] for d in cleaned] == [f"doc{i}" for i in range(5)]
+
+
+def test_clean_documents_with_process_pool(processor):
+    """测试超过阈值时使用进程池清洗"""
+    processor.clean_workers = 2
+    processor.parallel_threshold = 2
+    docs = [
+        Document(page_content=f"  内容{i}  \x00", metadata={"doc_id": f"doc{i}"})
+        for i in range(4)
+    ]
+    cleaned = processor.clean_documents(docs)
+
+    assert [d.page_content for d in cleaned] == [f"内容{i}" for i in range(4)]
+
+
+def test_process_pool_opt_in_and_shared(processor, monkeypatch):
+    """测试进程池默认关闭；开启后多次调用复用同一个进程池"""
+    monkeypatch.delenv("DOC_CLEAN_WORKERS", raising=False)
+    monkeypatch.setattr(process_pool, "_pool", None)
+    docs = [Document(page_content=f"内容{i}", metadata={"doc_id": f"doc{i}"}) for i in range(4)]
+
+    assert DocumentProcessor().clean_workers == 1
+    processor.clean_documents(docs)
+    assert process_pool._pool is None
+
+    processor.clean_workers = 2
+    processor.parallel_threshold = 2
+    try:
+        processor.clean_documents(docs)
+        pool = process_pool._pool
+        processor.clean_documents(docs)
+        assert pool is not None and process_pool._pool is pool
+    finally:
+        process_pool.shutdown_process_pool()
+
+
+def test_clean_documents_empty(processor):
+    """测试清洗空文档列表"""
+    assert processor.clean_documents([]) == []
+
+
+def test_load_stop_words(monkeypatch, tmp_path):
+    """测试加载停用词并在提取关键词时过滤"""
+    stop_words_file = tmp_path / "stop_words.txt"
+    stop_words_file.write_text("the\n  and  \n\n是\r\n", encoding="utf-8")
+    monkeypatch.setenv("DOC_USE_CACHE", "false")
+    monkeypatch.setenv("STOP_WORDS_FILE", str(stop_words_file))
+
+    processor = DocumentProcessor()
+
+    assert processor.stop_words == frozenset({"the", "and", "是"})
+    doc = Document(page_content="the cat and the hat cat", metadata={})
+    assert processor.extract_keywords(doc) == ["cat", "hat"]
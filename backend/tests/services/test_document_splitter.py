@@ -0,0 +1,171 @@
+import pytest
+import os
+import sys
+import uuid
+
+# 添加项目根目录到路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.rag.document_splitter import DocumentSplitter, ParentChildDocumentSplitter, QADocumentSplitter, Rule
+from app.rag.models import Document
+from app.rag.text_splitter import RecursiveCharacterTextSplitter
+
+
+@pytest.fixture
+def splitter():
+    """创建文档分割器"""
+    return DocumentSplitter()
+
+
+def test_line_classification(splitter):
+    """测试标题、列表项和新主题的判断"""
+    assert splitter._is_title("第三章 总则")
+    assert splitter._is_title("  1.2.3 范围  ")
+    assert splitter._is_title("目 录")
+    assert not splitter._is_title("普通文本")
+
+    assert splitter._is_list_item("• 要点")
+    assert splitter._is_list_item("(a) 选项")
+    assert not splitter._is_list_item("普通文本")
+
+    assert splitter._is_new_topic("注意：内容")
+    assert splitter._is_new_topic("（说明）")
+    assert splitter._is_new_topic("12、内容")
+    assert not splitter._is_new_topic("普通文本")
+
+
+def test_split_into_paragraphs(splitter):
+    """测试按标题、列表和句子边界分割段落"""
+    text = (
+        "第一章 总则\r\n"
+        "这是第一段。\n"
+        "注意：新主题\n\n\n\n"
+        "说明文字\n"
+        "• 列表一\n"
+        "• 列表二\n"
+    )
+    assert splitter._split_into_paragraphs(text) == [
+        "第一章 总则",
+        "这是第一段。",
+        "注意：新主题\n说明文字",
+        "• 列表一\n• 列表二",
+    ]
+
+
+def test_split_documents_segment_ids(splitter):
+    """测试分割生成的片段ID唯一且为UUID4格式"""
+    doc = Document(page_content="第一章 总则\n" + "这是一段较长的正文内容。" * 20, source="test.txt")
+    segments = splitter.split_documents([doc], Rule(subchunk_max_tokens=50, subchunk_overlap=0))
+
+    ids = [segment.id for segment in segments]
+    assert len(ids) == len(set(ids))
+    assert all(uuid.UUID(segment_id).version == 4 for segment_id in ids)
+    children = [s for s in segments if s.metadata["type"] == "child"]
+    assert children and all(c.metadata["parent_id"] in ids for c in children)
+
+
+def test_split_documents_with_process_pool(splitter):
+    """测试超过阈值时使用进程池分割，结果与串行分割一致"""
+    docs = [
+        Document(page_content=f"第{'一二三四'[i]}章 标题\n" + f"文档{i}的正文内容。" * 30, source=f"doc{i}.txt")
+        for i in range(4)
+    ]
+    rule = Rule(subchunk_max_tokens=60, subchunk_overlap=0)
+    serial = splitter.split_documents(docs, rule)
+
+    splitter.split_workers = 2
+    splitter.parallel_threshold = 2
+    parallel = splitter.split_documents(docs, rule)
+
+    assert [(s.page_content, s.metadata["type"], s.metadata["original_doc_id"]) for s in parallel] == \
+        [(s.page_content, s.metadata["type"], s.metadata["original_doc_id"]) for s in serial]
+
+
+def test_custom_length_function_is_memoized():
+    """测试自定义长度函数按文档缓存，同一文本只计算一次"""
+    calls = []
+
+    def token_lengths(texts):
+        calls.extend(texts)
+        return [len(text) for text in texts]
+
+    splitter = ParentChildDocumentSplitter(length_function=token_lengths)
+    doc = Document(page_content="重复的句子内容。\n" * 40, source="test.txt")
+    segments = splitter.split_documents([doc], Rule(max_tokens=100, chunk_overlap=0, subchunk_max_tokens=30, subchunk_overlap=0, min_content_length=1))
+
+    assert segments
+    assert len(calls) == len(set(calls))
+
+
+def test_merge_splits_does_not_recompute_lengths():
+    """测试裁剪重叠时复用已计算的长度，不再对单个部分重新调用长度函数"""
+    calls = []
+
+    def token_lengths(texts):
+        calls.append(list(texts))
+        return [len(text) for text in texts]
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=20, chunk_overlap=10, separators=["。"], length_function=token_lengths)
+    chunks = splitter.split_text("。".join(f"第{i}句内容" for i in range(20)))
+
+    assert len(chunks) > 1
+    # 只有整批计算分割部分长度和计算分隔符长度两类调用
+    assert all(len(texts) > 1 or texts == ["。"] for texts in calls)
+
+
+def test_qa_split_documents():
+    """测试问答对提取"""
+    doc = Document(page_content="Q1: 什么是RAG？\nA1: 检索增强生成。\nQ2: 第二问 A2:\n多行\n答案\n", source="qa.txt")
+    segments = QADocumentSplitter().split_documents([doc])
+
+    assert [(s.metadata["question"], s.metadata["answer"]) for s in segments] == [
+        ("什么是RAG？", "检索增强生成。"),
+        ("第二问", "多行\n答案"),
+    ]
+
+
+def test_qa_split_unmatched_questions_is_linear():
+    """测试大量没有答案的问题标记不会导致回溯超时"""
+    doc = Document(page_content="Q1: " * 20000, source="qa.txt")
+    assert QADocumentSplitter().split_documents([doc]) == []
+
+
+def test_parent_child_deduplicates_segments():
+    """测试开启去重后父子分割跳过重复的父块和子块，默认不去重"""
+    boilerplate = "版权所有，未经许可不得转载。\n公司地址：某市某区某路一号。"
+    docs = [
+        Document(page_content=f"文档{i}的独有正文内容。\n\n{boilerplate}", source=f"doc{i}.txt")
+        for i in range(3)
+    ]
+    rule = Rule(
+        max_tokens=40, chunk_overlap=0, subchunk_max_tokens=20, subchunk_overlap=0, min_content_length=1,
+        deduplicate=True
+    )
+    segments = ParentChildDocumentSplitter().split_documents(docs, rule)
+
+    hashes = [(s.metadata["type"], s.metadata["doc_hash"]) for s in segments]
+    assert len(hashes) == len(set(hashes))
+    parent_ids = {s.id for s in segments if s.metadata["type"] == "parent"}
+    assert all(s.metadata["parent_id"] in parent_ids for s in segments if s.metadata["type"] == "child")
+
+    rule.deduplicate = False
+    assert len(ParentChildDocumentSplitter().split_documents(docs, rule)) > len(segments)
+    assert Rule().deduplicate is False
+
+
+def test_text_splitter_memoizes_custom_length_function():
+    """测试文本分割器缓存自定义长度函数，递归分割时同一文本只计算一次"""
+    calls = []
+
+    def token_lengths(texts):
+        calls.extend(texts)
+        return [len(text) for text in texts]
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=30, chunk_overlap=5, length_function=token_lengths)
+    text = "\n\n".join("重复的句子内容。另一句话在这里。" * 3 for _ in range(5))
+    first = splitter.split_text(text)
+    calls_after_first = len(calls)
+    second = splitter.split_text(text)
+
+    assert first == second
+    assert len(calls) == len(set(calls)) == calls_after_first
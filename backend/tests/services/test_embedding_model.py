@@ -4,6 +4,7 @@ import sys
 import time
 from unittest.mock import patch, MagicMock, call
 from typing import List, Dict, Any
+import numpy as np
 
 # 添加项目根目录到路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
@@ -307,18 +308,19 @@ class TestEmbeddingModel:
             
     def test_custom_timeout(self):
         """测试自定义超时设置"""
-        # 创建带自定义超时的模型
-        model = EmbeddingModel(
-            model_name="test-model",
-            api_base="http://test-api",
-            timeout=30  # 自定义超时为30秒
-        )
+        # 创建带自定义超时的模型，配置从环境变量读取
+        with patch.dict(os.environ, {
+            "EMBEDDING_MODEL": "test-model",
+            "EMBEDDING_API_BASE": "http://test-api",
+            "EMBEDDING_TIMEOUT": "30"  # 自定义超时为30秒
+        }):
+            model = EmbeddingModel()
         
         # 验证超时设置
         assert model.timeout == 30
         
-        # 测试API调用使用了自定义超时
-        with patch("requests.post") as mock_post:
+        # 测试API调用使用了自定义超时；请求通过复用的会话发出
+        with patch.object(model._session, "post") as mock_post:
             mock_response = MagicMock()
             mock_response.status_code = 200
             mock_response.json.return_value = {
@@ -333,4 +335,25 @@ class TestEmbeddingModel:
                 "http://test-api/v1/embeddings",
                 json={"model": "test-model", "input": "测试查询"},
                 timeout=30
-            ) 
\ No newline at end of file
+            ) 
+
+    def test_embed_documents_array(self):
+        """测试以numpy数组形式返回嵌入向量"""
+        model = EmbeddingModel()
+        with patch.object(model, "_embed_batch_with_retry") as mock_embed:
+            mock_embed.return_value = [[0.1, 0.2, 0.3, 0.4], [0.5, 0.6, 0.7, 0.8]]
+            embeddings = model.embed_documents_array(["文本1", "文本2"], dtype="float16")
+
+        assert embeddings.shape == (2, 4)
+        assert embeddings.dtype == np.float16
+        assert model.embed_documents_array([]).shape == (0, 0)
+
+    def test_quantize_int8(self):
+        """测试int8量化与还原"""
+        embeddings = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+        quantized, scales = EmbeddingModel.quantize_int8(embeddings)
+
+        assert quantized.dtype == np.int8
+        assert quantized[0].tolist() == [64, -127, 32]
+        assert quantized[1].tolist() == [0, 0, 0]
+        np.testing.assert_allclose(quantized * scales[:, None], embeddings, atol=1.0 / 127)
@@ -7,6 +7,7 @@ from app.rag.parent_child_processor import (
     ProcessingError
 )
 import re
+import uuid
 
 def test_transform_empty_documents():
     """测试处理空文档列表"""
@@ -213,4 +214,72 @@ def test_preview_with_parent_only():
             "章" in content,  # 包含章节标题
             content.endswith("。"),  # 以句号结尾
             content.count("。") >= 1  # 至少包含一个完整句子
-        ]), f"父文档内容不完整: {content}"
\ No newline at end of file
+        ]), f"父文档内容不完整: {content}"
+
+def test_transform_hashes_final_documents():
+    """测试转换完成后按最终内容和元数据计算文档哈希"""
+    processor = ParentChildIndexProcessor()
+    doc = Document(page_content="第一段。\n\n第二段。", metadata={"source": "test"})
+    rule = ProcessingRule(
+        segmentation=Segmentation(max_tokens=50, chunk_overlap=0, separator="\n\n"),
+        subchunk_segmentation=Segmentation(max_tokens=10, chunk_overlap=0, separator="。")
+    )
+
+    result = processor.transform([doc], rule=rule)
+
+    assert result
+    for generated_doc in result:
+        expected = Document(page_content=generated_doc.page_content, metadata=generated_doc.metadata)
+        assert generated_doc.doc_hash == expected.doc_hash
+
+
+def test_doc_hash_matches_baseline_with_source():
+    """测试构造时补入的 metadata["source"] 不改变文档哈希，与原有 sha256 值一致"""
+    doc = Document(page_content="测试内容", metadata={"a": 1}, source="file.txt")
+
+    assert doc.metadata["source"] == "file.txt"
+    assert doc.doc_hash == "901f8d7909e9493bb9fa6646f0efad3eda2cf7ab3ff0199742cb3a15502513be"
+    assert doc.doc_hash == Document(page_content="测试内容", metadata={"a": 1}).doc_hash
+
+def test_transform_generates_unique_uuid4_ids():
+    """测试生成的文档ID唯一且为UUID4格式"""
+    processor = ParentChildIndexProcessor()
+    doc = Document(page_content="第一段。第二句。\n\n第二段。第二句。", metadata={})
+    rule = ProcessingRule(
+        segmentation=Segmentation(max_tokens=50, chunk_overlap=0, separator="\n\n"),
+        subchunk_segmentation=Segmentation(max_tokens=5, chunk_overlap=0, separator="。")
+    )
+
+    result = processor.transform([doc], rule=rule)
+
+    ids = [d.metadata["doc_id"] for d in result] + [d.doc_id for d in result]
+    assert len(set(d.metadata["doc_id"] for d in result)) == len(result)
+    assert all(uuid.UUID(doc_id).version == 4 for doc_id in ids)
+
+
+def test_transform_with_process_pool():
+    """测试超过阈值时使用进程池处理，结果与串行处理一致"""
+    rule = ProcessingRule(
+        segmentation=Segmentation(max_tokens=50, chunk_overlap=0, separator="\n\n"),
+        subchunk_segmentation=Segmentation(max_tokens=10, chunk_overlap=0, separator="。")
+    )
+
+    def make_docs():
+        return [
+            Document(page_content=f"文档{i}第一段。第二句。\n\n文档{i}第二段。", metadata={"doc_id": f"doc{i}"})
+            for i in range(4)
+        ]
+
+    processor = ParentChildIndexProcessor()
+    processor.transform_workers = 1
+    serial = processor.transform(make_docs(), rule=rule)
+
+    processor.transform_workers = 2
+    processor.parallel_threshold = 2
+    parallel = processor.transform(make_docs(), rule=rule)
+
+    def summary(docs):
+        return [(d.page_content, d.metadata.get("is_parent"), d.metadata.get("original_doc_id")) for d in docs]
+
+    assert summary(parallel) == summary(serial)
+    assert len({d.metadata["doc_id"] for d in parallel}) == len(parallel)
@@ -1,8 +1,10 @@
 import pytest
+import asyncio
+import threading
 import os
 import sys
 import numpy as np
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, MagicMock, AsyncMock, call
 from typing import List, Dict, Any
 
 # 添加项目根目录到路径
@@ -125,9 +127,11 @@ class TestRetrievalService:
         # 设置模拟返回值
         mock_vector_store.search_by_vector.return_value = sample_documents
         
-        # 为文档内容嵌入设置不同的返回值
+        # 为查询和文档内容嵌入设置不同的返回值
         mock_embedding_model.embed_query.side_effect = [
-            [0.1, 0.2, 0.3, 0.4],  # 查询向量
+            [0.1, 0.2, 0.3, 0.4]   # 查询向量，重排序时直接复用
+        ]
+        mock_embedding_model.embed_documents.return_value = [
             [0.2, 0.3, 0.4, 0.5],  # 文档1向量
             [0.3, 0.4, 0.5, 0.6],  # 文档2向量
             [0.4, 0.5, 0.6, 0.7]   # 文档3向量
@@ -142,8 +146,9 @@ class TestRetrievalService:
         
         # 验证结果
         assert len(results) == 3
-        # 验证嵌入模型调用
-        assert mock_embedding_model.embed_query.call_count == 4
+        # 验证嵌入模型调用：查询向量只生成一次，文档向量一次批量生成
+        assert mock_embedding_model.embed_query.call_count == 1
+        mock_embedding_model.embed_documents.assert_called_once_with([doc.page_content for doc in sample_documents])
         # 验证重排序后的分数已更新
         assert all("score" in doc.metadata for doc in results)
         
@@ -189,7 +194,7 @@ class TestRetrievalService:
         
         # 验证get_by_id调用
         expected_calls = [call("parent1"), call("parent2"), call("parent3")]
-        mock_vector_store.get_by_id.assert_has_calls(expected_calls)
+        mock_vector_store.get_by_id.assert_has_calls(expected_calls, any_order=True)
 
     def test_retrieve_with_missing_parent(self, retrieval_service, mock_vector_store, sample_documents):
         """测试父文档缺失的情况"""
@@ -217,7 +222,9 @@ class TestRetrievalService:
         """测试重排序功能"""
         # 设置嵌入向量的模拟返回值
         mock_embedding_model.embed_query.side_effect = [
-            [0.1, 0.2, 0.3, 0.4],  # 查询向量
+            [0.1, 0.2, 0.3, 0.4]   # 查询向量
+        ]
+        mock_embedding_model.embed_documents.return_value = [
             [0.9, 0.8, 0.7, 0.6],  # 文档1向量 - 相似度较低
             [0.2, 0.3, 0.4, 0.5],  # 文档2向量 - 相似度较高
             [0.5, 0.5, 0.5, 0.5]   # 文档3向量 - 相似度中等
@@ -329,7 +336,9 @@ class TestRetrievalService:
         
         # 4. 设置嵌入向量
         mock_embedding_model.embed_query.side_effect = [
-            [0.1, 0.2, 0.3, 0.4],  # 查询向量
+            [0.1, 0.2, 0.3, 0.4]   # 查询向量
+        ]
+        mock_embedding_model.embed_documents.return_value = [
             [0.9, 0.8, 0.7, 0.6],  # 文档1向量
             [0.2, 0.3, 0.4, 0.5],  # 文档2向量
             [0.5, 0.5, 0.5, 0.5]   # 文档3向量
@@ -374,4 +383,287 @@ class TestRetrievalService:
         mock_cache_service.get_cached_results.assert_called_once()
         
         # 恢复设置
-        retrieval_service.retrieval_config["reranking_model"]["enabled"] = False 
\ No newline at end of file
+        retrieval_service.retrieval_config["reranking_model"]["enabled"] = False 
+    def test_cosine_similarities_and_top_k(self):
+        """测试向量化的余弦相似度计算和部分排序"""
+        similarities = RetrievalService._cosine_similarities(
+            [1.0, 0.0],
+            [[0.0, 1.0], [1.0, 0.0], [0.0, 0.0], [1.0, 1.0]]
+        )
+        
+        np.testing.assert_allclose(similarities, [0.0, 1.0, 0.0, np.sqrt(0.5)], rtol=1e-6)
+        assert list(RetrievalService._top_k_indices(similarities, 2)) == [1, 3]
+        assert list(RetrievalService._top_k_indices(similarities, 10))[:2] == [1, 3]
+
+    def test_query_embedding_cached(self, mock_vector_store, mock_embedding_model, sample_documents):
+        """测试重复查询复用查询向量"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model
+        )
+        mock_vector_store.search_by_vector.return_value = sample_documents
+        
+        service.retrieve(query="测试查询", use_cache=False)
+        service.retrieve(query="测试查询", use_cache=False)
+        service.retrieve(query="另一个查询", use_cache=False)
+        
+        assert mock_embedding_model.embed_query.call_count == 2
+
+    def test_retrieve_with_shared_parent(self, mock_vector_store, mock_embedding_model):
+        """测试多个子文档共享父文档时只查询一次"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model
+        )
+        children = [
+            Document(page_content=f"子文档{i}", metadata={"parent_id": "parent1", "score": 0.9})
+            for i in range(3)
+        ]
+        parent = Document(page_content="父文档", metadata={"doc_id": "parent1"})
+        mock_vector_store.search_by_vector.return_value = children
+        mock_vector_store.get_by_id.return_value = parent
+        
+        results = service.retrieve_with_parent(query="测试查询", use_cache=False)
+        
+        assert [result["parent_document"] for result in results] == [parent] * 3
+        mock_vector_store.get_by_id.assert_called_once_with("parent1")
+
+    @pytest.mark.asyncio
+    async def test_process_and_index_document_coalesces(self, mock_vector_store, mock_embedding_model):
+        """测试并发的单文档索引请求合并为一次嵌入和插入"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model
+        )
+        mock_embedding_model.embed_documents.side_effect = lambda texts: [[0.1, 0.2, 0.3, 0.4]] * len(texts)
+        documents = [
+            Document(page_content=f"文档{i}", metadata={"doc_id": f"doc{i}"})
+            for i in range(5)
+        ]
+        
+        results = await asyncio.gather(*[service.process_and_index_document(doc) for doc in documents])
+        
+        assert [result["doc_id"] for result in results] == [f"doc{i}" for i in range(5)]
+        assert all(result["success"] for result in results)
+        mock_embedding_model.embed_documents.assert_called_once_with([doc.page_content for doc in documents])
+        mock_vector_store.insert.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_process_and_index_document_isolates_failures(self, mock_vector_store, mock_embedding_model):
+        """测试合并的批次失败时逐个重试，只有出错的文档返回失败"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model
+        )
+        def embed_documents(texts):
+            if "坏文档" in texts:
+                raise EmbeddingError("嵌入失败")
+            return [[0.1, 0.2, 0.3, 0.4]] * len(texts)
+        mock_embedding_model.embed_documents.side_effect = embed_documents
+        documents = [
+            Document(page_content=content, metadata={"doc_id": f"doc{i}"})
+            for i, content in enumerate(["文档0", "坏文档", "文档2"])
+        ]
+        
+        results = await asyncio.gather(*[service.process_and_index_document(doc) for doc in documents])
+        await service.close()
+        
+        assert [result["success"] for result in results] == [True, False, True]
+        assert "嵌入失败" in results[1]["message"]
+        assert mock_vector_store.insert.call_count == 2
+        assert service._index_flusher is None
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_index_flusher(self, mock_vector_store, mock_embedding_model):
+        """测试关闭服务时取消后台任务，正在等待的请求得到失败结果"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model
+        )
+        service.index_max_wait = 10
+        
+        request = asyncio.create_task(service.process_and_index_document(Document(page_content="文档")))
+        await asyncio.sleep(0.01)
+        flusher = service._index_flusher
+        await service.close()
+        
+        assert flusher.cancelled()
+        result = await asyncio.wait_for(request, 1)
+        assert result["success"] is False
+        mock_vector_store.insert.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_batch_index_reuses_collection(self, mock_vector_store, mock_embedding_model):
+        """测试多次批量索引只查询一次维度、只创建一次集合"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model
+        )
+        
+        def create_collection(name, dimension):
+            mock_vector_store.collection_name = name
+        mock_vector_store.create_collection.side_effect = create_collection
+        mock_embedding_model.embed_documents.return_value = [[0.1, 0.2, 0.3, 0.4]]
+        
+        for i in range(3):
+            result = await service.process_and_index_documents_batch([Document(page_content=f"文档{i}")])
+            assert result["success"]
+        
+        mock_embedding_model.get_dimension.assert_called_once()
+        mock_vector_store.create_collection.assert_called_once_with("rag_documents", 4)
+        assert mock_vector_store.insert.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_index_clears_semantic_cache(self, mock_vector_store, mock_embedding_model):
+        """测试写入新文档后清空语义缓存，插入失败时不清空"""
+        semantic_cache = MagicMock()
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model,
+            semantic_cache=semantic_cache
+        )
+        mock_embedding_model.embed_documents.side_effect = lambda texts: [[0.1, 0.2, 0.3, 0.4]] * len(texts)
+        
+        await service.process_and_index_documents_batch([Document(page_content="文档1")])
+        await service.process_and_index_document(Document(page_content="文档2"))
+        await service.close()
+        assert semantic_cache.clear.call_count == 2
+        
+        mock_vector_store.insert.side_effect = VectorStoreError("插入失败")
+        result = await service.process_and_index_documents_batch([Document(page_content="文档3")])
+        assert not result["success"]
+        assert semantic_cache.clear.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_retry_operation_async_backoff(self, mock_vector_store, mock_embedding_model):
+        """测试异步重试使用指数退避，4xx错误不重试"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model,
+            retrieval_config={"max_retries": 3, "retry_interval": 1}
+        )
+        mock_func = MagicMock(side_effect=[EmbeddingError("第一次失败"), EmbeddingError("第二次失败"), "成功结果"])
+        
+        with patch("app.rag.retrieval_service.asyncio.sleep") as mock_sleep:
+            result = await service._retry_operation_async(mock_func, "测试参数", error_type=EmbeddingError)
+        
+        assert result == "成功结果"
+        delays = [args[0] for args, _ in mock_sleep.call_args_list]
+        assert 1 <= delays[0] <= 1.1 and 2 <= delays[1] <= 2.1
+        
+        client_error = EmbeddingError("请求无效")
+        client_error.response = MagicMock(status_code=400)
+        mock_func = MagicMock(side_effect=client_error)
+        with patch("app.rag.retrieval_service.asyncio.sleep") as mock_sleep:
+            with pytest.raises(EmbeddingError):
+                await service._retry_operation_async(mock_func, error_type=EmbeddingError)
+        
+        assert mock_func.call_count == 1
+        mock_sleep.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_retry_operation_async_off_loop_and_capped(self, mock_vector_store, mock_embedding_model):
+        """测试异步重试在线程池中执行同步操作，加抖动后的等待时间不超过上限"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model,
+            retrieval_config={"max_retries": 3, "retry_interval": 1, "max_retry_interval": 1}
+        )
+        loop_thread = threading.get_ident()
+        calls = []
+        def operation(value):
+            calls.append(threading.get_ident())
+            if len(calls) < 3:
+                raise EmbeddingError("失败")
+            return value
+        
+        with patch("app.rag.retrieval_service.random.uniform", return_value=0.1), \
+                patch("app.rag.retrieval_service.asyncio.sleep") as mock_sleep:
+            result = await service._retry_operation_async(operation, "结果", error_type=EmbeddingError)
+        
+        assert result == "结果"
+        assert loop_thread not in calls
+        assert [args[0] for args, _ in mock_sleep.call_args_list] == [1, 1]
+
+    @pytest.mark.asyncio
+    async def test_delete_document_bulk(self, mock_vector_store, mock_embedding_model):
+        """测试删除文档时批量删除所有父块和向量"""
+        class SegmentCursor:
+            def __init__(self, segments):
+                self._segments = iter(segments)
+            def __aiter__(self):
+                return self
+            async def __anext__(self):
+                try:
+                    return next(self._segments)
+                except StopIteration:
+                    raise StopAsyncIteration
+        
+        document_store = MagicMock()
+        document_store.segments_collection.find.return_value = SegmentCursor(
+            [{"index_node_id": f"segment{i}"} for i in range(3)]
+        )
+        document_store.delete_segments = AsyncMock()
+        semantic_cache = MagicMock()
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=document_store,
+            embedding_model=mock_embedding_model,
+            semantic_cache=semantic_cache
+        )
+        
+        await service.delete_document("doc1")
+        
+        segment_ids = ["segment0", "segment1", "segment2"]
+        document_store.delete_segments.assert_awaited_once_with(segment_ids)
+        mock_vector_store.delete_by_segment_ids.assert_called_once_with(segment_ids)
+        semantic_cache.clear.assert_called_once()
+
+    def test_rerank_skipped_on_clear_margin(self, mock_vector_store, mock_embedding_model, sample_documents):
+        """测试检索分数差距超过 skip_margin 时跳过重排序"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model,
+            retrieval_config={"reranking_model": {"enabled": True, "skip_margin": 0.1}}
+        )
+        
+        assert service._rerank_results("测试查询", sample_documents) == sample_documents
+        mock_embedding_model.embed_documents.assert_not_called()
+        
+        service.retrieval_config["reranking_model"]["force"] = True
+        mock_embedding_model.embed_documents.return_value = [[0.1, 0.2, 0.3, 0.4]] * 3
+        service._rerank_results("测试查询", sample_documents)
+        mock_embedding_model.embed_documents.assert_called_once()
+
+    def test_rerank_uses_stored_vectors(self, mock_vector_store, mock_embedding_model):
+        """测试重排序优先使用检索结果中存储的向量，且向量不随结果返回"""
+        service = RetrievalService(
+            vector_store=mock_vector_store,
+            document_store=MagicMock(),
+            embedding_model=mock_embedding_model,
+            retrieval_config={"top_k": 3, "reranking_model": {"enabled": True}}
+        )
+        mock_embedding_model.embed_query.return_value = [1.0, 0.0]
+        mock_embedding_model.embed_documents.return_value = [[1.0, 1.0]]
+        mock_vector_store.search_by_vector.return_value = [
+            Document(page_content="文档1", metadata={"doc_id": "doc1", "score": 0.9, "vector": [0.0, 1.0]}),
+            Document(page_content="文档2", metadata={"doc_id": "doc2", "score": 0.8}),
+            Document(page_content="文档3", metadata={"doc_id": "doc3", "score": 0.7, "vector": [1.0, 0.0]})
+        ]
+        
+        results = service.retrieve(query="测试查询", use_cache=False)
+        
+        assert [doc.metadata["doc_id"] for doc in results] == ["doc3", "doc2", "doc1"]
+        assert all("vector" not in doc.metadata for doc in results)
+        mock_embedding_model.embed_documents.assert_called_once_with(["文档2"])
+        assert mock_vector_store.search_by_vector.call_args.kwargs["with_vectors"] is True
@@ -0,0 +1,167 @@
+import pytest
+import os
+import sys
+import hashlib
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.rag import vector_factory
+from app.rag.vector_factory import Vector
+from app.rag.document_processor import Document
+
+@pytest.fixture
+def mock_store():
+    """模拟向量存储，初始时集合未创建"""
+    store = MagicMock()
+    store.collection = None
+    return store
+
+@pytest.fixture
+def mock_embeddings():
+    """模拟向量模型，每段文本生成二维向量"""
+    embeddings = MagicMock()
+    embeddings.embed_documents.side_effect = lambda texts: [[float(len(text)), 1.0] for text in texts]
+    return embeddings
+
+@pytest.fixture
+def vector(mock_store, mock_embeddings):
+    """创建使用模拟存储和模拟向量模型的 Vector 实例"""
+    with patch.object(Vector, "_get_embeddings", return_value=mock_embeddings), \
+            patch.object(Vector, "_init_vector", return_value=mock_store):
+        yield Vector(SimpleNamespace(id="ds1"), batch_size=2, max_concurrency=2)
+
+def test_add_texts_stores_batches_in_order(vector, mock_store):
+    """测试分批生成向量后按顺序写入，首批写入前创建集合，最后只flush一次"""
+    documents = [Document(page_content=f"内容{i}", metadata={"doc_id": f"doc{i}"}) for i in range(5)]
+
+    vector.add_texts(documents)
+
+    mock_store.create_collection.assert_called_once_with("rag_documents", dimension=2)
+    assert mock_store.insert.call_count == 3
+    stored = [doc.metadata["doc_id"] for call in mock_store.insert.call_args_list for doc in call[0][0]]
+    assert stored == [f"doc{i}" for i in range(5)]
+    assert all(doc.metadata["dataset_id"] == "ds1" for doc in documents)
+    mock_store.flush.assert_called_once()
+
+def test_create_from_texts(vector, mock_store):
+    """测试 create 写入文本文档，集合已存在时不重复创建"""
+    mock_store.collection = MagicMock()
+
+    vector.create(texts=[Document(page_content="内容", metadata={"doc_id": "doc1"})])
+
+    mock_store.create_collection.assert_not_called()
+    documents, embeddings = mock_store.insert.call_args[0]
+    assert [doc.page_content for doc in documents] == ["内容"]
+    assert embeddings == [[2.0, 1.0]]
+
+def test_content_hash_blake2b_and_streaming():
+    """测试内容哈希为16字节blake2b，超过阈值分段写入时结果不变"""
+    assert vector_factory._content_hash("abc") == hashlib.blake2b(b"abc", digest_size=16).hexdigest()
+
+    content = "中文a" * (vector_factory._HASH_STREAM_THRESHOLD // 2)
+    assert len(content) > vector_factory._HASH_STREAM_THRESHOLD
+    assert vector_factory._content_hash(content) == hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+def test_filter_duplicate_texts_reuses_doc_hash(vector):
+    """测试按内容去重，已有 doc_hash 时直接使用"""
+    documents = [
+        Document(page_content="内容", metadata={}),
+        Document(page_content="内容", metadata={}),
+        Document(page_content="其他", metadata={"doc_hash": "given"})
+    ]
+
+    with patch.object(vector_factory, "_content_hash", wraps=vector_factory._content_hash) as content_hash:
+        unique = vector._filter_duplicate_texts(documents)
+
+    assert [doc.page_content for doc in unique] == ["内容", "其他"]
+    assert content_hash.call_count == 2
+    assert unique[1].metadata["doc_hash"] == "given"
+
+@pytest.mark.parametrize("content", [b"", "第一行\r\n第二行\rthird\n".encode("utf-8"), ("段落" * 100000).encode("utf-8")])
+def test_read_text_file_matches_open(tmp_path, content):
+    """测试mmap读取的结果与文本模式 open().read() 一致（含空文件和换行符转换）"""
+    file_path = tmp_path / "doc.txt"
+    file_path.write_bytes(content)
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        expected = f.read()
+
+    assert vector_factory._read_text_file(str(file_path)) == expected
+
+def test_process_text_file(vector, tmp_path):
+    """测试处理文本文件时填充元数据"""
+    file_path = tmp_path / "doc.txt"
+    file_path.write_text("文本内容", encoding="utf-8")
+
+    document = vector.process_file(str(file_path))
+
+    assert document.page_content == "文本内容"
+    assert document.metadata["dataset_id"] == "ds1"
+    assert document.metadata["document_id"] == "doc"
+    assert document.metadata["file_type"] == ".txt"
+
+@pytest.mark.asyncio
+async def test_async_add_texts_and_create(vector, mock_store):
+    """测试异步接口在线程池中完成写入，不阻塞事件循环"""
+    await vector.aadd_texts([Document(page_content="异步内容", metadata={"doc_id": "doc1"})])
+    await vector.acreate(texts=[Document(page_content="异步创建", metadata={"doc_id": "doc2"})])
+
+    stored = [doc.metadata["doc_id"] for call in mock_store.insert.call_args_list for doc in call[0][0]]
+    assert stored == ["doc1", "doc2"]
+    assert mock_store.flush.call_count == 2
+
+def test_add_texts_dedupe_options_not_forwarded(vector, mock_store):
+    """测试去重选项在 add_texts 中消费，不透传给向量存储的 insert"""
+    documents = [
+        Document(page_content="内容1", metadata={"doc_id": "doc1"}),
+        Document(page_content="内容2", metadata={"doc_id": "doc1"}),
+        Document(page_content="内容3", metadata={"doc_id": "doc2"})
+    ]
+
+    vector.add_texts(documents, dedupe_by="id", upsert=False)
+
+    stored = [doc.metadata["doc_id"] for call in mock_store.insert.call_args_list for doc in call[0][0]]
+    assert stored == ["doc1", "doc2"]
+    for call in mock_store.insert.call_args_list:
+        assert call[1] == {"upsert": False}
+
+    mock_store.insert.reset_mock()
+    vector.add_texts([Document(page_content="内容4", metadata={"doc_id": "doc4"})], duplicate_check=True)
+    assert mock_store.insert.call_args[1] == {}
+
+def test_resolve_content_hasher_blake3_option(monkeypatch):
+    """测试去重哈希只由 VECTOR_CONTENT_HASH_ALGORITHM 选择，blake3 未安装时回退到 blake2b"""
+    fake_blake3 = MagicMock()
+    fake_blake3.AUTO = -1
+    monkeypatch.setitem(sys.modules, "blake3", SimpleNamespace(blake3=fake_blake3))
+    monkeypatch.setenv("DOC_HASH_ALGORITHM", "blake3")
+    new_hasher, hexdigest_kwargs = vector_factory._resolve_content_hasher()
+    assert new_hasher().name == "blake2b"
+    fake_blake3.assert_not_called()
+
+    monkeypatch.setenv("VECTOR_CONTENT_HASH_ALGORITHM", "blake3")
+    monkeypatch.setitem(sys.modules, "blake3", None)
+    new_hasher, hexdigest_kwargs = vector_factory._resolve_content_hasher()
+    assert new_hasher().name == "blake2b"
+    assert hexdigest_kwargs == {}
+
+    monkeypatch.setitem(sys.modules, "blake3", SimpleNamespace(blake3=fake_blake3))
+    new_hasher, hexdigest_kwargs = vector_factory._resolve_content_hasher()
+    new_hasher()
+    fake_blake3.assert_called_once_with(max_threads=-1)
+    assert hexdigest_kwargs == {"length": 16}
+
+def test_add_texts_chunk_ids_unique_per_document(vector, mock_store):
+    """测试同一 document_id 的多个分块生成不同主键，单个分块沿用 document_id"""
+    documents = [
+        Document(page_content="分块1", metadata={"document_id": "docA"}),
+        Document(page_content="分块2", metadata={"document_id": "docA"}),
+        Document(page_content="分块3", metadata={"document_id": "docB"})
+    ]
+
+    vector.add_texts(documents)
+
+    assert [doc.metadata["doc_id"] for doc in documents] == ["docA_0", "docA_1", "docB"]
@@ -0,0 +1,166 @@
+import pytest
+import os
+import sys
+import numpy as np
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.rag.vector_store import MilvusVectorStore
+from app.rag.document_processor import Document
+
+@pytest.fixture
+def mock_utility():
+    """模拟 pymilvus utility，集合初始为未加载状态"""
+    with patch("app.rag.vector_store.utility") as utility:
+        utility.load_state.return_value = None
+        yield utility
+
+@pytest.fixture
+def vector_store(mock_utility):
+    """创建不连接Milvus的向量存储实例"""
+    with patch("app.rag.vector_store.connections"):
+        store = MilvusVectorStore()
+    store.collection = MagicMock()
+    store.collection.name = "test_collection"
+    store.collection.insert.side_effect = lambda columns: MagicMock(insert_count=len(columns[0]))
+    store.collection.upsert.side_effect = lambda columns: MagicMock(upsert_count=len(columns[0]))
+    return store
+
+def test_insert_columnar_shards(vector_store):
+    """测试按列插入，超过 insert_buffer_size 时分片写入"""
+    vector_store.insert_buffer_size = 3
+    documents = [Document(page_content=f"内容{i}", metadata={"doc_id": f"doc{i}"}) for i in range(7)]
+
+    insert_count = vector_store.insert(documents, np.ones((7, 4), dtype=np.float32), upsert=False)
+
+    assert insert_count == 7
+    assert vector_store.collection.insert.call_count == 3
+    vector_store.collection.upsert.assert_not_called()
+    shard_ids = sorted(
+        doc_id for call in vector_store.collection.insert.call_args_list for doc_id in call[0][0][0]
+    )
+    assert shard_ids == sorted(f"doc{i}" for i in range(7))
+    first_columns = vector_store.collection.insert.call_args_list[0][0][0]
+    assert len(first_columns) == 5
+    assert first_columns[1][0] == [1.0, 1.0, 1.0, 1.0]
+
+def test_get_by_ids_uses_cache(vector_store):
+    """测试已插入或已查询过的文档直接从缓存返回，删除后缓存失效"""
+    vector_store.insert([Document(page_content="内容1", metadata={"doc_id": "doc1"})], [[0.1, 0.2]])
+    vector_store.collection.query.return_value = [
+        {"id": "doc2", "page_content": "内容2", "metadata": {"doc_id": "doc2"}}
+    ]
+
+    with patch.object(vector_store, "_ensure_collection_loaded"):
+        documents = vector_store.get_by_ids(["doc1", "doc2"])
+        assert [doc.page_content for doc in documents] == ["内容1", "内容2"]
+        assert 'id in ["doc2"]' in vector_store.collection.query.call_args[1]["expr"]
+
+        vector_store.collection.query.reset_mock()
+        assert vector_store.get_by_id("doc2").page_content == "内容2"
+        vector_store.collection.query.assert_not_called()
+
+        vector_store.delete(["doc2"])
+        vector_store.collection.query.return_value = []
+        assert vector_store.get_by_id("doc2") is None
+        vector_store.collection.query.assert_called_once()
+
+def test_delete_builds_in_expression(vector_store):
+    """测试删除表达式使用主键字段，并拒绝包含双引号的ID"""
+    vector_store.delete(["doc1", "doc2"])
+    vector_store.collection.delete.assert_called_once_with('id in ["doc1","doc2"]')
+
+    with pytest.raises(ValueError):
+        vector_store.delete(['doc"3'])
+
+def test_collection_load_submitted_after_insert(vector_store, mock_utility):
+    """测试插入后提交异步加载，检索前等待一次，之后不再检查加载状态"""
+    vector_store.insert([Document(page_content="内容1", metadata={"doc_id": "doc1"})], [[0.1, 0.2]])
+    vector_store.collection.load.assert_called_once_with(_async=True)
+
+    vector_store.collection.query.return_value = []
+    vector_store.get_by_id("doc2")
+    vector_store.get_by_id("doc3")
+
+    mock_utility.wait_for_loading_complete.assert_called_once()
+    assert mock_utility.load_state.call_count == 1
+
+def test_search_by_vectors_single_request(vector_store):
+    """测试多个查询向量在一次请求中完成搜索，结果按查询分组"""
+    def hit(content, distance):
+        return MagicMock(distance=distance, entity={"page_content": content, "metadata": {}})
+
+    vector_store.collection.search.return_value = [[hit("内容1", 0.1), hit("内容2", 0.5)], [hit("内容3", 0.2)]]
+
+    with patch.object(vector_store, "_ensure_collection_loaded"):
+        results = vector_store.search_by_vectors([[0.1, 0.2], [0.3, 0.4]], top_k=2)
+
+    vector_store.collection.search.assert_called_once()
+    assert vector_store.collection.search.call_args[1]["data"] == [[0.1, 0.2], [0.3, 0.4]]
+    assert [[doc.page_content for doc in docs] for docs in results] == [["内容1", "内容2"], ["内容3"]]
+    assert results[0][1].metadata["score"] == 0.5
+
+def test_dataset_id_scalar_field(vector_store):
+    """测试集合包含数据集ID字段时写入该列，并用标量字段过滤"""
+    fields = []
+    for name in ["id", "vector", "page_content", "metadata", "group_id", "dataset_id"]:
+        field = MagicMock()
+        field.name = name
+        fields.append(field)
+    vector_store.collection.schema.fields = fields
+    vector_store.collection.search.return_value = [[]]
+
+    vector_store.insert([Document(page_content="内容1", metadata={"doc_id": "doc1", "dataset_id": "ds1"})], [[0.1, 0.2]])
+    columns = vector_store.collection.upsert.call_args[0][0]
+    assert len(columns) == 6
+    assert columns[5] == ["ds1"]
+
+    with patch.object(vector_store, "_ensure_collection_loaded"):
+        vector_store.search_by_vector([0.1, 0.2], dataset_id="ds1")
+    assert vector_store.collection.search.call_args[1]["expr"] == 'dataset_id == "ds1"'
+
+def test_index_build_waited_before_first_search(vector_store, mock_utility):
+    """测试创建索引后不立即等待构建完成，首次检索前才等待"""
+    vector_store.collection.has_index.return_value = False
+    vector_store.collection.num_entities = 0
+
+    vector_store._ensure_index(vector_store.collection)
+    vector_store.collection.create_index.assert_called_once()
+    mock_utility.wait_for_index_building_complete.assert_not_called()
+
+    vector_store._ensure_collection_loaded(vector_store.collection)
+    vector_store._ensure_collection_loaded(vector_store.collection)
+    mock_utility.wait_for_index_building_complete.assert_called_once_with(
+        "test_collection", "vector", using="default"
+    )
+
+def test_insert_upserts_by_default(vector_store):
+    """测试默认按主键覆盖写入，重复导入相同 doc_id 不产生重复记录"""
+    vector_store._row_count_cache["test_collection"] = (10, float("inf"))
+    documents = [Document(page_content="内容1", metadata={"doc_id": "doc1"})]
+
+    assert vector_store.insert(documents, [[0.1, 0.2]]) == 1
+
+    vector_store.collection.upsert.assert_called_once()
+    vector_store.collection.insert.assert_not_called()
+    assert "test_collection" not in vector_store._row_count_cache
+
+def test_insert_duplicate_ids_keeps_last(vector_store):
+    """测试同一批数据主键重复时分片前去重，只保留最后一条"""
+    vector_store.insert_buffer_size = 1
+    documents = [
+        Document(page_content="旧内容", metadata={"doc_id": "doc1"}),
+        Document(page_content="内容2", metadata={"doc_id": "doc2"}),
+        Document(page_content="新内容", metadata={"doc_id": "doc1"})
+    ]
+
+    assert vector_store.insert(documents, [[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]]) == 2
+
+    rows = sorted(
+        (call[0][0][0][0], call[0][0][2][0], call[0][0][1][0])
+        for call in vector_store.collection.upsert.call_args_list
+    )
+    assert [row[:2] for row in rows] == [("doc1", "新内容"), ("doc2", "内容2")]
+    assert rows[0][2] == pytest.approx([0.5, 0.6])